@@ -42,8 +42,11 @@ async function fetchRates(): Promise<{
 }> {
   const supabase = await createClient()
   
-  const { data, error } = await supabase
-    .rpc('get_latest_rates_with_fallback', { include_sample: true })
+  const [{ data, error }, { data: summary, error: summaryError }] = await Promise.all([
+    supabase.rpc('get_latest_rates_with_fallback', { include_sample: true }),
+    // Precomputed per run by the collector (migration 013)
+    supabase.rpc('get_market_summary', { include_sample: true }),
+  ])
   
   if (error) {
     console.error('Supabase RPC error', error)
@@ -55,17 +58,22 @@ async function fetchRates(): Promise<{
   }
   
   const isFallback = data[0]?.is_fallback ?? false
+  if (summaryError) {
+    console.error('Supabase market summary error', summaryError)
+  }
+  const runSummary = summaryError ? undefined : summary?.[0]
   
-  // Calculate stats
-  const distinctLenders = new Set(data.map((row: RateRow) => row.lender_name)).size
+  // Without a precomputed summary, count what is listed
+  const distinctLenders: number = runSummary?.distinct_lenders
+    ?? new Set(data.map((row: RateRow) => row.lender_name)).size
   const maxUpdatedAt = data.reduce((max: string, row: RateRow) => {
     return row.updated_at > max ? row.updated_at : max
   }, data[0].updated_at)
   
   const stats: RunStats = {
-    total_offers: data.length,
+    total_offers: runSummary?.offers_total ?? data.length,
     distinct_lenders: distinctLenders,
-    last_run_at: maxUpdatedAt,
+    last_run_at: runSummary?.last_updated ?? maxUpdatedAt,
     is_fallback: isFallback
   }
   
@@ -0,0 +1,239 @@
+"""
+Rate alert matching (migration 014).
+
+Subscriptions say "tell me when a <category> offer is at or below these
+limits": max rate, max APR, max points, optionally one lender. After each
+successful real run the collector takes the run's added and repriced
+offers from its change set (``diff_run``) and looks up the subscribers
+each one newly satisfies. A repriced offer only alerts subscribers it did
+not already satisfy before the move, so a subscriber hears about a deal
+once, not on every run.
+
+Subscriptions are indexed by (category, lender or any) and, within that,
+by a sorted list of rate thresholds: for an offer at rate r every
+subscription with max_rate >= r is a suffix of the list (one bisect), and
+only those candidates are checked against their other limits. Matches
+are grouped into one batch per subscriber, each offer listed once however
+many of the subscriber's alerts it satisfied, and queued in
+``alert_batches`` for delivery.
+
+    python -m mortgage_tracker.alerts add you@example.com "30Y fixed" --max-rate 5.75 --max-points 0.5
+    python -m mortgage_tracker.alerts list
+    python -m mortgage_tracker.alerts match 1234       # dry run: print the batches
+    python -m mortgage_tracker.alerts queue 1234
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import sys
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.alerts")
+
+
+@dataclass
+class Subscription:
+    id: int
+    email: str
+    category: str
+    max_rate: Optional[float] = None
+    max_apr: Optional[float] = None
+    max_points: Optional[float] = None
+    lender_name: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Subscription":
+        return cls(
+            id=int(row["id"]),
+            email=row["email"],
+            category=row["category"],
+            max_rate=safe_float(row.get("max_rate"), None),
+            max_apr=safe_float(row.get("max_apr"), None),
+            max_points=safe_float(row.get("max_points"), None),
+            lender_name=row.get("lender_name"),
+        )
+
+    def matches(self, rate: Optional[float], apr: Optional[float], points: Optional[float]) -> bool:
+        """Whether an offer with these values is within every limit. Unknown values never match a limit."""
+        for limit, value in ((self.max_rate, rate), (self.max_apr, apr), (self.max_points, points)):
+            if limit is not None and (value is None or value > limit):
+                return False
+        return True
+
+
+class AlertIndex:
+    """Subscriptions keyed by (category, lender) with sorted rate thresholds."""
+
+    def __init__(self, subscriptions: Iterable[Subscription] = ()):
+        # (category, lender_name or None) -> ([max_rate ...], [Subscription ...]) sorted by max_rate
+        self._groups: Dict[Tuple[str, Optional[str]], Tuple[List[float], List[Subscription]]] = {}
+        self._size = 0
+        pending: Dict[Tuple[str, Optional[str]], List[Subscription]] = {}
+        for sub in subscriptions:
+            pending.setdefault((sub.category, sub.lender_name), []).append(sub)
+            self._size += 1
+        for key, subs in pending.items():
+            subs.sort(key=self._threshold)
+            self._groups[key] = ([self._threshold(s) for s in subs], subs)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def _threshold(sub: Subscription) -> float:
+        return math.inf if sub.max_rate is None else sub.max_rate
+
+    def candidates(self, category: str, lender_name: Optional[str], rate: Optional[float]) -> Iterable[Subscription]:
+        """Subscriptions whose rate limit admits ``rate`` (all with no rate limit when ``rate`` is unknown)."""
+        keys = [(category, None)]
+        if lender_name is not None:
+            keys.append((category, lender_name))
+        for key in keys:
+            group = self._groups.get(key)
+            if group is None:
+                continue
+            thresholds, subs = group
+            start = bisect.bisect_left(thresholds, math.inf if rate is None else rate)
+            yield from subs[start:]
+
+    def match(self, offer: Dict[str, Any]) -> List[Subscription]:
+        """Subscriptions an offer (a change-set row) newly satisfies."""
+        rate = safe_float(offer.get("rate"), None)
+        apr = safe_float(offer.get("apr"), None)
+        points = safe_float(offer.get("points"), None)
+        # Repriced rows carry the previous values; new rows match on current values alone
+        repriced = "prev_rate" in offer or "prev_apr" in offer
+        prev_rate = safe_float(offer.get("prev_rate"), None)
+        prev_apr = safe_float(offer.get("prev_apr"), None)
+        result = []
+        for sub in self.candidates(offer.get("category"), offer.get("lender_name"), rate):
+            if not sub.matches(rate, apr, points):
+                continue
+            if repriced and sub.matches(prev_rate, prev_apr, points):
+                continue  # already satisfied before this run
+            result.append(sub)
+        return result
+
+
+def _sort_key(row: Dict[str, Any]):
+    rate = row.get("rate")
+    return (row.get("category") or "", rate is None, rate or 0.0, row.get("lender_name") or "")
+
+
+def match_batches(index: AlertIndex, offers: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    One batch per subscriber email: ``{"email", "matches": [...]}`` where
+    each matched offer appears once with the ids of the alerts it met.
+    """
+    by_email: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for offer in offers:
+        subs = index.match(offer)
+        if not subs:
+            continue
+        key = offer.get("key") or f"{offer.get('lender_name')}|{offer.get('category')}|{offer.get('points')}"
+        for sub in subs:
+            rows = by_email.setdefault(sub.email, {})
+            row = rows.get(key)
+            if row is None:
+                row = rows[key] = {
+                    "key": key,
+                    "lender_name": offer.get("lender_name"),
+                    "category": offer.get("category"),
+                    "rate": safe_float(offer.get("rate"), None),
+                    "apr": safe_float(offer.get("apr"), None),
+                    "points": safe_float(offer.get("points"), None),
+                    "lock_days": offer.get("lock_days"),
+                    "prev_rate": safe_float(offer.get("prev_rate"), None),
+                    "subscription_ids": [],
+                }
+            row["subscription_ids"].append(sub.id)
+    return [
+        {"email": email, "matches": sorted(rows.values(), key=_sort_key)}
+        for email, rows in sorted(by_email.items())
+    ]
+
+
+def load_index(sb) -> AlertIndex:
+    return AlertIndex(Subscription.from_row(r) for r in sb.call("get_alert_subscriptions") or [])
+
+
+def alert_candidates(changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The offers of a change set that can trigger alerts: added and repriced."""
+    return list(changes.get("added") or []) + list(changes.get("repriced") or [])
+
+
+def queue_alerts(sb, run_id: int, changes: Dict[str, Any], index: Optional[AlertIndex] = None) -> int:
+    """Match a run's change set against the subscriptions and queue the batches. Returns batches queued."""
+    index = index if index is not None else load_index(sb)
+    if not len(index):
+        return 0
+    batches = match_batches(index, alert_candidates(changes))
+    if batches:
+        sb.call("queue_alert_batches", {"p_run_id": run_id, "p_batches": batches})
+    logger.info(f"🔔 Run {run_id}: {len(batches)} alert batch(es) for {len(index)} subscription(s)")
+    return len(batches)
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .diff import get_run_diff
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Manage and match rate alert subscriptions")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("add", help="Subscribe an email to a category")
+    p.add_argument("email")
+    p.add_argument("category")
+    p.add_argument("--max-rate", type=float, default=None)
+    p.add_argument("--max-apr", type=float, default=None)
+    p.add_argument("--max-points", type=float, default=None)
+    p.add_argument("--lender", default=None)
+
+    p = sub.add_parser("remove", help="Deactivate a subscription")
+    p.add_argument("id", type=int)
+
+    sub.add_parser("list", help="Print the active subscriptions")
+
+    for name, help_text in (("match", "Print the batches a run would queue"), ("queue", "Queue a run's batches")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("run_id", type=int, nargs="?", default=None, help="Default: the published run")
+
+    args = parser.parse_args()
+    sb = make_writer(load_config(args.sources))
+
+    if args.command == "add":
+        result: Any = sb.call("create_alert_subscription", {
+            "p_email": args.email,
+            "p_category": args.category,
+            "p_max_rate": args.max_rate,
+            "p_max_apr": args.max_apr,
+            "p_max_points": args.max_points,
+            "p_lender_name": args.lender,
+        })
+    elif args.command == "remove":
+        result = bool(sb.call("deactivate_alert_subscription", {"p_id": args.id}))
+    elif args.command == "list":
+        result = [asdict(Subscription.from_row(r)) for r in sb.call("get_alert_subscriptions") or []]
+    else:
+        changes = get_run_diff(sb, args.run_id)
+        if changes is None:
+            print("No stored change set for that run", file=sys.stderr)
+            sys.exit(1)
+        if args.command == "match":
+            result = match_batches(load_index(sb), alert_candidates(changes))
+        else:
+            result = queue_alerts(sb, changes["run_id"], changes)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Streaming anomaly detection on offer rates (migration 012).
+
+``validate_offer`` only applies static ranges, so a mis-parse that still
+lands between 2% and 20% gets published. Here each (lender, category) rate
+series keeps an exponentially weighted mean and variance across runs. A
+new offer is scored against its series in O(1) and quarantined when it is
+both many standard deviations and a large absolute distance away, for
+example 3 points overnight.
+
+Only accepted offers advance the state, so one bad parse cannot drag the
+baseline toward itself. New series are accepted until they have a few
+runs of history, and a series quarantined for several runs in a row is
+taken to have genuinely moved and starts over from the new level.
+"""
+import logging
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.anomaly")
+
+ALPHA = 0.2          # EWMA weight of the newest run
+Z_THRESHOLD = 6.0    # standard deviations from the series mean
+MIN_JUMP = 0.75      # and at least this many percentage points
+WARMUP_RUNS = 3      # runs of history before a series is scored
+VAR_FLOOR = 0.0025   # (0.05 pp)^2, so a perfectly flat series is not over-sensitive
+MAX_STRIKES = 3      # consecutive fully-quarantined runs before a series is re-based
+
+
+@dataclass
+class SeriesState:
+    mean: float
+    var: float
+    n: int
+    strikes: int = 0
+
+    def update(self, x: float, alpha: float = ALPHA) -> None:
+        if self.n == 0:
+            self.mean, self.var = x, 0.0
+        else:
+            diff = x - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1.0 - alpha) * (self.var + diff * incr)
+        self.n += 1
+
+
+class AnomalyDetector:
+    """Scores offers against per-series EWMA state and quarantines outliers."""
+
+    def __init__(
+        self,
+        state: Optional[Dict[Tuple[str, str], SeriesState]] = None,
+        z_threshold: float = Z_THRESHOLD,
+        min_jump: float = MIN_JUMP,
+        warmup_runs: int = WARMUP_RUNS,
+    ):
+        self.state = state or {}
+        self.z_threshold = z_threshold
+        self.min_jump = min_jump
+        self.warmup_runs = warmup_runs
+        self._observed: Dict[Tuple[str, str], List[float]] = {}
+        self._rejected: Dict[Tuple[str, str], List[float]] = {}
+
+    @classmethod
+    def load(cls, sb, **kwargs) -> "AnomalyDetector":
+        rows = sb.call("get_rate_series_state") or []
+        state = {
+            (r["lender_name"], r["category"]): SeriesState(
+                float(r["mean"]), float(r["var"]), int(r["n"]), int(r.get("strikes") or 0)
+            )
+            for r in rows
+        }
+        return cls(state, **kwargs)
+
+    def score(self, offer: Dict[str, Any]) -> Dict[str, Any]:
+        """How far an offer's rate is from its series; ``anomalous`` decides quarantine."""
+        rate = safe_float(offer.get("rate"), None)
+        series = self.state.get((offer.get("lender_name"), offer.get("category")))
+        if rate is None or series is None or series.n < self.warmup_runs:
+            return {"anomalous": False}
+        jump = rate - series.mean
+        z = abs(jump) / math.sqrt(max(series.var, VAR_FLOOR))
+        return {
+            "anomalous": z > self.z_threshold and abs(jump) > self.min_jump,
+            "expected_rate": round(series.mean, 3),
+            "jump": round(jump, 3),
+            "z": round(z, 1),
+        }
+
+    def screen(self, offers: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split offers into (accepted, quarantined). Quarantined entries are
+        small summaries for stats_json. Accepted rates are remembered for
+        ``commit``.
+        """
+        accepted, quarantined = [], []
+        for offer in offers:
+            result = self.score(offer)
+            key = (offer.get("lender_name"), offer.get("category"))
+            if result["anomalous"]:
+                self._rejected.setdefault(key, []).append(safe_float(offer.get("rate"), None))
+                quarantined.append({
+                    "lender": offer.get("lender_name"),
+                    "category": offer.get("category"),
+                    "rate": safe_float(offer.get("rate"), None),
+                    "expected_rate": result["expected_rate"],
+                    "jump": result["jump"],
+                    "z": result["z"],
+                })
+                continue
+            accepted.append(offer)
+            rate = safe_float(offer.get("rate"), None)
+            if rate is not None:
+                self._observed.setdefault(key, []).append(rate)
+        return accepted, quarantined
+
+    def commit(self) -> List[Dict[str, Any]]:
+        """
+        Advance every series seen this run by one step (its mean accepted
+        rate) and count strikes for series that were only quarantined.
+        Returns the changed rows.
+        """
+        changed = {}
+        for key, rates in self._observed.items():
+            series = self.state.setdefault(key, SeriesState(0.0, 0.0, 0))
+            series.update(sum(rates) / len(rates))
+            series.strikes = 0
+            changed[key] = series
+        for key, rates in self._rejected.items():
+            if key in self._observed:
+                continue
+            series = self.state[key]
+            series.strikes += 1
+            if series.strikes >= MAX_STRIKES:
+                logger.info(f"Re-basing rate series {key[0]} / {key[1]} after {series.strikes} quarantined runs")
+                series.mean, series.var, series.n, series.strikes = sum(rates) / len(rates), 0.0, 1, 0
+            changed[key] = series
+        self.clear_pending()
+        return [
+            {
+                "lender_name": key[0],
+                "category": key[1],
+                "mean": round(series.mean, 4),
+                "var": round(series.var, 6),
+                "n": series.n,
+                "strikes": series.strikes,
+            }
+            for key, series in changed.items()
+        ]
+
+    def pending(self) -> Dict[str, List[List[Any]]]:
+        """
+        This run's not yet committed observations, JSON-safe, so the shards
+        of a run can hand them to the process that merges it.
+        """
+        return {
+            "observed": [[k[0], k[1], rates] for k, rates in self._observed.items()],
+            "rejected": [[k[0], k[1], rates] for k, rates in self._rejected.items()],
+        }
+
+    def add_pending(self, data: Dict[str, List[List[Any]]]) -> None:
+        """Fold in another process's ``pending()`` before ``commit``."""
+        for name, target in (("observed", self._observed), ("rejected", self._rejected)):
+            for lender_name, category, rates in data.get(name) or []:
+                target.setdefault((lender_name, category), []).extend(rates)
+
+    def clear_pending(self) -> None:
+        self._observed, self._rejected = {}, {}
+
+    def save(self, sb, run_id: int) -> int:
+        rows = self.commit()
+        if rows:
+            sb.call("save_rate_series_state", {"p_run_id": run_id, "p_rows": rows})
+        logger.info(f"📉 Updated {len(rows)} rate series")
+        return len(rows)
@@ -0,0 +1,118 @@
+"""
+Batch APR verification.
+
+``validate_offer`` only range-checks APR, so a mis-mapped column (points
+read as APR and the like) passes as long as the numbers look plausible.
+Here the APR implied by each offer's own rate, points, fees and term is
+recomputed and compared with the published one.
+
+The implied APR is the monthly rate ``i`` (times 12) at which the note
+payment repays only the amount financed (loan minus points and fees):
+
+    M * (1 - (1 + i) ** -n) / i = P - finance_charges
+
+solved for a whole batch at once by Newton iteration in NumPy.
+
+Published APRs may also include charges we do not parse (mortgage
+insurance, third-party fees), so an APR somewhat above the implied one is
+allowed; one below it cannot be explained by missing charges.
+"""
+import logging
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .normalize import term_for_category
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.apr")
+
+# Reg Z tolerance for regular transactions, in percentage points
+APR_TOLERANCE = 0.125
+# Extra room above the implied APR for finance charges we do not parse
+UNPARSED_CHARGES_SLACK = 0.5
+
+# Initial-period APRs of ARMs depend on the future index, so they cannot be
+# recomputed from the offer alone
+SKIP_CATEGORIES = ("5/6 ARM", "7/6 ARM", "10/6 ARM")
+
+NEWTON_ITERATIONS = 20
+
+
+def implied_apr(rate, points, fees, loan_amount, term_months) -> np.ndarray:
+    """
+    APR (percent) implied by arrays of note rate (percent), points (percent
+    of the loan), lender fees (dollars), loan amount and term. NaN where it
+    cannot be computed.
+    """
+    rate = np.asarray(rate, dtype=float)
+    P = np.asarray(loan_amount, dtype=float)
+    n = np.asarray(term_months, dtype=float)
+    charges = P * np.asarray(points, dtype=float) / 100.0 + np.asarray(fees, dtype=float)
+    financed = P - charges
+
+    r = rate / 1200.0
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        payment = P * r / (1.0 - (1.0 + r) ** -n)
+        # Start a little above the note rate; prepaid charges only raise APR
+        i = r * P / np.where(financed > 0, financed, np.nan)
+        for _ in range(NEWTON_ITERATIONS):
+            g = (1.0 + i) ** -n
+            annuity = (1.0 - g) / i
+            f = payment * annuity - financed
+            d_annuity = (n * g / (1.0 + i) * i - (1.0 - g)) / (i * i)
+            step = f / (payment * d_annuity)
+            i = i - step
+            if np.all(~np.isfinite(step) | (np.abs(step) < 1e-12)):
+                break
+    apr = i * 1200.0
+    apr[~(rate > 0) | ~(financed > 0) | ~np.isfinite(apr)] = np.nan
+    return apr
+
+
+def check_aprs(
+    offers: Sequence[Dict[str, Any]],
+    tolerance: float = APR_TOLERANCE,
+    slack: float = UNPARSED_CHARGES_SLACK,
+) -> List[Dict[str, Any]]:
+    """
+    Recompute the implied APR for every offer and return one finding per
+    offer whose published APR falls outside
+    ``[implied - tolerance, implied + tolerance + slack]``.
+
+    Each finding has ``index`` (into ``offers``), ``implied_apr``,
+    ``published_apr`` and ``deviation`` (published - implied).
+    """
+    count = len(offers)
+    if not count:
+        return []
+    rate = np.full(count, np.nan)
+    apr = np.full(count, np.nan)
+    points = np.zeros(count)
+    fees = np.zeros(count)
+    amount = np.zeros(count)
+    term = np.zeros(count)
+    for k, o in enumerate(offers):
+        if o.get("category") in SKIP_CATEGORIES:
+            continue
+        rate[k] = safe_float(o.get("rate"), np.nan)
+        apr[k] = safe_float(o.get("apr"), np.nan)
+        points[k] = safe_float(o.get("points"), 0.0)
+        fees[k] = safe_float(o.get("lender_fees"), 0.0)
+        amount[k] = safe_float(o.get("loan_amount"), np.nan)
+        term[k] = o.get("term_months") or term_for_category(o.get("category"))
+
+    implied = implied_apr(rate, points, fees, amount, term)
+    deviation = apr - implied
+    with np.errstate(invalid="ignore"):
+        flagged = np.flatnonzero((deviation < -tolerance) | (deviation > tolerance + slack))
+
+    return [
+        {
+            "index": int(k),
+            "implied_apr": round(float(implied[k]), 3),
+            "published_apr": float(apr[k]),
+            "deviation": round(float(deviation[k]), 3),
+        }
+        for k in flagged
+    ]
@@ -0,0 +1,228 @@
+"""
+Static JSON artifacts of the published rates.
+
+After each successful run the collector renders what the rates page needs
+into a directory that any static host or CDN can serve, so the page no
+longer queries Supabase (and recomputes status, lender counts and the
+per-category grouping) on every render:
+
+    rates.json                  status, stats and the top offers per category
+    summary.json                per-category market summary (migration 013)
+    categories/<slug>.json      every published offer of a category, sorted
+    manifest.json               files with their hashes, plus a content_hash
+
+Offers are sorted by APR, then rate (missing values last), the order the
+page used. Each file is written atomically (temp file + rename) and only
+when its content changed, next to optional ``.gz`` / ``.br`` pre-compressed
+copies; manifest.json goes last, so a reader that sees a new manifest sees
+every file it lists. ``content_hash`` changes only when the data does.
+
+    python -m mortgage_tracker.artifacts build out/   # from the published run
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+from .sketch import get_market_summary
+
+try:
+    import brotli
+except ImportError:  # optional: .br copies are skipped
+    brotli = None
+
+logger = logging.getLogger("mortgage_tracker.artifacts")
+
+# The categories the rates page always shows, in page order
+CATEGORIES = ("30Y fixed", "15Y fixed", "5/6 ARM", "FHA 30Y", "VA 30Y")
+TOP_N = 10
+LIVE_MIN_LENDERS = 10
+CODECS = ("gzip", "br")
+
+
+def _num(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _sort_key(offer: Dict[str, Any]):
+    apr, rate = _num(offer.get("apr")), _num(offer.get("rate"))
+    return (apr is None, apr or 0.0, rate is None, rate or 0.0)
+
+
+def site_status(is_fallback: bool, distinct_lenders: int) -> str:
+    """live / partial / sample / none, as the rates page labels the data."""
+    if is_fallback:
+        return "sample"
+    if distinct_lenders >= LIVE_MIN_LENDERS:
+        return "live"
+    if distinct_lenders >= 1:
+        return "partial"
+    return "none"
+
+
+def category_slug(category: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", category.lower()).strip("-")
+
+
+def build_artifacts(offers: List[Dict[str, Any]], summary: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    File name -> JSON payload for the published ``offers``
+    (``get_latest_rates_with_fallback``) and run ``summary``
+    (``get_market_summary``). Pure; nothing is written.
+    """
+    summary = summary or {}
+    is_fallback = bool(summary.get("is_fallback", offers[0].get("is_fallback") if offers else False))
+    distinct_lenders = summary.get("distinct_lenders")
+    if distinct_lenders is None:
+        distinct_lenders = len({o.get("lender_name") for o in offers})
+
+    by_category: Dict[str, List[Dict[str, Any]]] = {c: [] for c in CATEGORIES}
+    for offer in offers:
+        by_category.setdefault(offer.get("category"), []).append(offer)
+    for rows in by_category.values():
+        rows.sort(key=_sort_key)
+
+    stats = {
+        "total_offers": summary.get("offers_total", len(offers)),
+        "distinct_lenders": distinct_lenders,
+        "last_run_at": summary.get("last_updated"),
+        "is_fallback": is_fallback,
+    }
+    meta = {"run_id": summary.get("run_id"), "data_source": summary.get("data_source")}
+
+    files: Dict[str, Any] = {
+        "rates.json": {
+            **meta,
+            "status": site_status(is_fallback, distinct_lenders),
+            "stats": stats,
+            "categories": list(by_category),
+            "rates": {c: rows[:TOP_N] for c, rows in by_category.items()},
+        },
+        "summary.json": {**meta, **stats, "market": summary.get("market") or {}},
+    }
+    for category, rows in by_category.items():
+        files[f"categories/{category_slug(category)}.json"] = {**meta, "category": category, "offers": rows}
+    return files
+
+
+def _json_default(value):
+    # The COPY writer returns numeric columns as Decimal; REST returns numbers
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode(payload: Any) -> bytes:
+    return json.dumps(payload, separators=(",", ":"), sort_keys=True, default=_json_default).encode("utf-8")
+
+
+def _compressed(codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def _write_atomic(path: str, data: bytes) -> bool:
+    """Write ``data`` to ``path`` unless it already holds exactly that. Returns True if written."""
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp-{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+
+def write_artifacts(root: str, files: Dict[str, Any], compress: Sequence[str] = ("gzip",)) -> Dict[str, Any]:
+    """Write ``build_artifacts`` output under ``root``. Returns the manifest."""
+    codecs = [c for c in compress if c in CODECS]
+    if "br" in codecs and brotli is None:
+        logger.warning("⚠️  brotli is not installed, skipping .br artifacts (pip install .[brotli])")
+        codecs.remove("br")
+
+    entries = {}
+    written = 0
+    for name in sorted(files):
+        data = _encode(files[name])
+        path = os.path.join(root, name)
+        changed = _write_atomic(path, data)
+        written += changed
+        for codec in codecs:
+            compressed_path = f"{path}.{'gz' if codec == 'gzip' else codec}"
+            if changed or not os.path.exists(compressed_path):
+                _write_atomic(compressed_path, _compressed(codec, data))
+        entries[name] = {"sha256": hashlib.sha256(data).hexdigest(), "bytes": len(data)}
+
+    content_hash = hashlib.sha256(
+        "".join(f"{name}:{entry['sha256']}\n" for name, entry in sorted(entries.items())).encode("utf-8")
+    ).hexdigest()[:16]
+    manifest = {
+        "run_id": files.get("rates.json", {}).get("run_id"),
+        "content_hash": content_hash,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "encodings": codecs,
+        "files": entries,
+    }
+    # Last, and only when something changed: readers key off the manifest
+    manifest_path = os.path.join(root, "manifest.json")
+    previous = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "rb") as f:
+            previous = json.loads(f.read() or b"{}")
+    if written or not previous or previous.get("content_hash") != content_hash:
+        data = _encode(manifest)
+        _write_atomic(manifest_path, data)
+        for codec in codecs:
+            _write_atomic(f"{manifest_path}.{'gz' if codec == 'gzip' else codec}", _compressed(codec, data))
+    else:
+        manifest = previous
+    logger.info(f"🗂️  Artifacts in {root}: {written} of {len(entries)} file(s) changed, content {content_hash}")
+    return manifest
+
+
+def publish_artifacts(sb, root: str, compress: Sequence[str] = ("gzip",)) -> Dict[str, Any]:
+    """Render the currently published rates (with sample fallback) into ``root``."""
+    offers = sb.call("get_latest_rates_with_fallback", {"include_sample": True}) or []
+    summary = get_market_summary(sb, include_sample=True)
+    return write_artifacts(root, build_artifacts(offers, summary), compress)
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Write static JSON artifacts of the published rates")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Render the published run into a directory")
+    p.add_argument("root", nargs="?", default=None, help="Output directory (default: ARTIFACTS_DIR)")
+
+    args = parser.parse_args()
+    cfg = load_config(args.sources)
+    root = args.root or cfg.artifacts_dir
+    if not root:
+        parser.error("no output directory: pass one or set ARTIFACTS_DIR")
+
+    manifest = publish_artifacts(make_writer(cfg), root, cfg.artifacts_compress)
+    json.dump(manifest, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
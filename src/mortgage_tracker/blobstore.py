@@ -0,0 +1,104 @@
+"""
+Content-addressed, compressed storage for raw snapshot pages.
+
+With ``SNAPSHOT_STORE=blob`` the collector compresses each fetched page,
+stores it once in ``snapshot_blobs`` keyed by the sha256 of the raw text and
+records only that hash on ``rate_snapshots``. Pages that did not change since
+the last run cost one hash lookup and no upload.
+
+Use ``snapshot_text`` to read a snapshot back regardless of how it was stored.
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional: falls back to gzip
+    zstandard = None
+
+logger = logging.getLogger("mortgage_tracker.blobstore")
+
+
+@dataclass
+class Blob:
+    sha256: str
+    codec: str
+    raw_bytes: int
+    data: bytes
+
+    @property
+    def stored_bytes(self) -> int:
+        return len(self.data)
+
+
+def encode_blob(text: str) -> Blob:
+    """Hash and compress a page body (zstd when available, gzip otherwise)."""
+    raw = text.encode("utf-8")
+    sha = hashlib.sha256(raw).hexdigest()
+    if zstandard is not None:
+        codec, data = "zstd", zstandard.ZstdCompressor(level=10).compress(raw)
+    else:
+        codec, data = "gzip", gzip.compress(raw, compresslevel=9)
+    return Blob(sha256=sha, codec=codec, raw_bytes=len(raw), data=data)
+
+
+def decode_blob(codec: str, data: bytes) -> str:
+    if codec == "gzip":
+        return gzip.decompress(data).decode("utf-8")
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("snapshot blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+    raise ValueError(f"Unknown blob codec: {codec}")
+
+
+def externalize_snapshot(sb, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Move a snapshot's raw_text into the blob store, leaving only its hash."""
+    text = snapshot.get("raw_text")
+    if not text:
+        return snapshot
+    blob = encode_blob(text)
+    sb.put_blob(blob)
+    snapshot["raw_text"] = None
+    snapshot["raw_sha256"] = blob.sha256
+    return snapshot
+
+
+def snapshot_text(sb, snapshot: Dict[str, Any]) -> Optional[str]:
+    """Return the raw page for a rate_snapshots row, inline or blob-backed."""
+    if snapshot.get("raw_text") is not None:
+        return snapshot["raw_text"]
+    sha = snapshot.get("raw_sha256")
+    if not sha:
+        return None
+    found = sb.get_blob(sha)
+    if found is None:
+        raise LookupError(f"snapshot blob {sha} is missing")
+    codec, data = found
+    return decode_blob(codec, data)
+
+
+def main():
+    """Print the raw page of a stored snapshot (for debugging and re-parsing)."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Read raw snapshot pages")
+    parser.add_argument("snapshot_id", type=int, help="rate_snapshots.id to print")
+    args = parser.parse_args()
+
+    sb = make_writer(load_config())
+    snapshot = sb.get_snapshot(args.snapshot_id)
+    if snapshot is None:
+        print(f"snapshot {args.snapshot_id} not found", file=sys.stderr)
+        sys.exit(1)
+    sys.stdout.write(snapshot_text(sb, snapshot) or "")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,20 @@
+import hashlib
+import json
+import logging
 import os
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
 
 from dotenv import load_dotenv
 import yaml
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader
+
+logger = logging.getLogger("mortgage_tracker.config")
+
 
 @dataclass
 class Defaults:
@@ -15,29 +25,399 @@ class Defaults:
     lock_days: int = 30
 
 
+RELIABILITY_LEVELS = ("high", "medium", "low", "untested")
+SOURCE_KEYS = {
+    "id", "name", "org_type", "homepage_url", "rate_url", "url", "parser_key", "method",
+    "enabled", "parser_reliability", "tags", "notes", "schedule",
+}
+# Bump when Source or the validation rules change; old cache files are then ignored
+SCHEMA_VERSION = 2
+
+# How often the daemon collects a source: a preset or <n>m / <n>h / <n>d
+SCHEDULE_PRESETS = {"hourly": 3600, "daily": 86400, "weekly": 7 * 86400}
+SCHEDULE_UNITS = {"m": 60, "h": 3600, "d": 86400}
+# Default schedules when a source sets none: by tag first, then by
+# org_type; anything else is collected daily
+DEFAULT_TAG_SCHEDULES = {"needs_quote_flow": "weekly"}
+DEFAULT_SCHEDULES = {"aggregator": "hourly"}
+
+
+def parse_schedule(value: str) -> int:
+    """Seconds between collections for a schedule string. Raises ValueError."""
+    value = value.strip().lower()
+    if value in SCHEDULE_PRESETS:
+        return SCHEDULE_PRESETS[value]
+    number, unit = value[:-1], value[-1:]
+    if unit in SCHEDULE_UNITS and number.isdigit() and int(number) > 0:
+        return int(number) * SCHEDULE_UNITS[unit]
+    raise ValueError(f"schedule must be one of {', '.join(SCHEDULE_PRESETS)} or <n>m/<n>h/<n>d, got {value!r}")
+
+
+@dataclass(frozen=True)
+class Source:
+    """
+    One validated sources.yaml entry. Legacy spellings are resolved here
+    once: ``url`` -> ``rate_url``, ``method`` -> ``parser_key`` (``none``
+    meaning no parser).
+    """
+    name: str
+    id: Optional[str] = None
+    org_type: Optional[str] = None
+    homepage_url: Optional[str] = None
+    rate_url: Optional[str] = None
+    parser_key: Optional[str] = None
+    enabled: bool = False
+    reliability: Optional[str] = None
+    tags: Tuple[str, ...] = ()
+    notes: Optional[str] = None
+    schedule: Optional[str] = None
+
+    @property
+    def interval(self) -> int:
+        """Seconds between collections in daemon mode."""
+        schedule = self.schedule
+        if schedule is None:
+            schedule = next((DEFAULT_TAG_SCHEDULES[t] for t in self.tags if t in DEFAULT_TAG_SCHEDULES), None)
+        return parse_schedule(schedule or DEFAULT_SCHEDULES.get(self.org_type or "", "daily"))
+
+    @property
+    def skip_reason(self) -> Optional[str]:
+        """Why an enabled source cannot be collected, or None."""
+        if not self.rate_url:
+            return "no rate_url"
+        if not self.parser_key:
+            return "no parser_key"
+        return None
+
+    def row(self) -> Dict[str, Any]:
+        """The public.sources columns (``method`` holds the parser key)."""
+        return {
+            "name": self.name,
+            "org_type": self.org_type,
+            "homepage_url": self.homepage_url,
+            "rate_url": self.rate_url,
+            "method": self.parser_key or "unknown",
+            "enabled": self.enabled,
+            "notes": self.notes,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form, for the disk cache and run jobs."""
+        return {**asdict(self), "tags": list(self.tags)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Source":
+        return cls(**{**data, "tags": tuple(data.get("tags") or ())})
+
+
+def _optional_str(entry: Dict[str, Any], key: str, where: str) -> Optional[str]:
+    value = entry.get(key)
+    if value is None:
+        return None
+    if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+        raise ValueError(f"{where}: {key} must be a string, got {type(value).__name__}")
+    return str(value).strip() or None
+
+
+def compile_source(entry: Any, index: int) -> Source:
+    """Validate one raw sources.yaml entry. Raises ValueError naming the entry."""
+    where = f"sources[{index}]"
+    if not isinstance(entry, dict):
+        raise ValueError(f"{where}: expected a mapping, got {type(entry).__name__}")
+    unknown = set(entry) - SOURCE_KEYS
+    if unknown:
+        raise ValueError(f"{where}: unknown key(s) {', '.join(sorted(map(str, unknown)))}")
+
+    name = _optional_str(entry, "name", where) or _optional_str(entry, "id", where)
+    if not name:
+        raise ValueError(f"{where}: name is required")
+    where = f"{where} ({name})"
+
+    enabled = entry.get("enabled", False)
+    if not isinstance(enabled, bool):
+        raise ValueError(f"{where}: enabled must be true or false, got {enabled!r}")
+
+    rate_url = _optional_str(entry, "rate_url", where) or _optional_str(entry, "url", where)
+    homepage_url = _optional_str(entry, "homepage_url", where)
+    for key, value in (("rate_url", rate_url), ("homepage_url", homepage_url)):
+        if value and not value.startswith(("http://", "https://")):
+            raise ValueError(f"{where}: {key} must be an http(s) URL, got {value!r}")
+
+    parser_key = _optional_str(entry, "parser_key", where) or _optional_str(entry, "method", where)
+    if parser_key == "none":
+        parser_key = None
+
+    reliability = _optional_str(entry, "parser_reliability", where)
+    if reliability is not None and reliability not in RELIABILITY_LEVELS:
+        raise ValueError(f"{where}: parser_reliability must be one of {RELIABILITY_LEVELS}, got {reliability!r}")
+
+    tags = entry.get("tags") or []
+    if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+        raise ValueError(f"{where}: tags must be a list of strings")
+
+    schedule = _optional_str(entry, "schedule", where)
+    if schedule is not None:
+        try:
+            parse_schedule(schedule)
+        except ValueError as e:
+            raise ValueError(f"{where}: {e}") from None
+
+    return Source(
+        name=name,
+        id=_optional_str(entry, "id", where),
+        org_type=_optional_str(entry, "org_type", where),
+        homepage_url=homepage_url,
+        rate_url=rate_url,
+        parser_key=parser_key,
+        enabled=enabled,
+        reliability=reliability,
+        tags=tuple(tags),
+        notes=_optional_str(entry, "notes", where),
+        schedule=schedule,
+    )
+
+
+def compile_sources_file(text: str, path: str = "sources.yaml") -> Tuple[Dict[str, Any], List[Source]]:
+    """Parse and validate a sources file: (raw defaults mapping, sources)."""
+    data = yaml.load(text, Loader=SafeLoader) or {}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping with 'defaults' and 'sources'")
+    defaults = data.get("defaults") or {}
+    if not isinstance(defaults, dict):
+        raise ValueError(f"{path}: defaults must be a mapping")
+    entries = data.get("sources") or []
+    if not isinstance(entries, list):
+        raise ValueError(f"{path}: sources must be a list")
+
+    sources = []
+    seen = set()
+    for i, entry in enumerate(entries):
+        try:
+            source = compile_source(entry, i)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+        if source.name in seen:
+            raise ValueError(f"{path}: sources[{i}]: duplicate source name {source.name!r}")
+        seen.add(source.name)
+        sources.append(source)
+    return defaults, sources
+
+
+# path -> (mtime_ns, size, sha256, defaults, sources)
+_compiled: Dict[str, Tuple[int, int, str, Dict[str, Any], List[Source]]] = {}
+_dotenv_loaded = False
+
+
+def _cache_path(sha: str) -> Optional[str]:
+    cache_dir = os.environ.get("CONFIG_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mortgage-tracker"))
+    if cache_dir.lower() in ("", "off", "none"):
+        return None
+    return os.path.join(os.path.expanduser(cache_dir), f"sources-v{SCHEMA_VERSION}-{sha[:32]}.json")
+
+
+def _read_cache(sha: str) -> Optional[Tuple[Dict[str, Any], List[Source]]]:
+    path = _cache_path(sha)
+    if not path:
+        return None
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("sha256") != sha:
+            return None
+        return data["defaults"], [Source.from_dict(s) for s in data["sources"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _write_cache(sha: str, defaults: Dict[str, Any], sources: List[Source]) -> None:
+    path = _cache_path(sha)
+    if not path:
+        return
+    try:
+        text = json.dumps({"sha256": sha, "defaults": defaults, "sources": [s.to_dict() for s in sources]})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    except (OSError, TypeError) as e:
+        # Defaults that are not plain JSON (e.g. YAML dates) or a read-only home: just don't cache
+        logger.debug("config_cache_write_failed", extra={"error": str(e)})
+
+
+def load_sources(sources_path: str = "sources.yaml") -> Tuple[Dict[str, Any], List[Source]]:
+    """
+    Compiled (defaults, sources) of a sources file, cached in-process by
+    (mtime, size) and on disk by content hash, so an unchanged file is
+    parsed and validated once.
+    """
+    path = os.path.abspath(sources_path)
+    st = os.stat(path)
+    hit = _compiled.get(path)
+    if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+        return hit[3], hit[4]
+
+    with open(path, "rb") as f:
+        raw = f.read()
+    sha = hashlib.sha256(raw).hexdigest()
+    if hit and hit[2] == sha:
+        compiled = hit[3], hit[4]
+    else:
+        compiled = _read_cache(sha)
+        if compiled is None:
+            compiled = compile_sources_file(raw.decode("utf-8"), sources_path)
+            _write_cache(sha, *compiled)
+    _compiled[path] = (st.st_mtime_ns, st.st_size, sha, *compiled)
+    return compiled
+
+
+def merge_catalogs(paths: Sequence[str]) -> Tuple[Dict[str, Any], List[Source]]:
+    """
+    Load several sources files as one catalog. Defaults come from the
+    first file; a source whose name already appeared in an earlier file
+    is dropped.
+    """
+    defaults: Dict[str, Any] = {}
+    merged: List[Source] = []
+    seen = set()
+    for i, path in enumerate(paths):
+        file_defaults, sources = load_sources(path)
+        if i == 0:
+            defaults = file_defaults
+        for source in sources:
+            if source.name in seen:
+                logger.debug("source_duplicate_dropped", extra={"source": source.name, "file": path})
+                continue
+            seen.add(source.name)
+            merged.append(source)
+    return defaults, merged
+
+
+SELECTOR_FIELDS = ("tag", "id", "name", "org_type", "parser", "reliability")
+
+
+@dataclass(frozen=True)
+class SourceSelection:
+    """
+    Which sources a run covers. Values of one field are alternatives; the
+    fields combine with AND. ``only`` holds ``field:value`` selectors
+    (``tag:MA_local``, ``id:dcu``, ...); a bare value matches id or name.
+    """
+    only: Tuple[str, ...] = ()
+    parsers: Tuple[str, ...] = ()
+    reliability: Tuple[str, ...] = ()
+    include_disabled: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.only or self.parsers or self.reliability or self.include_disabled)
+
+    def _criteria(self) -> Dict[str, set]:
+        criteria: Dict[str, set] = {}
+        for selector in self.only:
+            field, sep, value = selector.partition(":")
+            if not sep:
+                field, value = "id_or_name", selector
+            elif field not in SELECTOR_FIELDS:
+                raise ValueError(f"Unknown selector {selector!r}; expected one of {SELECTOR_FIELDS} as field:value")
+            criteria.setdefault(field, set()).add(value)
+        if self.parsers:
+            criteria.setdefault("parser", set()).update(self.parsers)
+        if self.reliability:
+            criteria.setdefault("reliability", set()).update(self.reliability)
+        return criteria
+
+    def select(self, sources: Iterable[Source]) -> List[Source]:
+        criteria = self._criteria()
+        values = {
+            "tag": lambda s: set(s.tags),
+            "id": lambda s: {s.id},
+            "name": lambda s: {s.name},
+            "id_or_name": lambda s: {s.id, s.name},
+            "org_type": lambda s: {s.org_type},
+            "parser": lambda s: {s.parser_key},
+            "reliability": lambda s: {s.reliability},
+        }
+        return [
+            s for s in sources
+            if all(values[field](s) & wanted for field, wanted in criteria.items())
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: list(v) if isinstance(v, tuple) else v for k, v in asdict(self).items() if v}
+
+
 @dataclass
 class Config:
     supabase_url: str
     supabase_service_role_key: str
     email_provider_key: Optional[str]
     defaults: Defaults
-    sources: list
+    sources: List[Source]
+    database_url: Optional[str] = None
+    writer: str = "rest"
+    snapshot_store: str = "inline"
+    snapshot_mode: str = "full"
+    export_dir: Optional[str] = None
+    offer_store: str = "full"
+    offer_keyframe_days: int = 7
+    anomaly_detection: bool = True
+    source_backoff: bool = True
+    artifacts_dir: Optional[str] = None
+    artifacts_compress: Optional[List[str]] = None
+    smtp_host: Optional[str] = None
+    smtp_port: int = 587
+    smtp_user: Optional[str] = None
+    smtp_password: Optional[str] = None
+    smtp_starttls: bool = True
+    email_from: str = "Mortgage Rate Tracker <noreply@updates.namastebostonhomes.com>"
+    email_concurrency: int = 4
+    email_rate_limit: float = 2.0
 
 
-def load_config(sources_path: str = "sources.yaml") -> Config:
-    load_dotenv()
+def load_config(sources_path: Union[str, Sequence[str]] = "sources.yaml") -> Config:
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        load_dotenv()
+        _dotenv_loaded = True
 
     supabase_url = os.environ.get("SUPABASE_URL", "")
     supabase_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY", "")
     email_key = os.environ.get("EMAIL_PROVIDER_KEY", None)
+    database_url = os.environ.get("DATABASE_URL") or None
+    writer = os.environ.get("WRITER", "rest").lower()
+    snapshot_store = os.environ.get("SNAPSHOT_STORE", "inline")
+    snapshot_mode = os.environ.get("SNAPSHOT_MODE", "full")
+    export_dir = os.environ.get("EXPORT_DIR") or None
+    offer_store = os.environ.get("OFFER_STORE", "full")
+    offer_keyframe_days = int(os.environ.get("OFFER_KEYFRAME_DAYS", 7))
+    anomaly_detection = os.environ.get("ANOMALY_DETECTION", "on").lower() not in ("off", "0", "false")
+    source_backoff = os.environ.get("SOURCE_BACKOFF", "on").lower() not in ("off", "0", "false")
+    artifacts_dir = os.environ.get("ARTIFACTS_DIR") or None
+    artifacts_compress = [
+        c.strip() for c in os.environ.get("ARTIFACTS_COMPRESS", "gzip").split(",") if c.strip() not in ("", "none")
+    ]
 
-    if not supabase_url or not supabase_key:
+    # The COPY writer is opt-in: DATABASE_URL alone (set for psql
+    # migrations) keeps the REST writer, which needs the REST credentials.
+    if writer not in ("rest", "postgres"):
+        raise ValueError(f"WRITER must be 'rest' or 'postgres', got {writer!r}")
+    if writer == "postgres" and not database_url:
+        raise ValueError("WRITER=postgres requires DATABASE_URL")
+    if writer == "rest" and (not supabase_url or not supabase_key):
         raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
+    if snapshot_store not in ("inline", "blob"):
+        raise ValueError(f"SNAPSHOT_STORE must be 'inline' or 'blob', got {snapshot_store!r}")
+    if snapshot_mode not in ("full", "trimmed"):
+        raise ValueError(f"SNAPSHOT_MODE must be 'full' or 'trimmed', got {snapshot_mode!r}")
+    if offer_store not in ("full", "changes"):
+        raise ValueError(f"OFFER_STORE must be 'full' or 'changes', got {offer_store!r}")
+    if not set(artifacts_compress) <= {"gzip", "br"}:
+        raise ValueError(f"ARTIFACTS_COMPRESS must list gzip and/or br, got {artifacts_compress!r}")
 
-    with open(sources_path, "r") as f:
-        data = yaml.safe_load(f) or {}
-
-    d = data.get("defaults", {})
+    if isinstance(sources_path, str):
+        d, sources = load_sources(sources_path)
+    else:
+        d, sources = merge_catalogs(sources_path)
     defaults = Defaults(
         state=os.environ.get("DEFAULT_STATE", d.get("state", "MA")),
         loan_amount=int(os.environ.get("DEFAULT_LOAN_AMOUNT", d.get("loan_amount", 600000))),
@@ -46,12 +426,29 @@ def load_config(sources_path: str = "sources.yaml") -> Config:
         lock_days=int(os.environ.get("DEFAULT_LOCK_DAYS", d.get("lock_days", 30))),
     )
 
-    sources = data.get("sources", [])
-
     return Config(
         supabase_url=supabase_url,
         supabase_service_role_key=supabase_key,
         email_provider_key=email_key,
         defaults=defaults,
-        sources=sources,
+        sources=list(sources),
+        database_url=database_url,
+        writer=writer,
+        snapshot_store=snapshot_store,
+        snapshot_mode=snapshot_mode,
+        export_dir=export_dir,
+        offer_store=offer_store,
+        offer_keyframe_days=offer_keyframe_days,
+        anomaly_detection=anomaly_detection,
+        source_backoff=source_backoff,
+        artifacts_dir=artifacts_dir,
+        artifacts_compress=artifacts_compress,
+        smtp_host=os.environ.get("SMTP_HOST") or None,
+        smtp_port=int(os.environ.get("SMTP_PORT", 587)),
+        smtp_user=os.environ.get("SMTP_USER") or None,
+        smtp_password=os.environ.get("SMTP_PASSWORD") or None,
+        smtp_starttls=os.environ.get("SMTP_STARTTLS", "on").lower() not in ("off", "0", "false"),
+        email_from=os.environ.get("EMAIL_FROM") or Config.email_from,
+        email_concurrency=int(os.environ.get("EMAIL_CONCURRENCY", 4)),
+        email_rate_limit=float(os.environ.get("EMAIL_RATE_LIMIT", 2.0)),
     )
@@ -0,0 +1,261 @@
+"""
+Total cost of borrowing across a grid of borrower scenarios.
+
+Ranking on rate then APR assumes one loan (``Defaults``). Real borrowers
+differ in loan size and in how long they keep the loan, which decides
+whether paying points is worth it. ``cost_grid`` computes for every offer x
+loan amount x holding period, in one NumPy pass:
+
+- monthly payment (principal and interest)
+- upfront cost: points (percent of the loan) plus lender fees
+- interest paid over the holding period
+- total cost = upfront + interest over the holding period
+- break-even month against the category's cheapest-upfront offer
+
+``CostEngine`` caches grids per run and offer set so repeated comparison
+tables for the same run are array lookups.
+
+    python -m mortgage_tracker.cost --amount 450000 --years 7 --category "30Y fixed"
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .diff import offer_hash
+from .normalize import term_for_category
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.cost")
+
+DEFAULT_LOAN_AMOUNTS = (300000, 450000, 600000, 800000, 1000000)
+DEFAULT_HORIZONS_MONTHS = (36, 60, 84, 120, 360)
+
+
+@dataclass
+class CostGrid:
+    """Arrays are indexed [offer, loan_amount, horizon] (payment/upfront: [offer, loan_amount])."""
+    offers: List[Dict[str, Any]]
+    loan_amounts: np.ndarray
+    horizons: np.ndarray
+    monthly_payment: np.ndarray
+    upfront: np.ndarray
+    interest: np.ndarray
+    total_cost: np.ndarray
+    break_even_months: np.ndarray
+
+    def position(self, loan_amount: float, horizon_months: int) -> Optional[Tuple[int, int]]:
+        li = np.flatnonzero(self.loan_amounts == loan_amount)
+        hi = np.flatnonzero(self.horizons == horizon_months)
+        if not len(li) or not len(hi):
+            return None
+        return int(li[0]), int(hi[0])
+
+
+def _offer_arrays(offers: Sequence[Dict[str, Any]]):
+    n = len(offers)
+    rate = np.empty(n)
+    points = np.empty(n)
+    fees = np.empty(n)
+    term = np.empty(n)
+    for i, o in enumerate(offers):
+        r = safe_float(o.get("rate"), None)
+        rate[i] = np.nan if r is None else r
+        points[i] = safe_float(o.get("points"), 0.0)
+        fees[i] = safe_float(o.get("lender_fees"), 0.0)
+        term[i] = o.get("term_months") or term_for_category(o.get("category"))
+    return rate, points, fees, term
+
+
+def cost_grid(
+    offers: Sequence[Dict[str, Any]],
+    loan_amounts: Sequence[float] = DEFAULT_LOAN_AMOUNTS,
+    horizons_months: Sequence[int] = DEFAULT_HORIZONS_MONTHS,
+) -> CostGrid:
+    """Evaluate every offer over every (loan amount, holding period). Offers without a rate get NaN."""
+    offers = list(offers)
+    rate, points, fees, term = _offer_arrays(offers)
+    amounts = np.asarray(loan_amounts, dtype=float)
+    horizons = np.asarray(horizons_months, dtype=float)
+
+    r = (rate / 1200.0)[:, None]                      # monthly rate, (O, 1)
+    n = term[:, None]                                  # (O, 1)
+    P = amounts[None, :]                               # (1, L)
+    growth_n = (1.0 + r) ** n
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payment = np.where(r > 0, P * r * growth_n / (growth_n - 1.0), P / n)   # (O, L)
+    payment[np.isnan(rate)] = np.nan
+
+    # Interest paid over the first k payments: k * M - (P - balance_k)
+    k = np.minimum(horizons[None, :], term[:, None])[:, None, :]               # (O, 1, H)
+    r3 = r[:, :, None]
+    growth_k = (1.0 + r3) ** k
+    P3 = P[:, :, None]
+    M3 = payment[:, :, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        balance = np.where(r3 > 0, P3 * growth_k - M3 * (growth_k - 1.0) / r3, P3 - M3 * k)
+    interest = k * M3 - (P3 - balance)                                           # (O, L, H)
+
+    upfront = P * (points[:, None] / 100.0) + fees[:, None]                      # (O, L)
+    total = upfront[:, :, None] + interest
+
+    break_even = _break_even(offers, payment, upfront)
+    return CostGrid(
+        offers=offers,
+        loan_amounts=amounts,
+        horizons=horizons.astype(int),
+        monthly_payment=payment,
+        upfront=upfront,
+        interest=interest,
+        total_cost=total,
+        break_even_months=break_even,
+    )
+
+
+def _break_even(offers, payment: np.ndarray, upfront: np.ndarray) -> np.ndarray:
+    """
+    Months until the payment savings repay the extra upfront cost, against
+    the offer with the lowest upfront cost in the same category (0 if the
+    offer is no more expensive upfront, inf if it never pays back).
+    """
+    categories = np.array([o.get("category") or "" for o in offers], dtype=object)
+    result = np.full(payment.shape, np.inf)
+    for cat in np.unique(categories):
+        rows = np.flatnonzero(categories == cat)
+        valid = rows[~np.isnan(payment[rows, 0])]
+        if not len(valid):
+            continue
+        # Baseline per loan amount: cheapest upfront, then lowest payment
+        for li in range(payment.shape[1]):
+            base = valid[np.lexsort((payment[valid, li], upfront[valid, li]))[0]]
+            extra = upfront[valid, li] - upfront[base, li]
+            saving = payment[base, li] - payment[valid, li]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                months = np.where(saving > 0, np.ceil(extra / saving), np.inf)
+            result[valid, li] = np.where(extra <= 0, 0.0, months)
+    return result
+
+
+def _offers_key(offers: Sequence[Dict[str, Any]]) -> Tuple[int, str]:
+    """Identity of an offer list: its length and a digest of each offer's key and priced fields."""
+    digest = hashlib.blake2b(digest_size=16)
+    for o in offers:
+        digest.update(offer_hash(o).encode("ascii"))
+        for f in ("rate", "points", "lender_fees", "term_months"):
+            digest.update(b"\x1f" + repr(safe_float(o.get(f), None)).encode("ascii"))
+        digest.update(b"\x1e")
+    return len(offers), digest.hexdigest()
+
+
+class CostEngine:
+    """
+    LRU cache of cost grids, keyed on the run, the offer list and the grid
+    axes, so a filtered subset of a run's offers gets its own grid.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple, CostGrid]" = OrderedDict()
+
+    def grid(
+        self,
+        run_id,
+        offers: Sequence[Dict[str, Any]],
+        loan_amounts: Sequence[float] = DEFAULT_LOAN_AMOUNTS,
+        horizons_months: Sequence[int] = DEFAULT_HORIZONS_MONTHS,
+    ) -> CostGrid:
+        key = (run_id, _offers_key(offers), tuple(loan_amounts), tuple(horizons_months))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        grid = cost_grid(offers, loan_amounts, horizons_months)
+        self._cache[key] = grid
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return grid
+
+    def compare(
+        self,
+        run_id,
+        offers: Sequence[Dict[str, Any]],
+        loan_amount: float,
+        horizon_months: int,
+        category: Optional[str] = None,
+        limit: Optional[int] = 10,
+    ) -> List[Dict[str, Any]]:
+        """
+        A comparison table for one borrower: offers ranked by total cost
+        over their holding period, cheapest first.
+        """
+        grid = self.grid(run_id, offers)
+        pos = grid.position(loan_amount, horizon_months)
+        if pos is None:
+            grid = self.grid(run_id, offers, (loan_amount,), (horizon_months,))
+            pos = (0, 0)
+        li, hi = pos
+
+        total = grid.total_cost[:, li, hi]
+        candidates = np.flatnonzero(~np.isnan(total))
+        if category is not None:
+            cats = np.array([o.get("category") for o in grid.offers], dtype=object)
+            candidates = candidates[cats[candidates] == category]
+        order = candidates[np.argsort(total[candidates], kind="stable")][:limit]
+
+        rows = []
+        for i in order:
+            o = grid.offers[i]
+            be = grid.break_even_months[i, li]
+            rows.append({
+                "lender_name": o.get("lender_name"),
+                "category": o.get("category"),
+                "rate": o.get("rate"),
+                "apr": o.get("apr"),
+                "points": o.get("points"),
+                "lender_fees": o.get("lender_fees"),
+                "monthly_payment": round(float(grid.monthly_payment[i, li]), 2),
+                "upfront_cost": round(float(grid.upfront[i, li]), 2),
+                "interest": round(float(grid.interest[i, li, hi]), 2),
+                "total_cost": round(float(total[i]), 2),
+                "break_even_months": None if np.isinf(be) else int(be),
+            })
+        return rows
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .offer_index import load_latest
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Compare latest offers by total cost for one borrower")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    parser.add_argument("--amount", type=float, default=None, help="Loan amount (default: DEFAULT_LOAN_AMOUNT)")
+    parser.add_argument("--years", type=float, default=7, help="How long the loan is kept")
+    parser.add_argument("--category", default=None)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--include-sample", action="store_true")
+    args = parser.parse_args()
+
+    cfg = load_config(args.sources)
+    offers = load_latest(make_writer(cfg), args.include_sample)
+    if not offers:
+        logger.warning("No latest offers published yet")
+        return
+    amount = args.amount or cfg.defaults.loan_amount
+    rows = CostEngine().compare(
+        offers[0].get("run_id"), offers, amount, int(round(args.years * 12)),
+        category=args.category, limit=args.limit,
+    )
+    json.dump(rows, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
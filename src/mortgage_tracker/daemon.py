@@ -0,0 +1,173 @@
+"""
+Resident collector: every source at its own cadence (migration 019).
+
+The daily cron run restarts Python, re-imports the Supabase client,
+reloads the catalog and opens new HTTP connections every time, and it
+collects every source once a day whether its page changes hourly or
+weekly. The daemon stays up instead. It keeps one writer, one keep-alive
+HTTP session and the parser instances warm, and every ``--tick`` seconds
+collects the sources that are due:
+
+    aggregators                      hourly
+    sources tagged needs_quote_flow  weekly
+    everything else                  daily
+    schedule: 6h  (in sources.yaml)  overrides the default
+
+Each tick with due sources is one run over just those sources. It
+replaces only their published rows (``publish_run_sources``); its change
+set and alerts cover only those sources as well. sources.yaml is
+re-checked on every tick (cheap: ``load_sources`` caches by mtime), so
+edits take effect without a restart. A broken edit is logged and the
+previous catalog is kept.
+
+    python -m mortgage_tracker.daemon
+    python -m mortgage_tracker.daemon --sources sources.yaml --tick 30
+"""
+import argparse
+import logging
+import signal
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from .config import Source, load_config
+from .main import Resident, _source_paths, run_collector
+from .supabase_client import make_writer
+
+logger = logging.getLogger("mortgage_tracker.daemon")
+
+TICK = 60.0
+
+
+class Schedule:
+    """When each source (by name) is next due: its interval after it was collected."""
+
+    def __init__(self):
+        self._next: Dict[str, float] = {}
+
+    def due(self, sources: Iterable[Source], now: float) -> List[Source]:
+        return [s for s in sources if now >= self._next.get(s.name, float("-inf"))]
+
+    def mark(self, sources: Iterable[Source], now: float) -> None:
+        for s in sources:
+            self._next[s.name] = now + s.interval
+
+    def defer(self, name: str, until: float) -> None:
+        """Not due before ``until`` (a source in back-off, see health.py)."""
+        self._next[name] = until
+
+    def next_due_in(self, sources: Iterable[Source], now: float) -> Optional[float]:
+        """Seconds until the next source is due (0 if one is due now), or None without sources."""
+        waits = [self._next.get(s.name, float("-inf")) - now for s in sources]
+        return max(0.0, min(waits)) if waits else None
+
+    def forget(self, names: Iterable[str]) -> None:
+        for name in names:
+            self._next.pop(name, None)
+
+
+def _collectable(sources: Iterable[Source]) -> List[Source]:
+    return [s for s in sources if s.enabled and not s.skip_reason]
+
+
+def run_daemon(
+    run_type: str = "real",
+    sources_path: Union[str, Sequence[str], None] = None,
+    tick: float = TICK,
+    max_runs: Optional[int] = None,
+) -> int:
+    """Collect due sources until SIGTERM/SIGINT (or ``max_runs`` runs). Returns the runs made."""
+    paths = _source_paths(sources_path)
+    config_arg = paths[0] if len(paths) == 1 else paths
+    resident = Resident(load_config(config_arg))
+    schedule = Schedule()
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+
+    active = _collectable(resident.cfg.sources)
+    logger.info(f"🛰️  Daemon started: {len(active)} source(s) from {', '.join(paths)}, tick {tick:.0f}s")
+    runs = 0
+    reload_error = None
+    try:
+        while not stop.is_set():
+            try:
+                cfg = load_config(config_arg)
+            except Exception as e:
+                # Once per broken edit, not once per tick
+                if str(e) != reload_error:
+                    logger.warning(f"⚠️  Keeping the previous catalog, reload failed: {e}")
+                reload_error = str(e)
+            else:
+                reload_error = None
+                if cfg.sources != resident.cfg.sources:
+                    before = {s.name: s for s in resident.cfg.sources}
+                    after = {s.name: s for s in cfg.sources}
+                    changed = [n for n in after.keys() & before.keys() if after[n] != before[n]]
+                    logger.info(
+                        f"🔁 Catalog reloaded: {len(after.keys() - before.keys())} added, "
+                        f"{len(before.keys() - after.keys())} removed, {len(changed)} changed"
+                    )
+                    schedule.forget(before.keys() - after.keys())
+                resident.cfg = cfg
+            active = _collectable(resident.cfg.sources)
+
+            now = time.time()
+            due = schedule.due(active, now)
+            failed = False
+            if due:
+                logger.info(f"⏰ {len(due)} of {len(active)} source(s) due")
+                try:
+                    result = run_collector(run_type=run_type, sources_path=paths, resident=resident, scheduled=due)
+                except Exception as e:
+                    # Nothing is marked: the due sources are retried on the next tick
+                    failed = True
+                    logger.exception(f"Scheduled run failed: {e}")
+                    # The connection may be what broke; start the next run on a fresh one
+                    try:
+                        resident.sb.close()
+                    except Exception as close_error:
+                        logger.warning(f"⚠️  Closing the writer after the failed run: {close_error}")
+                    resident.sb = make_writer(resident.cfg)
+                else:
+                    collected = set(result["collected"])
+                    schedule.mark([s for s in due if s.name in collected], now)
+                    # Back-off deferred sources come due again when their probe does, not an interval later
+                    for name, probe_at in result["deferred"].items():
+                        schedule.defer(name, probe_at.timestamp())
+                runs += 1
+                if max_runs is not None and runs >= max_runs:
+                    break
+
+            wait = tick if failed else schedule.next_due_in(active, time.time())
+            stop.wait(max(1.0, min(tick, wait if wait is not None else tick)))
+    finally:
+        resident.close()
+    logger.info(f"🛰️  Daemon stopped after {runs} run(s)")
+    return runs
+
+
+def main():
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Collect each source on its own schedule")
+    parser.add_argument(
+        "--sources",
+        action="append",
+        default=None,
+        help="Path to sources.yaml file (default: sources.yaml in cwd); repeat to merge several catalogs"
+    )
+    parser.add_argument("--run-type", choices=["real", "sample"], default="real")
+    parser.add_argument("--tick", type=float, default=TICK, help="Seconds between schedule checks")
+    parser.add_argument("--max-runs", type=int, default=None, help="Exit after this many runs")
+    args = parser.parse_args()
+
+    try:
+        run_daemon(run_type=args.run_type, sources_path=args.sources, tick=args.tick, max_runs=args.max_runs)
+    except Exception as e:
+        logger.exception(f"Fatal error: {e}")
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Run-to-run change feed (migration 010).
+
+At the end of each successful real run the collector compares the run's
+offers with the previous successful real run and stores a compact change
+set on ``run_diffs``:
+
+    {"added": [...], "removed": [...], "repriced": [...], "unchanged": 412}
+
+Offers are matched on a short hash of (lender, category, loan profile),
+the same identity ``refresh_latest_rates`` de-duplicates on, so matching
+is one dict lookup per offer.
+
+    python -m mortgage_tracker.diff show            # published run
+    python -m mortgage_tracker.diff show 1234
+    python -m mortgage_tracker.diff compute 1234    # recompute and store
+    python -m mortgage_tracker.diff compare 1200 1234
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.diff")
+
+# Smallest move (percentage points) reported as a reprice
+PRICE_EPSILON = 0.0005
+
+KEY_FIELDS = ("lender_name", "category", "loan_amount", "ltv", "fico", "lock_days", "points")
+NUMERIC_KEY_FIELDS = ("loan_amount", "ltv", "fico", "lock_days", "points")
+
+# Fields whose change makes change-only storage write a new row
+PRICED_FIELDS = ("rate", "apr", "lender_fees", "state", "term_months")
+
+
+def offer_hash(offer: Dict[str, Any]) -> str:
+    """Stable 16-hex-digit key for an offer's lender, category and loan profile."""
+    parts = []
+    for f in KEY_FIELDS:
+        value = offer.get(f)
+        if f in NUMERIC_KEY_FIELDS:
+            # 600000, "600000" and Decimal("600000.00") must hash alike
+            value = safe_float(value, None)
+        parts.append("" if value is None else repr(value))
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _summary(key: str, offer: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "key": key,
+        "lender_name": offer.get("lender_name"),
+        "category": offer.get("category"),
+        "points": safe_float(offer.get("points"), None),
+        "lock_days": offer.get("lock_days"),
+        "rate": safe_float(offer.get("rate"), None),
+        "apr": safe_float(offer.get("apr"), None),
+    }
+
+
+def _delta(new, old) -> Optional[float]:
+    if new is None or old is None:
+        return None
+    return round(new - old, 4)
+
+
+def _moved(new, old) -> bool:
+    if new is None or old is None:
+        return (new is None) != (old is None)
+    return abs(new - old) >= PRICE_EPSILON
+
+
+def diff_offers(previous: Iterable[Dict[str, Any]], current: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Change set turning ``previous`` into ``current`` (real offers only)."""
+    before = {offer_hash(o): o for o in previous if o.get("data_source", "real") == "real"}
+    after = {offer_hash(o): o for o in current if o.get("data_source", "real") == "real"}
+
+    added = [_summary(k, o) for k, o in after.items() if k not in before]
+    removed = [_summary(k, o) for k, o in before.items() if k not in after]
+    repriced = []
+    unchanged = 0
+    for key, new in after.items():
+        old = before.get(key)
+        if old is None:
+            continue
+        row = _summary(key, new)
+        old_rate = safe_float(old.get("rate"), None)
+        old_apr = safe_float(old.get("apr"), None)
+        if not _moved(row["rate"], old_rate) and not _moved(row["apr"], old_apr):
+            unchanged += 1
+            continue
+        row.update(
+            prev_rate=old_rate,
+            rate_delta=_delta(row["rate"], old_rate),
+            prev_apr=old_apr,
+            apr_delta=_delta(row["apr"], old_apr),
+        )
+        repriced.append(row)
+
+    sort_key = lambda r: (r["category"] or "", r["lender_name"] or "", r["key"])  # noqa: E731
+    return {
+        "added": sorted(added, key=sort_key),
+        "removed": sorted(removed, key=sort_key),
+        "repriced": sorted(repriced, key=sort_key),
+        "unchanged": unchanged,
+    }
+
+
+def _price_changed(offer: Dict[str, Any], stored: Dict[str, Any]) -> bool:
+    for f in PRICED_FIELDS:
+        new, old = offer.get(f), stored.get(f)
+        if isinstance(new, str) or isinstance(old, str):
+            if new != old:
+                return True
+        elif _moved(safe_float(new, None), safe_float(old, None)):
+            return True
+    return False
+
+
+def _stored_at(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def changed_offers(
+    offers: List[Dict[str, Any]],
+    stored: Iterable[Dict[str, Any]],
+    keyframe_days: int = 7,
+) -> List[Dict[str, Any]]:
+    """
+    The offers change-only storage has to write (migration 011): new keys,
+    repriced offers, and offers whose stored row is older than
+    ``keyframe_days`` (re-stored so old partitions can be dropped). Sets
+    ``offer_key`` on every offer.
+
+    ``stored`` is the source's current state, ``get_source_offer_state``.
+    """
+    state = {row["offer_key"]: row for row in stored}
+    cutoff = datetime.now(timezone.utc) - timedelta(days=keyframe_days)
+    changed = []
+    for offer in offers:
+        key = offer["offer_key"] = offer_hash(offer)
+        prev = state.get(key)
+        if prev is None or _price_changed(offer, prev) or _stored_at(prev["created_at"]) < cutoff:
+            changed.append(offer)
+    return changed
+
+
+def diff_run(sb, run_id: int, offers: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Diff a finished run against the previous successful run of its type and
+    store the result. ``offers`` saves re-reading the run when the caller
+    still has them.
+    """
+    base_run_id = sb.call("get_previous_run_id", {"p_run_id": run_id})
+    previous = sb.get_run_offers(base_run_id) if base_run_id else []
+    current = offers if offers is not None else sb.get_run_offers(run_id)
+    return store_diff(sb, run_id, base_run_id, previous, current)
+
+
+def store_diff(
+    sb, run_id: int, base_run_id: Optional[int], previous: List[Dict[str, Any]], current: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Diff ``current`` (the run's offers) against ``previous`` and store it as the run's change set."""
+    changes = diff_offers(previous, current)
+    sb.call("store_run_diff", {"p_run_id": run_id, "p_base_run_id": base_run_id, "p_diff": changes})
+    logger.info(
+        f"🔀 Run {run_id} vs {base_run_id}: {len(changes['added'])} added, "
+        f"{len(changes['removed'])} removed, {len(changes['repriced'])} repriced, "
+        f"{changes['unchanged']} unchanged"
+    )
+    return changes
+
+
+def get_run_diff(sb, run_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Stored change set of a run (default: the published real run)."""
+    return sb.call("get_run_diff", {"p_run_id": run_id})
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Run-to-run offer changes")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("show", help="Print the stored change set of a run")
+    p.add_argument("run_id", type=int, nargs="?", default=None)
+
+    p = sub.add_parser("compute", help="(Re)compute and store the change set of a run")
+    p.add_argument("run_id", type=int)
+
+    p = sub.add_parser("compare", help="Diff any two runs without storing")
+    p.add_argument("base_run_id", type=int)
+    p.add_argument("run_id", type=int)
+
+    args = parser.parse_args()
+    sb = make_writer(load_config(args.sources))
+
+    if args.command == "show":
+        result = get_run_diff(sb, args.run_id)
+    elif args.command == "compute":
+        result = diff_run(sb, args.run_id)
+    else:
+        result = diff_offers(sb.get_run_offers(args.base_run_id), sb.get_run_offers(args.run_id))
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
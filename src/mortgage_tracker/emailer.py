@@ -1,8 +1,53 @@
+"""
+Email delivery for rate alerts (migrations 014, 015).
+
+The collector never sends mail itself: it only queues one ``alert_batches``
+row per subscriber (``alerts.queue_alerts``) and exits, so run time does not
+depend on the provider. Delivery is a separate step:
+
+    python -m mortgage_tracker.emailer deliver
+
+which claims pending batches under a lease, renders them, and sends them
+through a ``DeliveryPipeline``:
+
+- bodies are rendered once per unique content and cached, so subscribers
+  with the same matches share one rendering;
+- at most ``EMAIL_CONCURRENCY`` messages are in flight, each worker thread
+  keeping one SMTP connection open;
+- a token bucket holds each provider to ``EMAIL_RATE_LIMIT`` messages/s;
+- transient errors (4xx replies, dropped connections) are retried with
+  exponential back-off; a batch that still fails returns to the queue with
+  a longer back-off until ``MAX_ATTEMPTS``, permanent (5xx) errors fail it.
+
+To try it locally, point it at an SMTP sink:
+
+    python -m aiosmtpd -n -l localhost:1025 &
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_STARTTLS=off python -m mortgage_tracker.emailer deliver
+"""
+import argparse
+import hashlib
+import html
+import json
 import logging
-from typing import Optional
+import smtplib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from email.message import EmailMessage
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_exponential
 
 logger = logging.getLogger("mortgage_tracker.emailer")
 
+SITE_URL = "https://www.namastebostonhomes.com/rates"
+MAX_ATTEMPTS = 5
+RETRY_AFTER_SECONDS = 300  # doubled per attempt
+
 
 def send_daily_summary(api_key: Optional[str], summary_text: str) -> None:
     # Optional stub: integrate with email provider (SendGrid, Postmark, etc.)
@@ -11,3 +56,379 @@ def send_daily_summary(api_key: Optional[str], summary_text: str) -> None:
         return
     # Implement provider integration here
     logger.info("email_sent_stub", extra={"length": len(summary_text)})
+
+
+# ---------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------
+
+TEXT_ROW = Template("  $category  $lender_name  $rate% (APR $apr%, $points pts)$change")
+TEXT_BODY = Template("""New mortgage offers match your rate alerts:
+
+$rows
+
+Today's rates: $site_url
+""")
+HTML_ROW = Template(
+    "<tr><td>$category</td><td>$lender_name</td><td>$rate%$change</td><td>$apr%</td><td>$points</td></tr>"
+)
+HTML_BODY = Template("""<p>New mortgage offers match your rate alerts:</p>
+<table cellpadding="4">
+<tr><th align="left">Product</th><th align="left">Lender</th><th>Rate</th><th>APR</th><th>Points</th></tr>
+$rows
+</table>
+<p><a href="$site_url">Today's rates</a></p>
+""")
+
+# The fields a rendering depends on (not subscription ids)
+RENDERED_FIELDS = ("category", "lender_name", "rate", "apr", "points", "prev_rate")
+
+
+def _fmt(value, digits: int = 3) -> str:
+    return "—" if value is None else f"{float(value):.{digits}f}"
+
+
+def _row_values(row: Dict[str, Any], escape) -> Dict[str, str]:
+    prev = row.get("prev_rate")
+    return {
+        "category": escape(str(row.get("category") or "")),
+        "lender_name": escape(str(row.get("lender_name") or "")),
+        "rate": _fmt(row.get("rate")),
+        "apr": _fmt(row.get("apr")),
+        "points": _fmt(row.get("points"), 2),
+        "change": f" (was {_fmt(prev)}%)" if prev is not None else "",
+    }
+
+
+def render_alert(matches: List[Dict[str, Any]]) -> Tuple[str, str, str]:
+    """(subject, text, html) for one subscriber's batch."""
+    if len(matches) == 1:
+        m = matches[0]
+        subject = f"Rate alert: {m.get('category')} at {_fmt(m.get('rate'))}% from {m.get('lender_name')}"
+    else:
+        subject = f"Rate alert: {len(matches)} offers match your alerts"
+    text = TEXT_BODY.substitute(
+        rows="\n".join(TEXT_ROW.substitute(_row_values(m, str)) for m in matches),
+        site_url=SITE_URL,
+    )
+    body = HTML_BODY.substitute(
+        rows="\n".join(HTML_ROW.substitute(_row_values(m, html.escape)) for m in matches),
+        site_url=html.escape(SITE_URL),
+    )
+    return subject, text, body
+
+
+class RenderCache:
+    """Renders each distinct batch content once (LRU)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, Tuple[str, str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def content_key(matches: List[Dict[str, Any]]) -> str:
+        content = [[m.get(f) for f in RENDERED_FIELDS] for m in matches]
+        return hashlib.blake2b(json.dumps(content, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+    def render(self, matches: List[Dict[str, Any]]) -> Tuple[str, str, str]:
+        key = self.content_key(matches)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached
+        rendered = render_alert(matches)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = rendered
+            if len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return rendered
+
+
+# ---------------------------------------------------------------
+# Delivery
+# ---------------------------------------------------------------
+
+@dataclass
+class Message:
+    to: str
+    subject: str
+    text: str
+    html: str
+    ref: Any = None  # caller's handle, e.g. the alert batch row
+
+
+@dataclass
+class DeliveryResult:
+    message: Message
+    error: Optional[str] = None
+    transient: bool = False
+    attempts: int = 0
+
+    @property
+    def sent(self) -> bool:
+        return self.error is None
+
+
+class RateLimiter:
+    """Token bucket: at most ``rate`` acquisitions per second, bursts up to ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class SmtpProvider:
+    """SMTP delivery with one reusable connection per worker thread."""
+
+    name = "smtp"
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, sender: str = "noreply@localhost",
+                 starttls: bool = True, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> smtplib.SMTP:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                conn.starttls()
+            if self.username:
+                conn.login(self.username, self.password or "")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def send(self, message: Message) -> None:
+        msg = EmailMessage()
+        msg["From"] = self.sender
+        msg["To"] = message.to
+        msg["Subject"] = message.subject
+        msg.set_content(message.text)
+        msg.add_alternative(message.html, subtype="html")
+        conn = self._connection()
+        try:
+            conn.send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise  # the server answered; the connection is still usable
+        except OSError:
+            # Dropped connection: reconnect on the next attempt
+            self._local.conn = None
+            with self._lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+            raise
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.quit()
+                except Exception:
+                    pass
+            self._connections = []
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Worth retrying: 4xx replies and connection problems; 5xx replies are permanent."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    return isinstance(exc, (smtplib.SMTPServerDisconnected, OSError))
+
+
+class DeliveryPipeline:
+    """
+    Sends messages with bounded concurrency, per-provider rate limits and
+    retries. Its worker threads (and so their SMTP connections) are kept
+    across ``deliver`` calls until ``close``.
+    """
+
+    def __init__(self, provider, concurrency: int = 4, rate_limit: float = 2.0, retries: int = 3):
+        self.provider = provider
+        self.concurrency = max(1, concurrency)
+        self.retries = max(1, retries)
+        self._limiters: Dict[str, RateLimiter] = {provider.name: RateLimiter(rate_limit)}
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def _send(self, message: Message) -> DeliveryResult:
+        result = DeliveryResult(message)
+        limiter = self._limiters[self.provider.name]
+        try:
+            for attempt in Retrying(
+                stop=stop_after_attempt(self.retries),
+                wait=wait_exponential(multiplier=0.5, max=10),
+                retry=retry_if_exception(is_transient),
+                reraise=True,
+            ):
+                with attempt:
+                    result.attempts += 1
+                    limiter.acquire()
+                    self.provider.send(message)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            result.transient = is_transient(e)
+        return result
+
+    def deliver(self, messages: List[Message]) -> List[DeliveryResult]:
+        if not messages:
+            return []
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="deliver")
+        return list(self._pool.map(self._send, messages))
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+@dataclass
+class DeliveryStats:
+    claimed: int = 0
+    sent: int = 0
+    retrying: int = 0
+    failed: int = 0
+    lost: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def deliver_pending(sb, pipeline: DeliveryPipeline, batch_size: int = 100,
+                    cache: Optional[RenderCache] = None, max_rounds: Optional[int] = None) -> DeliveryStats:
+    """Claim, render and send pending alert batches until the queue is empty."""
+    cache = cache or RenderCache()
+    stats = DeliveryStats()
+    rounds = 0
+    while max_rounds is None or rounds < max_rounds:
+        rounds += 1
+        batches = sb.call("claim_alert_batches", {"p_limit": batch_size}) or []
+        if not batches:
+            break
+        stats.claimed += len(batches)
+        messages = []
+        for batch in batches:
+            subject, text, body = cache.render(batch["matches"])
+            messages.append(Message(batch["email"], subject, text, body, ref=batch))
+        for result in pipeline.deliver(messages):
+            batch = result.message.ref
+            retry_after = None
+            if not result.sent and result.transient and batch["attempts"] < MAX_ATTEMPTS:
+                retry_after = RETRY_AFTER_SECONDS * 2 ** (batch["attempts"] - 1)
+            if result.error:
+                stats.errors.append(f"{batch['email']}: {result.error}")
+                logger.warning(f"⚠️  Alert batch {batch['id']} to {batch['email']}: {result.error}")
+            held = sb.call("finish_alert_batch", {
+                "p_id": batch["id"],
+                "p_claimed_until": batch["claimed_until"],
+                "p_sent": result.sent,
+                "p_error": result.error,
+                "p_retry_after_seconds": retry_after,
+            })
+            if not held:
+                # The lease expired and another worker claimed the batch: its outcome stands
+                stats.lost += 1
+                logger.warning(f"⚠️  Alert batch {batch['id']}: lease lost, outcome not recorded")
+            elif result.sent:
+                stats.sent += 1
+            elif retry_after is not None:
+                stats.retrying += 1
+            else:
+                stats.failed += 1
+    logger.info(
+        f"📬 Alerts: {stats.sent} sent, {stats.retrying} to retry, {stats.failed} failed, "
+        f"{stats.lost} lease(s) lost (rendered {cache.misses}, reused {cache.hits})"
+    )
+    return stats
+
+
+def make_provider(cfg) -> SmtpProvider:
+    if not cfg.smtp_host:
+        raise ValueError("SMTP_HOST is required to deliver email")
+    return SmtpProvider(
+        host=cfg.smtp_host,
+        port=cfg.smtp_port,
+        username=cfg.smtp_user,
+        password=cfg.smtp_password or cfg.email_provider_key,
+        sender=cfg.email_from,
+        starttls=cfg.smtp_starttls,
+    )
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Deliver queued rate alert emails")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("deliver", help="Send pending alert batches")
+    p.add_argument("--batch-size", type=int, default=100)
+    p.add_argument("--concurrency", type=int, default=None, help="Default: EMAIL_CONCURRENCY")
+    p.add_argument("--rate-limit", type=float, default=None, help="Messages/s; default: EMAIL_RATE_LIMIT")
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    cfg = load_config(args.sources)
+
+    provider = make_provider(cfg)
+    pipeline = DeliveryPipeline(
+        provider,
+        concurrency=args.concurrency or cfg.email_concurrency,
+        rate_limit=args.rate_limit if args.rate_limit is not None else cfg.email_rate_limit,
+    )
+    try:
+        stats = deliver_pending(make_writer(cfg), pipeline, batch_size=args.batch_size)
+    except Exception as e:
+        logger.exception(f"Fatal error: {e}")
+        sys.exit(3)
+    finally:
+        pipeline.close()
+        provider.close()
+    json.dump({k: v for k, v in stats.__dict__.items() if k != "errors"}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    sys.exit(1 if stats.failed else 0)
+
+
+if __name__ == "__main__":
+    main()
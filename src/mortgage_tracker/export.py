@@ -0,0 +1,441 @@
+"""
+Columnar export of offer and run history for offline analysis.
+
+Each finished run is appended as its own Parquet files in a hive-partitioned
+tree, so exporting never rewrites earlier runs:
+
+    <root>/offers/month=2025-01/category=30Y%20fixed/run-123.parquet
+    <root>/runs/month=2025-01/run-123.parquet
+
+Every row also carries ``date`` (the run's day in America/New_York, same as
+the daily rollups). Once a month is over, ``compact`` folds its per-run files
+into one ``compacted.parquet`` per directory: a year of history is then a few
+dozen files instead of thousands, which is what keeps full-history reads
+fast.
+
+Readers open the tree as a ``pyarrow.dataset`` over memory-mapped files;
+month/category filters skip whole directories, day filters use row-group
+statistics, and aggregations run in Arrow without building Python dicts.
+
+    python -m mortgage_tracker.export backfill --out history/
+    python -m mortgage_tracker.export compact history/
+    python -m mortgage_tracker.export query history/ --category "30Y fixed" --since 2025-01-01
+    python -m mortgage_tracker.export best history/ --category "30Y fixed"
+
+Set ``EXPORT_DIR`` to have the collector export each successful run as it
+finishes. Needs ``pip install .[analytics]``.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+
+logger = logging.getLogger("mortgage_tracker.export")
+
+RUN_DAY_TZ = "America/New_York"
+
+# Offer columns written to the files; month and category live in the path
+OFFER_FIELDS = (
+    ("date", "string"),
+    ("run_id", "int64"),
+    ("source_id", "int64"),
+    ("lender_name", "string"),
+    ("rate", "float64"),
+    ("apr", "float64"),
+    ("points", "float64"),
+    ("lender_fees", "float64"),
+    ("loan_amount", "float64"),
+    ("ltv", "float64"),
+    ("fico", "int32"),
+    ("state", "string"),
+    ("term_months", "int32"),
+    ("lock_days", "int32"),
+    ("data_source", "string"),
+    ("created_at", "timestamp"),
+)
+
+RUN_FIELDS = (
+    ("date", "string"),
+    ("run_id", "int64"),
+    ("run_type", "string"),
+    ("status", "string"),
+    ("created_at", "timestamp"),
+    ("finished_at", "timestamp"),
+    ("offers", "int64"),
+    ("stats_json", "string"),
+)
+
+COMPACTED = "compacted.parquet"
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError as e:  # pragma: no cover - optional dependency
+        raise ImportError(
+            "Columnar export needs pyarrow; install with `pip install .[analytics]`"
+        ) from e
+    return pyarrow
+
+
+def _schema(fields: Sequence) -> Any:
+    pa = _pyarrow()
+    types = {
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    # PostgREST timestamps: "2025-01-15T12:00:00.123456+00:00"
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def run_day(created_at) -> str:
+    """The run's calendar day (YYYY-MM-DD) in the rollup time zone."""
+    ts = _as_datetime(created_at) or datetime.now(timezone.utc)
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    if ZoneInfo is not None:
+        ts = ts.astimezone(ZoneInfo(RUN_DAY_TZ))
+    return ts.date().isoformat()
+
+
+def _write_atomic(table, path: str) -> None:
+    pq = _pyarrow().parquet
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Dot-prefixed so readers listing the directory never pick it up
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp-{os.getpid()}")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, path)
+
+
+def _read_file(path: str):
+    # ParquetFile, not read_table: no partition discovery from the path
+    return _pyarrow().parquet.ParquetFile(path, memory_map=True).read()
+
+
+def _compacted_run_ids(directory: str) -> set:
+    path = os.path.join(directory, COMPACTED)
+    if not os.path.exists(path):
+        return set()
+    return set(_pyarrow().parquet.ParquetFile(path).read(columns=["run_id"]).column("run_id").to_pylist())
+
+
+def _month_dir(root: str, kind: str, month: str) -> str:
+    return os.path.join(root, kind, f"month={month}")
+
+
+def export_run(root: str, run: Dict[str, Any], offers: List[Dict[str, Any]]) -> List[str]:
+    """
+    Write one run and its offers under ``root``. Returns the files written.
+
+    ``run`` needs ``id``, ``run_type``, ``status`` and ``created_at``. Offers
+    without their own ``created_at`` get the run's. Re-exporting a run
+    replaces its files; a run whose month was already compacted is skipped.
+    """
+    pa = _pyarrow()
+    created_at = _as_datetime(run.get("created_at")) or datetime.now(timezone.utc)
+    day = run_day(created_at)
+    runs_dir = _month_dir(root, "runs", day[:7])
+    if run["id"] in _compacted_run_ids(runs_dir):
+        logger.info(f"⏭️  Run {run['id']} is already in the compacted {day[:7]} export, skipping")
+        return []
+
+    by_category: Dict[str, List[Dict[str, Any]]] = {}
+    for offer in offers:
+        by_category.setdefault(offer.get("category") or "unknown", []).append(offer)
+
+    written = []
+    offer_schema = _schema(OFFER_FIELDS)
+    for category, rows in by_category.items():
+        columns = {}
+        for name, kind in OFFER_FIELDS:
+            if name == "date":
+                columns[name] = [day] * len(rows)
+            elif name == "created_at":
+                columns[name] = [_as_datetime(r.get(name)) or created_at for r in rows]
+            elif kind == "float64":
+                columns[name] = [float(r[name]) if r.get(name) is not None else None for r in rows]
+            else:
+                columns[name] = [r.get(name) for r in rows]
+        path = os.path.join(
+            _month_dir(root, "offers", day[:7]),
+            f"category={quote(category, safe='')}",
+            f"run-{run['id']}.parquet",
+        )
+        _write_atomic(pa.table(columns, schema=offer_schema), path)
+        written.append(path)
+
+    stats = run.get("stats_json")
+    run_row = {
+        "date": [day],
+        "run_id": [run["id"]],
+        "run_type": [run.get("run_type")],
+        "status": [run.get("status")],
+        "created_at": [created_at],
+        "finished_at": [_as_datetime(run.get("finished_at"))],
+        "offers": [len(offers)],
+        "stats_json": [json.dumps(stats, default=str) if stats is not None else None],
+    }
+    # Written last: the run row marks the run as fully exported
+    path = os.path.join(runs_dir, f"run-{run['id']}.parquet")
+    _write_atomic(pa.table(run_row, schema=_schema(RUN_FIELDS)), path)
+    written.append(path)
+
+    logger.info(f"📤 Exported run {run['id']} ({len(offers)} offers, {len(by_category)} categories) to {root}")
+    return written
+
+
+def exported_run_ids(root: str) -> set:
+    """Run ids that already have a run row under ``root``."""
+    if not os.path.isdir(os.path.join(root, "runs")):
+        return set()
+    return set(open_runs(root).to_table(columns=["run_id"]).column("run_id").to_pylist())
+
+
+def backfill(sb, root: str, run_type: str = "real", since: Optional[str] = None, force: bool = False) -> int:
+    """Export every finished run not already under ``root``. Returns runs exported."""
+    done = set() if force else exported_run_ids(root)
+    exported = 0
+    for run in sb.get_runs(run_type=run_type, since=since):
+        if run["id"] in done:
+            continue
+        if export_run(root, run, sb.get_run_offers(run["id"])):
+            exported += 1
+    logger.info(f"✅ Backfill finished: {exported} run(s) exported to {root}")
+    return exported
+
+
+def _compact_dir(directory: str, sort_keys: List[str]) -> int:
+    """Fold run-*.parquet in one directory into compacted.parquet. Returns files folded."""
+    pa = _pyarrow()
+    run_files = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith("run-") and name.endswith(".parquet")
+    )
+    if not run_files:
+        return 0
+
+    compacted_path = os.path.join(directory, COMPACTED)
+    tables = [_read_file(compacted_path)] if os.path.exists(compacted_path) else []
+    already = _compacted_run_ids(directory)
+    for path in run_files:
+        table = _read_file(path)
+        # A previous compaction may have died after writing but before unlinking
+        if table.num_rows and table.column("run_id")[0].as_py() in already:
+            continue
+        tables.append(table)
+
+    merged = pa.concat_tables(tables).sort_by([(k, "ascending") for k in sort_keys])
+    _write_atomic(merged, compacted_path)
+    for path in run_files:
+        os.remove(path)
+    return len(run_files)
+
+
+def compact(root: str, before_month: Optional[str] = None) -> int:
+    """
+    Fold the per-run files of every month before ``before_month`` (YYYY-MM,
+    default: the current month) into one file per directory. Returns the
+    number of run files folded.
+    """
+    if before_month is None:
+        before_month = run_day(datetime.now(timezone.utc))[:7]
+    folded = 0
+    for kind, sort_keys in (("offers", ["date", "lender_name"]), ("runs", ["created_at"])):
+        base = os.path.join(root, kind)
+        if not os.path.isdir(base):
+            continue
+        for month_name in sorted(os.listdir(base)):
+            if not month_name.startswith("month=") or month_name[len("month="):] >= before_month:
+                continue
+            month_dir = os.path.join(base, month_name)
+            if kind == "offers":
+                leaves = [os.path.join(month_dir, name) for name in sorted(os.listdir(month_dir))
+                          if name.startswith("category=")]
+            else:
+                leaves = [month_dir]
+            for leaf in leaves:
+                folded += _compact_dir(leaf, sort_keys)
+    logger.info(f"🗜️  Compacted {folded} run file(s) under {root}")
+    return folded
+
+
+# =====================================================
+# Read side
+# =====================================================
+
+def _dataset(root: str, kind: str):
+    pa = _pyarrow()
+    partitions = [("month", pa.string())] + ([("category", pa.string())] if kind == "offers" else [])
+    return pa.dataset.dataset(
+        os.path.join(root, kind),
+        format="parquet",
+        partitioning=pa.dataset.partitioning(pa.schema(partitions), flavor="hive"),
+        filesystem=pa.fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=False,
+        ignore_prefixes=[".", "_"],
+    )
+
+
+def open_offers(root: str):
+    """The exported offers as a ``pyarrow.dataset.Dataset`` (memory-mapped)."""
+    return _dataset(root, "offers")
+
+
+def open_runs(root: str):
+    return _dataset(root, "runs")
+
+
+def _offer_filter(category=None, lender=None, since=None, until=None, data_source="real"):
+    ds = _pyarrow().dataset
+    clauses = []
+    if category is not None:
+        clauses.append(ds.field("category") == category)
+    if since is not None:
+        # month prunes directories, date trims within the boundary months
+        clauses.append(ds.field("month") >= since[:7])
+        clauses.append(ds.field("date") >= since)
+    if until is not None:
+        clauses.append(ds.field("month") <= until[:7])
+        clauses.append(ds.field("date") <= until)
+    if lender is not None:
+        clauses.append(ds.field("lender_name") == lender)
+    if data_source is not None:
+        clauses.append(ds.field("data_source") == data_source)
+    expr = None
+    for clause in clauses:
+        expr = clause if expr is None else expr & clause
+    return expr
+
+
+def query_offers(
+    root: str,
+    category: Optional[str] = None,
+    lender: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    data_source: Optional[str] = "real",
+    columns: Optional[List[str]] = None,
+):
+    """
+    Offers matching the filters as a ``pyarrow.Table``.
+
+    ``since``/``until`` are inclusive YYYY-MM-DD days; day and category
+    filters skip non-matching directories without opening them.
+    """
+    return open_offers(root).to_table(
+        columns=columns,
+        filter=_offer_filter(category, lender, since, until, data_source),
+    )
+
+
+def daily_best_rates(
+    root: str,
+    category: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    by_lender: bool = False,
+):
+    """
+    Per day (and optionally per lender): best rate, median rate, best APR and
+    offer count, sorted by day. Computed entirely in Arrow.
+    """
+    keys = ["date", "lender_name"] if by_lender else ["date"]
+    table = query_offers(
+        root, category=category, since=since, until=until, columns=keys + ["rate", "apr"]
+    )
+    result = table.group_by(keys).aggregate([
+        ("rate", "min"),
+        ("rate", "approximate_median"),
+        ("apr", "min"),
+        ("rate", "count"),
+    ])
+    return result.sort_by([(k, "ascending") for k in keys])
+
+
+def main():
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Export and query columnar rate history")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("backfill", help="Export finished runs from the database")
+    p.add_argument("--out", default=os.environ.get("EXPORT_DIR"), help="Export root (default: $EXPORT_DIR)")
+    p.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    p.add_argument("--run-type", choices=["real", "sample"], default="real")
+    p.add_argument("--since", default=None, help="Only runs created on or after this date")
+    p.add_argument("--force", action="store_true", help="Re-export runs that already exist")
+
+    p = sub.add_parser("compact", help="Fold finished months into one file per directory")
+    p.add_argument("root")
+    p.add_argument("--before-month", default=None, help="YYYY-MM (default: current month)")
+
+    for name, help_text in (("query", "Print matching offers"), ("best", "Print daily best rates")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("root")
+        p.add_argument("--category", required=(name == "best"))
+        p.add_argument("--lender", default=None)
+        p.add_argument("--since", default=None)
+        p.add_argument("--until", default=None)
+        if name == "best":
+            p.add_argument("--by-lender", action="store_true")
+
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    try:
+        if args.command == "backfill":
+            from .config import load_config
+            from .supabase_client import make_writer
+
+            if not args.out:
+                parser.error("--out or EXPORT_DIR is required")
+            backfill(make_writer(load_config(args.sources)), args.out,
+                     run_type=args.run_type, since=args.since, force=args.force)
+            return
+
+        if args.command == "compact":
+            compact(args.root, before_month=args.before_month)
+            return
+
+        if args.command == "query":
+            table = query_offers(args.root, category=args.category, lender=args.lender,
+                                 since=args.since, until=args.until)
+        else:
+            if args.lender:
+                parser.error("best does not take --lender; use --by-lender")
+            table = daily_best_rates(args.root, args.category, since=args.since,
+                                     until=args.until, by_lender=args.by_lender)
+        json.dump(table.to_pylist(), sys.stdout, indent=2, default=str)
+        sys.stdout.write("\n")
+    except Exception as e:
+        logger.exception(f"Fatal error: {e}")
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
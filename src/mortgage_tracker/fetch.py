@@ -1,16 +1,18 @@
 import logging
-from typing import Optional
+from collections import Counter
+from typing import Dict, Iterable, Optional
 import time
 import requests
 
 logger = logging.getLogger("mortgage_tracker.fetch")
 
 
-def fetch_url(url: str, timeout: float = 10.0, retries: int = 2, backoff: float = 1.5, headers: Optional[dict] = None) -> tuple:
+def fetch_url(url: str, timeout: float = 10.0, retries: int = 2, backoff: float = 1.5, headers: Optional[dict] = None,
+              session: Optional[requests.Session] = None) -> tuple:
     """Fetch a URL with basic retry. Returns (status, text, json)."""
     if not url:
         raise ValueError("rate_url is required for fetching")
-    session = requests.Session()
+    session = session or requests.Session()
     last_exc: Optional[Exception] = None
     for attempt in range(retries + 1):
         try:
@@ -39,3 +41,40 @@ def fetch_url(url: str, timeout: float = 10.0, retries: int = 2, backoff: float
     # Final failure
     logger.error("fetch_failed", extra={"url": url, "error": str(last_exc) if last_exc else "unknown"})
     return 0, None, None
+
+
+class FetchCache:
+    """
+    Fetches each URL of a run once, however many sources parse it, over one
+    keep-alive session. A response is dropped once its last expected
+    consumer has taken it, so memory stays bounded by the URLs in flight.
+    """
+
+    def __init__(self, urls: Iterable[str], session: Optional[requests.Session] = None, **fetch_kwargs):
+        self.fetch_kwargs = fetch_kwargs
+        # A caller-provided session (e.g. the daemon's) outlives the run and is not closed here
+        self._owns_session = session is None
+        self.session = session or requests.Session()
+        self.fetches = 0
+        self.hits = 0
+        self._pending = Counter(u for u in urls if u)
+        self._responses: Dict[str, tuple] = {}
+
+    def get(self, url: str) -> tuple:
+        response = self._responses.get(url)
+        if response is None:
+            response = fetch_url(url, session=self.session, **self.fetch_kwargs)
+            self.fetches += 1
+        else:
+            self.hits += 1
+        self._pending[url] -= 1
+        if self._pending[url] > 0:
+            self._responses[url] = response
+        else:
+            self._responses.pop(url, None)
+        return response
+
+    def close(self) -> None:
+        self._responses.clear()
+        if self._owns_session:
+            self.session.close()
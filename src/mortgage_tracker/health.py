@@ -0,0 +1,207 @@
+"""
+Per-source outcome history and adaptive back-off (migration 020).
+
+Some enabled sources yield nothing run after run: parsers that by design
+return no offers (metro_cu, rockland_trust) and pages that fail most
+days. Each run still paid their fetch and parse. Here every collected
+source's outcome is kept: success (offers stored), empty (fetched, no
+usable offers) or error, plus its latency and yield.
+
+After MISS_THRESHOLD misses in a row a source is backed off: runs skip
+it until ``next_probe_at``. The first wait is BACKOFF_BASE and doubles
+with every probe that misses again, up to BACKOFF_MAX. A probe that
+yields offers promotes the source back to every run. Each run lists what
+it decided in ``stats_json["health"]``: deferred, probed, backed_off and
+promoted sources. A run whose every source was deferred collected
+nothing; it is marked ``skipped`` and never published.
+
+Selections name their sources explicitly, so nothing is deferred in
+them; their outcomes are still recorded.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import Source
+
+logger = logging.getLogger("mortgage_tracker.health")
+
+OUTCOMES = ("success", "empty", "error")
+MISS_THRESHOLD = 3               # consecutive runs without offers before backing off
+BACKOFF_BASE = 2 * 86400         # seconds until the first probe
+BACKOFF_MAX = 32 * 86400         # longest wait between probes
+PROBE_SLACK = 3600               # a daily run that starts a little early still probes
+LATENCY_ALPHA = 0.3              # EWMA weight of the newest latency
+DECISION_LIMIT = 50              # entries per decision list in stats_json
+
+
+@dataclass
+class SourceHealth:
+    successes: int = 0
+    empties: int = 0
+    errors: int = 0
+    misses: int = 0
+    backoff: int = 0
+    next_probe_at: Optional[datetime] = None
+    last_outcome: Optional[str] = None
+    latency_ms: Optional[float] = None
+    last_offers: int = 0
+    offers_total: int = 0
+    last_success_at: Optional[datetime] = None
+
+    def wait(self) -> int:
+        """Seconds until the next probe at the current back-off level."""
+        return min(BACKOFF_BASE * 2 ** (self.backoff - 1), BACKOFF_MAX)
+
+
+def _as_datetime(value) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+class HealthTracker:
+    """Decides which sources a run collects and records how they did."""
+
+    def __init__(self, state: Optional[Dict[str, SourceHealth]] = None, miss_threshold: int = MISS_THRESHOLD):
+        self.state = state or {}
+        self.miss_threshold = miss_threshold
+        self.decisions: Dict[str, List[Dict[str, Any]]] = {
+            "deferred": [], "probed": [], "backed_off": [], "promoted": [],
+        }
+        self._changed: Dict[str, SourceHealth] = {}
+
+    @classmethod
+    def load(cls, sb, **kwargs) -> "HealthTracker":
+        rows = sb.call("get_source_health") or []
+        state = {
+            r["source_name"]: SourceHealth(
+                successes=int(r.get("successes") or 0),
+                empties=int(r.get("empties") or 0),
+                errors=int(r.get("errors") or 0),
+                misses=int(r.get("misses") or 0),
+                backoff=int(r.get("backoff") or 0),
+                next_probe_at=_as_datetime(r.get("next_probe_at")),
+                last_outcome=r.get("last_outcome"),
+                latency_ms=float(r["latency_ms"]) if r.get("latency_ms") is not None else None,
+                last_offers=int(r.get("last_offers") or 0),
+                offers_total=int(r.get("offers_total") or 0),
+                last_success_at=_as_datetime(r.get("last_success_at")),
+            )
+            for r in rows
+        }
+        return cls(state, **kwargs)
+
+    def split(self, sources: Iterable[Source], now: Optional[datetime] = None) -> Tuple[List[Source], List[Source]]:
+        """
+        (to collect, deferred). Backed-off sources whose probe is not due
+        yet are deferred; those whose probe is due are collected as probes.
+        Disabled and incomplete sources pass through untouched.
+        """
+        now = now or datetime.now(timezone.utc)
+        collect, deferred = [], []
+        for src in sources:
+            health = self.state.get(src.name)
+            if not src.enabled or src.skip_reason or health is None or not health.backoff:
+                collect.append(src)
+                continue
+            entry = {"source": src.name, "misses": health.misses, "backoff": health.backoff}
+            if health.next_probe_at is not None and now < health.next_probe_at - timedelta(seconds=PROBE_SLACK):
+                deferred.append(src)
+                self.decisions["deferred"].append({**entry, "next_probe_at": _iso(health.next_probe_at)})
+            else:
+                collect.append(src)
+                self.decisions["probed"].append(entry)
+        if deferred:
+            logger.info(f"💤 Deferred {len(deferred)} backed-off source(s) until their next probe")
+        return collect, deferred
+
+    def record(self, name: str, outcome: str, latency_ms: float, offers: int,
+               now: Optional[datetime] = None) -> None:
+        """Fold one collection of a source into its history."""
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown source outcome {outcome!r}")
+        now = now or datetime.now(timezone.utc)
+        health = self.state.setdefault(name, SourceHealth())
+        if outcome == "success":
+            health.successes += 1
+        elif outcome == "empty":
+            health.empties += 1
+        else:
+            health.errors += 1
+        health.last_outcome = outcome
+        health.last_offers = offers
+        health.offers_total += offers
+        if health.latency_ms is None:
+            health.latency_ms = latency_ms
+        else:
+            health.latency_ms += LATENCY_ALPHA * (latency_ms - health.latency_ms)
+
+        if outcome == "success":
+            if health.backoff:
+                logger.info(f"🌅 {name} yielded {offers} offer(s) on probe, back on every run")
+                self.decisions["promoted"].append({"source": name, "misses": health.misses, "offers": offers})
+            health.misses, health.backoff, health.next_probe_at = 0, 0, None
+            health.last_success_at = now
+        else:
+            health.misses += 1
+            if health.misses >= self.miss_threshold:
+                # Reaching the threshold, or a probe that missed again
+                health.backoff += 1
+                health.next_probe_at = now + timedelta(seconds=health.wait())
+                logger.info(
+                    f"💤 {name}: {health.misses} run(s) without offers, "
+                    f"next probe in {health.wait() / 86400:.0f} day(s)"
+                )
+                self.decisions["backed_off"].append({
+                    "source": name,
+                    "outcome": outcome,
+                    "misses": health.misses,
+                    "backoff": health.backoff,
+                    "next_probe_at": _iso(health.next_probe_at),
+                })
+        self._changed[name] = health
+
+    def to_dict(self) -> Dict[str, Any]:
+        """This run's decisions for stats_json (only the non-empty lists)."""
+        return {k: v[:DECISION_LIMIT] for k, v in self.decisions.items() if v}
+
+    def save(self, sb, run_id: int) -> int:
+        """Store the changed histories; the next decisions start from scratch."""
+        rows = [
+            {
+                "source_name": name,
+                "successes": h.successes,
+                "empties": h.empties,
+                "errors": h.errors,
+                "misses": h.misses,
+                "backoff": h.backoff,
+                "next_probe_at": _iso(h.next_probe_at),
+                "last_outcome": h.last_outcome,
+                "latency_ms": round(h.latency_ms, 1) if h.latency_ms is not None else None,
+                "last_offers": h.last_offers,
+                "offers_total": h.offers_total,
+                "last_success_at": _iso(h.last_success_at),
+            }
+            for name, h in self._changed.items()
+        ]
+        if rows:
+            sb.call("save_source_health", {"p_run_id": run_id, "p_rows": rows})
+        logger.info(f"🩺 Recorded the outcome of {len(rows)} source(s)")
+        self._changed = {}
+        self.decisions = {k: [] for k in self.decisions}
+        return len(rows)
+
+
+def merge_health(parts: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the ``health`` decisions of a run's shards or jobs."""
+    merged: Dict[str, List[Dict[str, Any]]] = {}
+    for part in parts:
+        for key, entries in (part or {}).items():
+            merged.setdefault(key, []).extend(entries)
+    return {k: v[:DECISION_LIMIT] for k, v in merged.items() if v}
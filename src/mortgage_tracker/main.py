@@ -5,15 +5,32 @@ import argparse
 import json
 import logging
 import os
+import socket
 import sys
-from datetime import datetime
-from typing import Dict, Any, List
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
 
-from .config import load_config
-from .fetch import fetch_url
+import requests
+
+from .alerts import queue_alerts
+from .anomaly import AnomalyDetector
+from .apr import check_aprs
+from .artifacts import publish_artifacts
+from .blobstore import externalize_snapshot
+from .config import Source, SourceSelection, load_config
+from .diff import changed_offers, diff_run, store_diff
+from .export import export_run
+from .fetch import FetchCache
+from .health import HealthTracker
 from .normalize import normalize_offers
-from .supabase_client import SupabaseWriter
+from .supabase_client import make_writer
+from .trim import trim_snapshot
 from .parsers import get_parser
+from .rank import TopNRanker
+from .rollup import rollup_run
+from .shard import merge_shard_stats, parse_shard, shard_sources
+from .sketch import MarketSketch
 from .validate import validate_offer
 
 # Configure structured logging
@@ -24,6 +41,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mortgage_tracker.main")
 
+# Work queue (migration 018)
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 3
+JOB_POLL_INTERVAL = 2.0
+COORDINATOR_TIMEOUT = 3600.0
+
 
 class CollectorStats:
     """Track statistics for a collector run."""
@@ -35,7 +58,16 @@ class CollectorStats:
         self.sources_failed = 0
         self.sources_skipped = 0
         self.offers_inserted = 0
+        self.offers_unchanged = 0
         self.parse_errors: List[Dict[str, str]] = []
+        self.apr_flags: List[Dict[str, Any]] = []
+        self.quarantined: List[Dict[str, Any]] = []
+        self.market = MarketSketch()
+        self.selection: Dict[str, Any] = {}
+        self.schedule: Dict[str, Any] = {}
+        self.health: Dict[str, Any] = {}
+        self.fetches = 0
+        self.fetches_coalesced = 0
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -45,76 +77,98 @@ class CollectorStats:
             "sources_failed": self.sources_failed,
             "sources_skipped": self.sources_skipped,
             "offers_inserted": self.offers_inserted,
+            "offers_unchanged": self.offers_unchanged,
             "parse_errors": self.parse_errors[:10],  # Limit to first 10 errors
+            "apr_flagged": len(self.apr_flags),
+            "apr_flags": self.apr_flags[:10],
+            "offers_quarantined": len(self.quarantined),
+            "quarantined": self.quarantined[:20],
+            "market": self.market.summary(),
+            "market_sketch": self.market.to_dict(),
+            "fetches": self.fetches,
+            "fetches_coalesced": self.fetches_coalesced,
+            **({"selection": self.selection} if self.selection else {}),
+            **({"schedule": self.schedule} if self.schedule else {}),
+            **({"health": self.health} if self.health else {}),
         }
 
 
-def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str, Any]:
+class SourceCollector:
     """
-    Run the mortgage rate collector.
-    
-    Args:
-        run_type: 'real' or 'sample' - determines how data is tagged
-        sources_path: Path to sources.yaml file
-        
-    Returns:
-        Dict with run_id, status, and stats
+    Collects one source at a time into a run: fetch, snapshot, parse,
+    validate, screen and store its offers, counting the outcome in
+    ``stats``. Shared by single-process runs, shards and queue workers.
     """
-    # Load configuration
-    if sources_path is None:
-        sources_path = os.environ.get("SOURCES_YAML", "sources.yaml")
-    if not os.path.isabs(sources_path):
-        sources_path = os.path.abspath(sources_path)
     
-    logger.info(f"Starting collector run (type={run_type}, sources={sources_path})")
+    def __init__(
+        self,
+        sb,
+        cfg,
+        run_id: int,
+        run_type: str,
+        fetcher: FetchCache,
+        stats: Optional["CollectorStats"] = None,
+        detector: Optional[AnomalyDetector] = None,
+        include_disabled: bool = False,
+        parsers: Optional[Dict[str, Any]] = None,
+        health: Optional[HealthTracker] = None,
+    ):
+        self.sb = sb
+        self.cfg = cfg
+        self.run_id = run_id
+        self.run_type = run_type
+        self.fetcher = fetcher
+        self.stats = stats if stats is not None else CollectorStats()
+        self.detector = detector
+        self.include_disabled = include_disabled
+        # Parser instances by key; a resident collector passes its own to keep them across runs
+        self.parsers = parsers if parsers is not None else {}
+        # Records each collected source's outcome, latency and yield
+        self.health = health
+        # Sources that got a snapshot in this run
+        self.source_ids = set()
+        # Change-only storage applies to real runs; sample runs are always full
+        self.store_changes = cfg.offer_store == "changes" and run_type == "real"
+        self.run_offers: List[Dict[str, Any]] = []
+        self.ranker = TopNRanker(n=10, tie_break=("lender_name",))
     
-    cfg = load_config(sources_path)
-    sb = SupabaseWriter(cfg.supabase_url, cfg.supabase_service_role_key)
-    
-    # Create run record
-    run_id = sb.create_run(status="started", run_type=run_type)
-    logger.info(f"Created run {run_id} (type={run_type})")
-    
-    stats = CollectorStats()
-    
-    # Process each source
-    for src in cfg.sources:
-        stats.sources_total += 1
-        source_name = src.get("name", src.get("id", "unknown"))
+    def collect(self, src) -> None:
+        self.stats.sources_total += 1
+        source_name = src.name
         
         # Skip disabled sources
-        if not src.get("enabled", False):
-            stats.sources_skipped += 1
+        if not src.enabled and not self.include_disabled:
+            self.stats.sources_skipped += 1
             logger.info(f"⏭️  Skipping disabled source: {source_name}")
-            continue
+            return
         
-        stats.sources_enabled += 1
-        rate_url = src.get("rate_url") or src.get("url")
-        parser_key = src.get("parser_key") or src.get("method")
+        self.stats.sources_enabled += 1
+        rate_url = src.rate_url
+        parser_key = src.parser_key
         
-        if not rate_url:
-            logger.warning(f"⚠️  Source {source_name} has no rate_url, skipping")
-            stats.sources_skipped += 1
-            continue
+        if src.skip_reason:
+            logger.warning(f"⚠️  Source {source_name} has {src.skip_reason}, skipping")
+            self.stats.sources_skipped += 1
+            return
         
-        if not parser_key or parser_key == "none":
-            logger.warning(f"⚠️  Source {source_name} has no parser_key, skipping")
-            stats.sources_skipped += 1
-            continue
+        started = time.monotonic()
+        offers_before = len(self.run_offers)
+        outcome = "error"
         
         # Process this source
         try:
             logger.info(f"📥 Fetching {source_name} from {rate_url}")
             
             # Upsert source record
-            source_id = sb.upsert_source(src)
+            source_id = self.sb.upsert_source(src)
+            self.source_ids.add(source_id)
             
             # Fetch content
-            status_code, text, js = fetch_url(rate_url, timeout=15.0, retries=2)
+            status_code, text, js = self.fetcher.get(rate_url)
             
             # Always store snapshot
             snapshot = {
-                "run_id": run_id,
+                "run_id": self.run_id,
                 "source_id": source_id,
                 "http_status": status_code,
                 "raw_text": text,
@@ -128,7 +182,9 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
             parse_error = None
             
             try:
-                parser = get_parser(parser_key)
+                parser = self.parsers.get(parser_key)
+                if parser is None:
+                    parser = self.parsers[parser_key] = get_parser(parser_key)
                 raw_offers = parser.parse(text=text, js=js)
                 
                 if raw_offers:
@@ -137,27 +193,35 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
                 else:
                     snapshot["parse_status"] = "empty"
                     logger.warning(f"⚠️  No offers parsed from {source_name}")
-                    
+            
             except KeyError as e:
                 parse_error = f"Parser not found: {e}"
                 snapshot["parse_status"] = "error"
                 snapshot["parse_error"] = parse_error
                 logger.error(f"❌ {source_name}: {parse_error}")
-                stats.parse_errors.append({"source": source_name, "error": parse_error})
-                
+                self.stats.parse_errors.append({"source": source_name, "error": parse_error})
+            
             except Exception as e:
                 parse_error = str(e)
                 snapshot["parse_status"] = "error"
                 snapshot["parse_error"] = parse_error
                 logger.error(f"❌ {source_name}: Parse error: {parse_error}")
-                stats.parse_errors.append({"source": source_name, "error": parse_error})
+                self.stats.parse_errors.append({"source": source_name, "error": parse_error})
+            
+            if parse_error is None:
+                outcome = "empty"
             
             # Insert snapshot
-            snap_id = sb.insert_snapshot(snapshot)
+            if self.cfg.snapshot_mode == "trimmed" and raw_offers:
+                snapshot = trim_snapshot(snapshot, parser, raw_offers)
+            # Pages that gave no offers stay whole for re-parsing after a parser fix, compressed
+            if self.cfg.snapshot_store == "blob" or (self.cfg.snapshot_mode == "trimmed" and not raw_offers):
+                snapshot = externalize_snapshot(self.sb, snapshot)
+            snap_id = self.sb.insert_snapshot(snapshot)
             
             # Normalize and insert offers
             if raw_offers:
-                normalized = normalize_offers(raw_offers, cfg.defaults)
+                normalized = normalize_offers(raw_offers, self.cfg.defaults)
                 
                 # Validation and deduplication
                 valid_offers = []
@@ -168,7 +232,7 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
                     is_valid, issues = validate_offer(offer)
                     if not is_valid:
                         logger.warning(f"❌ Invalid offer from {source_name}: {', '.join(issues)}")
-                        stats.parse_errors.append({
+                        self.stats.parse_errors.append({
                             "source": source_name, 
                             "error": f"Validation failed: {issues[0]}"
                         })
@@ -193,39 +257,87 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
                     seen_keys.add(offer_key)
                     
                     # Add run metadata
-                    offer["run_id"] = run_id
+                    offer["run_id"] = self.run_id
                     offer["source_id"] = source_id
-                    offer["data_source"] = "sample" if run_type == "sample" else "real"
+                    offer["data_source"] = "sample" if self.run_type == "sample" else "real"
                     
                     valid_offers.append(offer)
                 
+                # Flag (not reject) offers whose APR doesn't follow from rate/points/fees
+                for flag in check_aprs(valid_offers):
+                    offer = valid_offers[flag.pop("index")]
+                    offer["details_json"] = {**(offer.get("details_json") or {}), "apr_check": flag}
+                    logger.warning(
+                        f"🔎 {source_name}: {offer.get('lender_name')} {offer.get('category')} "
+                        f"APR {flag['published_apr']}% vs implied {flag['implied_apr']}%"
+                    )
+                    self.stats.apr_flags.append({
+                        "source": source_name,
+                        "lender": offer.get("lender_name"),
+                        "category": offer.get("category"),
+                        **flag,
+                    })
+                
+                # Quarantine offers that jump implausibly far from their series
+                quarantined = []
+                if self.detector is not None:
+                    valid_offers, quarantined = self.detector.screen(valid_offers)
+                    for q in quarantined:
+                        logger.warning(
+                            f"🚧 {source_name}: quarantined {q['lender']} {q['category']} "
+                            f"{q['rate']}% (expected ~{q['expected_rate']}%)"
+                        )
+                        self.stats.quarantined.append({"source": source_name, **q})
+                
                 if valid_offers:
-                    sb.insert_offers(valid_offers)
-                    stats.offers_inserted += len(valid_offers)
-                    stats.sources_success += 1
+                    to_insert = valid_offers
+                    if self.store_changes:
+                        to_insert = changed_offers(
+                            valid_offers, self.sb.get_source_offer_state(source_id), self.cfg.offer_keyframe_days
+                        )
+                    self.sb.insert_offers(to_insert)
+                    if self.store_changes:
+                        # After the offers: the marker must not point at rows that failed to land
+                        self.sb.insert_run_source({
+                            "run_id": self.run_id,
+                            "source_id": source_id,
+                            "offer_keys": [o["offer_key"] for o in valid_offers],
+                            "offers_changed": len(to_insert),
+                        })
+                    self.run_offers.extend(valid_offers)
+                    self.ranker.add_many(valid_offers)
+                    self.stats.market.add_many(valid_offers)
+                    self.stats.offers_inserted += len(to_insert)
+                    self.stats.offers_unchanged += len(valid_offers) - len(to_insert)
+                    self.stats.sources_success += 1
+                    outcome = "success"
                     
                     logger.info(
-                        f"✅ {source_name}: Inserted {len(valid_offers)} valid offers "
+                        f"✅ {source_name}: Inserted {len(to_insert)} of {len(valid_offers)} valid offers "
                         f"(rejected {len(normalized) - len(valid_offers)}, snapshot_id={snap_id})"
                     )
                 else:
-                    logger.warning(f"⚠️  {source_name}: All {len(normalized)} offers rejected by validation")
-                    stats.sources_failed += 1
+                    if quarantined:
+                        logger.warning(f"⚠️  {source_name}: All {len(quarantined)} valid offers quarantined")
+                    else:
+                        logger.warning(f"⚠️  {source_name}: All {len(normalized)} offers rejected by validation")
+                    self.stats.sources_failed += 1
             else:
-                stats.sources_failed += 1
-                
+                self.stats.sources_failed += 1
+        
         except Exception as e:
             # Source-level error (fetch, database, etc.)
             error_msg = str(e)
             logger.error(f"❌ {source_name}: Source error: {error_msg}")
-            stats.sources_failed += 1
-            stats.parse_errors.append({"source": source_name, "error": error_msg})
+            self.stats.sources_failed += 1
+            self.stats.parse_errors.append({"source": source_name, "error": error_msg})
             
             # Best-effort: try to record the failure
             try:
-                source_id = sb.upsert_source(src)
-                sb.insert_snapshot({
-                    "run_id": run_id,
+                source_id = self.sb.upsert_source(src)
+                self.source_ids.add(source_id)
+                self.sb.insert_snapshot({
+                    "run_id": self.run_id,
                     "source_id": source_id,
                     "http_status": 0,
                     "raw_text": None,
@@ -235,17 +347,210 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
                 })
             except Exception:
                 pass  # Give up on recording this error
+        
+        if self.health is not None:
+            self.health.record(
+                source_name, outcome, (time.monotonic() - started) * 1000.0, len(self.run_offers) - offers_before
+            )
+
+
+class Resident:
+    """
+    What a long-running collector keeps between runs: the config, the
+    writer (and its connection), one keep-alive HTTP session and the
+    parser instances.
+    """
     
-    # Determine final run status
-    if stats.sources_success >= stats.sources_enabled:
-        final_status = "success"
-    elif stats.sources_success > 0:
-        final_status = "partial"
+    def __init__(self, cfg, sb=None):
+        self.cfg = cfg
+        self.sb = sb if sb is not None else make_writer(cfg)
+        self.session = requests.Session()
+        self.parsers: Dict[str, Any] = {}
+    
+    def close(self) -> None:
+        self.session.close()
+        self.sb.close()
+
+
+def _source_paths(sources_path: Union[str, Sequence[str], None]) -> List[str]:
+    if sources_path is None:
+        sources_path = os.environ.get("SOURCES_YAML", "sources.yaml")
+    paths = [sources_path] if isinstance(sources_path, str) else list(sources_path)
+    return [os.path.abspath(p) for p in paths]
+
+
+def _final_status(sources_success: int, sources_enabled: int) -> str:
+    if sources_enabled == 0:
+        # Nothing was collected (every source deferred by back-off): never published
+        return "skipped"
+    if sources_success >= sources_enabled:
+        return "success"
+    if sources_success > 0:
+        return "partial"
+    return "failed"
+
+
+def start_run(run_type: str = "real", sources_path: Union[str, Sequence[str], None] = None) -> int:
+    """Create the run that the shards of a sharded run write under."""
+    paths = _source_paths(sources_path)
+    cfg = load_config(paths[0] if len(paths) == 1 else paths)
+    return make_writer(cfg).create_run(status="started", run_type=run_type)
+
+
+def run_collector(
+    run_type: str = "real",
+    sources_path: Union[str, Sequence[str], None] = None,
+    selection: Optional[SourceSelection] = None,
+    shard: Optional[Tuple[int, int]] = None,
+    run_id: Optional[int] = None,
+    resident: Optional["Resident"] = None,
+    scheduled: Optional[Sequence[Source]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the mortgage rate collector.
+    
+    Args:
+        run_type: 'real' or 'sample' - determines how data is tagged
+        sources_path: Path to sources.yaml file, or several files merged into one catalog
+        selection: Only collect these sources. Such a run is recorded but not
+            published, diffed, rolled up or alerted on.
+        shard: (index, count) - only collect this slice of the sources and
+            leave the run open for ``merge_run`` (see shard.py)
+        run_id: Write under this existing run (required with ``shard``)
+        resident: Config, writer, HTTP session and parsers kept by a
+            long-running collector (see daemon.py) instead of fresh ones
+        scheduled: Only collect these sources (the ones due in daemon
+            mode). The run replaces just their published rows.
+        
+    Returns:
+        Dict with run_id, status, and stats, plus the names of the sources
+        collected and, for those back-off deferred, their next probe time
+    """
+    # Load configuration
+    paths = _source_paths(sources_path)
+    if shard is not None and run_id is None:
+        raise ValueError("A shard writes under an existing run: pass run_id (see --create-run)")
+    
+    logger.info(f"Starting collector run (type={run_type}, sources={', '.join(paths)})")
+    
+    if resident is not None:
+        cfg, sb = resident.cfg, resident.sb
+    else:
+        cfg = load_config(paths[0] if len(paths) == 1 else paths)
+        sb = make_writer(cfg)
+    
+    sources = cfg.sources if scheduled is None else list(scheduled)
+    published = not selection
+    if selection:
+        sources = selection.select(sources)
+        if not sources:
+            raise ValueError(f"No sources match the selection {selection.to_dict()}")
+        logger.info(f"🎯 Selected {len(sources)} of {len(cfg.sources)} sources ({selection.to_dict()})")
+    if shard is not None:
+        selected = len(sources)
+        sources = shard_sources(sources, *shard)
+        logger.info(f"🧩 Shard {shard[0]}/{shard[1]}: {len(sources)} of {selected} sources")
+    health = None
+    deferred: List[Source] = []
+    if cfg.source_backoff and run_type == "real":
+        try:
+            health = HealthTracker.load(sb)
+        except Exception as e:
+            logger.warning(f"⚠️  Source back-off disabled for this run: {e}")
+    if health is not None and not selection:
+        sources, deferred = health.split(sources)
+    # Sources sharing a rate_url run back to back, so their one fetch is shared and dropped promptly
+    first_seen: Dict[Optional[str], int] = {}
+    for i, src in enumerate(sources):
+        first_seen.setdefault(src.rate_url, i)
+    sources = sorted(sources, key=lambda s: first_seen[s.rate_url])
+    include_disabled = bool(selection and selection.include_disabled)
+    fetcher = FetchCache(
+        (s.rate_url for s in sources if (s.enabled or include_disabled) and not s.skip_reason),
+        session=resident.session if resident is not None else None,
+        timeout=15.0,
+        retries=2,
+    )
+    
+    # Create run record
+    if run_id is None:
+        run_id = sb.create_run(status="started", run_type=run_type)
+        logger.info(f"Created run {run_id} (type={run_type})")
     else:
-        final_status = "failed"
+        logger.info(f"Writing under run {run_id} (type={run_type})")
+    run_started = datetime.now(timezone.utc)
+    
+    stats = CollectorStats()
+    if selection:
+        stats.selection = {**selection.to_dict(), "sources": len(sources), "files": paths}
+    if scheduled is not None:
+        stats.schedule = {"due": len(sources), "sources": [s.name for s in sources][:50]}
+    # Deferred sources are skipped, not failed: they leave the run's status alone
+    stats.sources_total += len(deferred)
+    stats.sources_skipped += len(deferred)
+    
+    detector = None
+    if cfg.anomaly_detection and run_type == "real":
+        try:
+            detector = AnomalyDetector.load(sb)
+        except Exception as e:
+            logger.warning(f"⚠️  Anomaly detection disabled for this run: {e}")
+    collector = SourceCollector(sb, cfg, run_id, run_type, fetcher, stats, detector, include_disabled,
+                                parsers=resident.parsers if resident is not None else None, health=health)
+    ranker = collector.ranker
+    
+    # Process each source
+    for src in sources:
+        collector.collect(src)
+    
+    # Determine final run status
+    final_status = _final_status(stats.sources_success, stats.sources_enabled)
+    # What this run attempted, and when each deferred source is next probed (the daemon's schedule)
+    collected = [s.name for s in sources]
+    deferred_until = {s.name: health.state[s.name].next_probe_at for s in deferred}
+    
+    fetcher.close()
+    stats.fetches = fetcher.fetches
+    stats.fetches_coalesced = fetcher.hits
+    
+    if health is not None:
+        stats.health = health.to_dict()
+        try:
+            health.save(sb, run_id)
+        except Exception as e:
+            logger.warning(f"⚠️  Saving source health failed for run {run_id}: {e}")
+    
+    if shard is not None:
+        # The merge publishes the run; hand it the observations to advance the rate series with
+        shard_stats = {**stats.to_dict(), "shard": {"index": shard[0], "count": shard[1]}}
+        if detector is not None:
+            shard_stats["anomaly_pending"] = detector.pending()
+        sb.finish_shard(run_id, shard[0], shard[1], final_status, shard_stats)
+        logger.info(
+            f"🧩 Run {run_id} shard {shard[0]}/{shard[1]} finished with status={final_status}: "
+            f"{stats.sources_success} of {stats.sources_enabled} sources, "
+            f"{stats.offers_inserted} offers inserted"
+        )
+        return {"run_id": run_id, "status": final_status, "stats": shard_stats, "top_offers": ranker.result(),
+                "collected": collected, "deferred": deferred_until}
+    
+    previous = None
+    if scheduled is not None:
+        # Only the collected sources' rows change: diff against what they had
+        # published and summarise the market the page will show afterwards
+        before = sb.call("get_published_offers", {"p_data_source": run_type}) or []
+        scoped = [o for o in before if o.get("source_id") in collector.source_ids]
+        previous = (max((o["run_id"] for o in scoped), default=None), scoped)
+        stats.market = MarketSketch()
+        stats.market.add_many(o for o in before if o.get("source_id") not in collector.source_ids)
+        stats.market.add_many(collector.run_offers)
     
     # Finish run
-    sb.finish_run(run_id, status=final_status, stats=stats.to_dict())
+    sb.finish_run(run_id, status=final_status, stats=stats.to_dict(), publish=published and scheduled is None)
+    if scheduled is not None and final_status in ("success", "partial"):
+        sb.call("publish_run_sources", {"p_run_id": run_id})
+    _post_run(sb, cfg, run_id, run_type, final_status, stats.to_dict(), run_started,
+              published, detector, collector.run_offers, previous)
     
     logger.info(
         f"🏁 Run {run_id} finished with status={final_status}\n"
@@ -256,11 +561,387 @@ def run_collector(run_type: str = "real", sources_path: str = None) -> Dict[str,
         f"   Offers inserted: {stats.offers_inserted}"
     )
     
+    for category in ranker.categories():
+        best = ranker.top(category, 1)[0]
+        logger.info(f"🏆 Best {category}: {best.get('lender_name')} {best.get('rate')}% (APR {best.get('apr')})")
+    
     return {
         "run_id": run_id,
         "status": final_status,
         "stats": stats.to_dict(),
+        "top_offers": ranker.result(),
+        "collected": collected,
+        "deferred": deferred_until,
+    }
+
+
+def merge_run(run_id: int, sources_path: Union[str, Sequence[str], None] = None) -> Dict[str, Any]:
+    """
+    Close a sharded run: combine the shards' stats, set the run's final
+    status and run the post-run stages a single-process run would.
+    """
+    paths = _source_paths(sources_path)
+    cfg = load_config(paths[0] if len(paths) == 1 else paths)
+    sb = make_writer(cfg)
+    
+    rows = sb.call("get_run_shards", {"p_run_id": run_id}) or []
+    if not rows:
+        raise ValueError(f"Run {run_id} does not exist")
+    run = rows[0]
+    if run["run_status"] != "started":
+        raise ValueError(f"Run {run_id} is already {run['run_status']}")
+    shards = [r for r in rows if r["shard"] is not None]
+    counts = {r["shard_count"] for r in shards}
+    if len(counts) > 1:
+        raise ValueError(f"Shards of run {run_id} disagree on the shard count: {sorted(counts)}")
+    count = counts.pop() if counts else 0
+    missing = sorted(set(range(count)) - {r["shard"] for r in shards})
+    
+    shard_stats = [r["stats_json"] or {} for r in shards]
+    stats = merge_shard_stats(shard_stats)
+    stats["shards"] = {
+        "count": count,
+        "missing": missing,
+        "results": [
+            {
+                "shard": r["shard"],
+                "status": r["status"],
+                "sources_enabled": (r["stats_json"] or {}).get("sources_enabled", 0),
+                "sources_success": (r["stats_json"] or {}).get("sources_success", 0),
+                "offers_inserted": (r["stats_json"] or {}).get("offers_inserted", 0),
+            }
+            for r in shards
+        ],
+    }
+    if missing:
+        logger.warning(f"⚠️  Run {run_id}: shard(s) {missing} of {count} never finished")
+    final_status = _close_run(
+        sb, cfg, run_id, run["run_type"], run["created_at"], stats, shard_stats,
+        incomplete=bool(missing or not shards),
+        error_text=f"shards missing: {missing}" if missing else None,
+    )
+    
+    logger.info(
+        f"🏁 Run {run_id} merged from {len(shards)} of {count} shard(s) with status={final_status}\n"
+        f"   Sources: {stats['sources_enabled']} enabled, "
+        f"{stats['sources_success']} success, "
+        f"{stats['sources_failed']} failed, "
+        f"{stats['sources_skipped']} skipped\n"
+        f"   Offers inserted: {stats['offers_inserted']}"
+    )
+    return {"run_id": run_id, "status": final_status, "stats": stats}
+
+
+def run_coordinator(
+    run_type: str = "real",
+    sources_path: Union[str, Sequence[str], None] = None,
+    selection: Optional[SourceSelection] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+    timeout: float = COORDINATOR_TIMEOUT,
+    poll_interval: float = JOB_POLL_INTERVAL,
+) -> Dict[str, Any]:
+    """
+    Queue a run for workers (migration 018): create the run, enqueue one
+    job per source, wait until the workers have drained the queue (or
+    ``timeout`` seconds have passed) and close the run from the job
+    results. Jobs that never finished count as failed sources.
+    """
+    paths = _source_paths(sources_path)
+    cfg = load_config(paths[0] if len(paths) == 1 else paths)
+    sb = make_writer(cfg)
+    
+    sources = cfg.sources
+    if selection:
+        sources = selection.select(sources)
+        if not sources:
+            raise ValueError(f"No sources match the selection {selection.to_dict()}")
+    include_disabled = bool(selection and selection.include_disabled)
+    
+    # Disabled and incomplete sources are accounted for here rather than queued
+    skipped = CollectorStats()
+    queued = []
+    for src in sources:
+        if not src.enabled and not include_disabled:
+            skipped.sources_total += 1
+            skipped.sources_skipped += 1
+        elif src.skip_reason:
+            skipped.sources_total += 1
+            skipped.sources_enabled += 1
+            skipped.sources_skipped += 1
+            logger.warning(f"⚠️  Source {src.name} has {src.skip_reason}, skipping")
+        else:
+            queued.append(src)
+    if cfg.source_backoff and run_type == "real" and not selection:
+        try:
+            health = HealthTracker.load(sb)
+        except Exception as e:
+            logger.warning(f"⚠️  Source back-off disabled for this run: {e}")
+        else:
+            queued, deferred = health.split(queued)
+            skipped.sources_total += len(deferred)
+            skipped.sources_skipped += len(deferred)
+            skipped.health = health.to_dict()
+    
+    run_id = sb.create_run(status="started", run_type=run_type)
+    created_at = datetime.now(timezone.utc)
+    sb.call("enqueue_run_jobs", {
+        "p_run_id": run_id,
+        "p_jobs": [{"source_name": src.name, "source": src.to_dict()} for src in queued],
+        "p_max_attempts": max_attempts,
+    })
+    logger.info(f"📬 Run {run_id}: queued {len(queued)} job(s) of {len(sources)} sources (type={run_type})")
+    
+    deadline = time.monotonic() + timeout
+    while True:
+        jobs = sb.call("get_run_jobs", {"p_run_id": run_id}) or []
+        open_jobs = [j for j in jobs if j["status"] in ("queued", "running")]
+        if not open_jobs:
+            break
+        if time.monotonic() >= deadline:
+            cancelled = sb.call("cancel_run_jobs", {"p_run_id": run_id})
+            logger.warning(f"⚠️  Run {run_id}: gave up on {cancelled} job(s) after {timeout:.0f}s")
+            jobs = sb.call("get_run_jobs", {"p_run_id": run_id}) or []
+            break
+        time.sleep(poll_interval)
+    
+    part_stats = [skipped.to_dict()]
+    unfinished = []
+    for job in jobs:
+        if job["status"] == "done" and job["result_json"]:
+            part_stats.append(job["result_json"])
+            continue
+        # Never reported: the source counts as failed
+        error = job["last_error"] or f"job {job['status']}"
+        unfinished.append(job["source_name"])
+        part_stats.append({
+            "sources_total": 1,
+            "sources_enabled": 1,
+            "sources_failed": 1,
+            "parse_errors": [{"source": job["source_name"], "error": error}],
+        })
+    stats = merge_shard_stats(part_stats)
+    if selection:
+        stats["selection"] = {**selection.to_dict(), "sources": len(sources), "files": paths}
+    stats["jobs"] = {
+        "queued": len(queued),
+        "done": len(jobs) - len(unfinished),
+        "unfinished": unfinished[:20],
+        "attempts": sum(j["attempts"] for j in jobs),
+        "workers": len({j["worker"] for j in jobs if j["worker"]}),
     }
+    final_status = _close_run(sb, cfg, run_id, run_type, created_at, stats, part_stats)
+    
+    logger.info(
+        f"🏁 Run {run_id} finished by {stats['jobs']['workers']} worker(s) with status={final_status}\n"
+        f"   Sources: {stats['sources_enabled']} enabled, "
+        f"{stats['sources_success']} success, "
+        f"{stats['sources_failed']} failed, "
+        f"{stats['sources_skipped']} skipped\n"
+        f"   Offers inserted: {stats['offers_inserted']}"
+    )
+    return {"run_id": run_id, "status": final_status, "stats": stats}
+
+
+def run_worker(
+    sources_path: Union[str, Sequence[str], None] = None,
+    run_id: Optional[int] = None,
+    worker: Optional[str] = None,
+    lease_seconds: int = JOB_LEASE_SECONDS,
+    poll_interval: float = JOB_POLL_INTERVAL,
+    exit_when_idle: bool = True,
+    max_jobs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Claim and collect queued source jobs (of ``run_id``, or of any open
+    run) until the queue is empty, or forever unless ``exit_when_idle``.
+    Each job's rows are stored together with its result.
+    """
+    paths = _source_paths(sources_path)
+    cfg = load_config(paths[0] if len(paths) == 1 else paths)
+    if cfg.writer != "postgres":
+        # Only the COPY writer stores a job's rows in the transaction that
+        # reports it; over REST a job reclaimed after a lost lease would be
+        # stored twice
+        raise ValueError("Queue workers need WRITER=postgres (and DATABASE_URL)")
+    sb = make_writer(cfg)
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    detectors: Dict[int, Optional[AnomalyDetector]] = {}
+    trackers: Dict[int, Optional[HealthTracker]] = {}
+    done = retried = lost = 0
+    
+    logger.info(f"👷 Worker {worker} started" + (f" on run {run_id}" if run_id else ""))
+    while max_jobs is None or done + retried + lost < max_jobs:
+        jobs = sb.call("claim_run_jobs", {
+            "p_worker": worker,
+            "p_limit": 1,
+            "p_lease_seconds": lease_seconds,
+            "p_run_id": run_id,
+        }) or []
+        if not jobs:
+            if exit_when_idle:
+                break
+            time.sleep(poll_interval)
+            continue
+        job = jobs[0]
+        src = Source.from_dict(job["source"])
+        job_run_id, job_run_type = job["run_id"], job["run_type"]
+        
+        # One rate-series baseline per run, as a single process would screen with
+        if job_run_id not in detectors:
+            detectors[job_run_id] = None
+            if cfg.anomaly_detection and job_run_type == "real":
+                try:
+                    detectors[job_run_id] = AnomalyDetector.load(sb)
+                except Exception as e:
+                    logger.warning(f"⚠️  Anomaly detection disabled for run {job_run_id}: {e}")
+        detector = detectors[job_run_id]
+        if job_run_id not in trackers:
+            trackers[job_run_id] = None
+            if cfg.source_backoff and job_run_type == "real":
+                try:
+                    trackers[job_run_id] = HealthTracker.load(sb)
+                except Exception as e:
+                    logger.warning(f"⚠️  Source health not recorded for run {job_run_id}: {e}")
+        tracker = trackers[job_run_id]
+        
+        fetcher = FetchCache([src.rate_url], timeout=15.0, retries=2)
+        collector = SourceCollector(sb, cfg, job_run_id, job_run_type, fetcher, detector=detector,
+                                    include_disabled=True, health=tracker)
+        try:
+            collector.collect(src)
+            fetcher.close()
+            collector.stats.fetches = fetcher.fetches
+            result = collector.stats.to_dict()
+            if detector is not None:
+                # Only this job's observations; the coordinator advances the series once
+                result["anomaly_pending"] = detector.pending()
+                detector.clear_pending()
+            if tracker is not None:
+                result["health"] = tracker.to_dict()
+            if sb.finish_job(job["id"], worker, "done", result):
+                done += 1
+                if tracker is not None:
+                    try:
+                        tracker.save(sb, job_run_id)
+                    except Exception as e:
+                        logger.warning(f"⚠️  Saving source health failed for job {job['id']}: {e}")
+                        trackers.pop(job_run_id, None)
+            else:
+                lost += 1
+                # Whoever collects the source now records it; start over from the stored history
+                trackers.pop(job_run_id, None)
+        except Exception as e:
+            logger.exception(f"❌ Job {job['id']} ({src.name}) failed on attempt {job['attempts']}: {e}")
+            if detector is not None:
+                detector.clear_pending()
+            trackers.pop(job_run_id, None)
+            if sb.finish_job(job["id"], worker, "queued", error=str(e)):
+                retried += 1
+            else:
+                lost += 1
+    
+    logger.info(f"👷 Worker {worker} finished {done} job(s), handed back {retried}, lost {lost}")
+    return {"worker": worker, "jobs_done": done, "jobs_retried": retried, "jobs_lost": lost}
+
+
+def _close_run(
+    sb,
+    cfg,
+    run_id: int,
+    run_type: str,
+    created_at,
+    stats: Dict[str, Any],
+    part_stats: List[Dict[str, Any]],
+    incomplete: bool = False,
+    error_text: Optional[str] = None,
+) -> str:
+    """
+    Finish a run assembled from parts (shards or queue jobs): set its final
+    status, advance the rate series from the parts' observations and run
+    the post-run stages. Returns the final status.
+    """
+    final_status = _final_status(stats["sources_success"], stats["sources_enabled"])
+    if incomplete and final_status in ("success", "skipped"):
+        # Sources of a missing part were never collected
+        final_status = "partial" if stats["sources_success"] else "failed"
+    
+    published = "selection" not in stats
+    sb.finish_run(run_id, status=final_status, stats=stats, error_text=error_text, publish=published)
+    
+    detector = None
+    if cfg.anomaly_detection and run_type == "real":
+        pending = [s["anomaly_pending"] for s in part_stats if s.get("anomaly_pending")]
+        if pending:
+            try:
+                detector = AnomalyDetector.load(sb)
+                for data in pending:
+                    detector.add_pending(data)
+            except Exception as e:
+                logger.warning(f"⚠️  Rate series state not advanced for run {run_id}: {e}")
+                detector = None
+    _post_run(sb, cfg, run_id, run_type, final_status, stats, created_at, published, detector)
+    return final_status
+
+
+def _post_run(
+    sb,
+    cfg,
+    run_id: int,
+    run_type: str,
+    final_status: str,
+    stats: Dict[str, Any],
+    run_started,
+    published: bool,
+    detector: Optional[AnomalyDetector] = None,
+    run_offers: Optional[List[Dict[str, Any]]] = None,
+    previous: Optional[Tuple[Optional[int], List[Dict[str, Any]]]] = None,
+) -> None:
+    """
+    Post-run stages: best effort, they never change the run's outcome.
+    ``previous`` is (base run id, offers) to diff against instead of the
+    previous run, for runs that cover only some sources.
+    """
+    if final_status in ("success", "partial") and run_type == "real" and published:
+        try:
+            rollup_run(sb, run_id)
+        except Exception as e:
+            logger.warning(f"⚠️  Rollup failed for run {run_id}: {e}")
+        changes = None
+        try:
+            if previous is not None:
+                changes = store_diff(sb, run_id, previous[0], previous[1],
+                                     run_offers if run_offers is not None else sb.get_run_offers(run_id))
+            else:
+                changes = diff_run(sb, run_id, run_offers)
+        except Exception as e:
+            logger.warning(f"⚠️  Diff failed for run {run_id}: {e}")
+        if changes is not None:
+            try:
+                queue_alerts(sb, run_id, changes)
+            except Exception as e:
+                logger.warning(f"⚠️  Queuing alerts failed for run {run_id}: {e}")
+        if detector is not None:
+            try:
+                detector.save(sb, run_id)
+            except Exception as e:
+                logger.warning(f"⚠️  Saving rate series state failed for run {run_id}: {e}")
+    if final_status in ("success", "partial") and cfg.export_dir:
+        try:
+            export_run(cfg.export_dir, {
+                "id": run_id,
+                "run_type": run_type,
+                "status": final_status,
+                "created_at": run_started,
+                "finished_at": datetime.now(timezone.utc),
+                "stats_json": stats,
+            }, run_offers if run_offers is not None else sb.get_run_offers(run_id))
+        except Exception as e:
+            logger.warning(f"⚠️  Export failed for run {run_id}: {e}")
+    if final_status in ("success", "partial") and cfg.artifacts_dir and published:
+        try:
+            publish_artifacts(sb, cfg.artifacts_dir, cfg.artifacts_compress)
+        except Exception as e:
+            logger.warning(f"⚠️  Writing artifacts failed for run {run_id}: {e}")
 
 
 def main():
@@ -276,19 +957,123 @@ def main():
     )
     parser.add_argument(
         "--sources",
+        action="append",
+        default=None,
+        help="Path to sources.yaml file (default: sources.yaml in cwd); repeat to merge several catalogs"
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        default=[],
+        metavar="FIELD:VALUE",
+        help="Only collect matching sources: tag:, id:, name:, org_type:, parser:, reliability: (repeatable)"
+    )
+    parser.add_argument("--parser", action="append", default=[], help="Only sources using this parser")
+    parser.add_argument("--reliability", action="append", default=[], help="Only sources with this parser_reliability")
+    parser.add_argument(
+        "--include-disabled",
+        action="store_true",
+        help="Also collect selected sources that are disabled in the catalog"
+    )
+    parser.add_argument(
+        "--shard",
         default=None,
-        help="Path to sources.yaml file (default: sources.yaml in cwd)"
+        metavar="I/N",
+        help="Only collect slice I of N (stable by rate_url); needs --run-id, finish with --merge-run"
+    )
+    parser.add_argument("--run-id", type=int, default=None, help="Write under this existing run")
+    parser.add_argument(
+        "--create-run",
+        action="store_true",
+        help="Create a run for the shards to write under and print its id"
+    )
+    parser.add_argument(
+        "--merge-run",
+        type=int,
+        default=None,
+        metavar="RUN_ID",
+        help="Combine the shards of a run, set its final status and publish it"
+    )
+    parser.add_argument(
+        "--coordinator",
+        action="store_true",
+        help="Queue one job per source for --worker processes, wait for them and publish the run"
+    )
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="Collect queued source jobs (of --run-id, or of any open run) until the queue is empty; "
+             "needs WRITER=postgres"
     )
+    parser.add_argument("--lease-seconds", type=int, default=JOB_LEASE_SECONDS,
+                        help="Worker: how long a claimed job is held before another worker may retry it")
+    parser.add_argument("--wait-timeout", type=float, default=COORDINATOR_TIMEOUT,
+                        help="Coordinator: seconds to wait for the workers before closing the run")
+    parser.add_argument("--keep-polling", action="store_true", help="Worker: wait for new jobs instead of exiting")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Stay resident and collect each source on its own schedule (see daemon.py)"
+    )
+    parser.add_argument("--tick", type=float, default=60.0, help="Daemon: seconds between schedule checks")
     
     args = parser.parse_args()
+    modes = [m for m in ("shard", "create_run", "merge_run", "coordinator", "worker", "daemon")
+             if getattr(args, m) not in (None, False)]
+    if len(modes) > 1:
+        parser.error(f"choose one of --{', --'.join(m.replace('_', '-') for m in modes)}")
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+    if shard is not None and args.run_id is None:
+        parser.error("--shard needs --run-id (create one with --create-run)")
+    selection = SourceSelection(
+        only=tuple(args.only),
+        parsers=tuple(args.parser),
+        reliability=tuple(args.reliability),
+        include_disabled=args.include_disabled,
+    )
     
     try:
-        result = run_collector(run_type=args.run_type, sources_path=args.sources)
+        if args.create_run:
+            print(start_run(run_type=args.run_type, sources_path=args.sources))
+            sys.exit(0)
+        if args.daemon:
+            from .daemon import run_daemon
+            run_daemon(run_type=args.run_type, sources_path=args.sources, tick=args.tick)
+            sys.exit(0)
+        if args.worker:
+            run_worker(
+                sources_path=args.sources,
+                run_id=args.run_id,
+                lease_seconds=args.lease_seconds,
+                exit_when_idle=not args.keep_polling,
+            )
+            sys.exit(0)
+        if args.merge_run is not None:
+            result = merge_run(args.merge_run, sources_path=args.sources)
+        elif args.coordinator:
+            result = run_coordinator(
+                run_type=args.run_type,
+                sources_path=args.sources,
+                selection=selection or None,
+                timeout=args.wait_timeout,
+            )
+        else:
+            result = run_collector(
+                run_type=args.run_type,
+                sources_path=args.sources,
+                selection=selection or None,
+                shard=shard,
+                run_id=args.run_id,
+            )
         
         # Exit with appropriate code
         # Both "success" and "partial" are considered successful runs
         # Partial means at least one source succeeded (which is good!)
-        if result["status"] in ["success", "partial"]:
+        # Skipped means every source is in back-off: nothing went wrong
+        if result["status"] in ["success", "partial", "skipped"]:
             sys.exit(0)
         else:
             # Only fail if NO sources succeeded
@@ -42,12 +42,12 @@ def run_once():
 
     for src in cfg.sources:
         total_sources += 1
-        if not src.get("enabled", True):
-            logger.info(json.dumps({"event":"source_skipped","name":src.get("name")}))
+        if not src.enabled:
+            logger.info(json.dumps({"event":"source_skipped","name":src.name}))
             continue
-        name = src.get("name")
-        method = src.get("method")
-        rate_url = src.get("rate_url")
+        name = src.name
+        method = src.parser_key
+        rate_url = src.rate_url
 
         try:
             source_id = sb.upsert_source(src)
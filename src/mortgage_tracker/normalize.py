@@ -24,7 +24,7 @@ def normalize_offers(raw_offers: List[Dict[str, Any]], defaults: Defaults) -> Li
             "ltv": _to_float(ro.get("ltv")) or defaults.ltv,
             "fico": _to_int(ro.get("fico")) or defaults.fico,
             "state": ro.get("state") or defaults.state,
-            "term_months": _to_int(ro.get("term_months")) or _term_for_category(cat),
+            "term_months": _to_int(ro.get("term_months")) or term_for_category(cat),
             "lock_days": _to_int(ro.get("lock_days")) or defaults.lock_days,
             "details_json": ro,
         }
@@ -32,7 +32,8 @@ def normalize_offers(raw_offers: List[Dict[str, Any]], defaults: Defaults) -> Li
     return norm
 
 
-def _term_for_category(cat: str) -> int:
+def term_for_category(cat: str) -> int:
+    """Loan term in months implied by a category (360 unless it is a 15-year product)."""
     if cat == "15Y fixed":
         return 180
     return 360
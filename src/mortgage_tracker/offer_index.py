@@ -0,0 +1,297 @@
+"""
+In-memory faceted index over the latest published offers.
+
+The website used to pull every latest row and filter client-side. This
+index keeps the latest offers in-process with
+
+- a bitmap (a Python int, one bit per row) per value of each facet:
+  category, state, lender_name, points_band, lock_days, data_source
+- a sorted array of (value, row) per sortable field: rate, apr, points,
+  lender_fees
+
+so a query ANDs a handful of bitmaps and walks one sorted array until it has
+``limit`` rows, instead of scanning and sorting everything.
+
+When a new run lands, ``apply_offers`` diffs it against what is indexed by
+offer identity and only touches rows that were added, removed or repriced.
+
+    python -m mortgage_tracker.offer_index --category "30Y fixed" --sort apr --limit 5
+"""
+import argparse
+import bisect
+import json
+import logging
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.offer_index")
+
+FACETS = ("category", "state", "lender_name", "points_band", "lock_days", "data_source")
+SORT_FIELDS = ("rate", "apr", "points", "lender_fees")
+
+# Upper bounds (inclusive) of the points bands, best first
+POINTS_BANDS = ((0.0, "0"), (0.5, "0-0.5"), (1.0, "0.5-1"), (2.0, "1-2"))
+
+
+def points_band(points) -> str:
+    value = safe_float(points, None)
+    if value is None:
+        return "unknown"
+    for upper, label in POINTS_BANDS:
+        if value <= upper:
+            return label
+    return "2+"
+
+
+def offer_key(offer: Dict[str, Any]) -> Tuple:
+    """Identity of an offer across runs (same profile as the collector's dedup key)."""
+    return (
+        offer.get("data_source"),
+        offer.get("source_id"),
+        offer.get("lender_name"),
+        offer.get("category"),
+        safe_float(offer.get("loan_amount"), None),
+        offer.get("ltv"),
+        offer.get("fico"),
+        offer.get("lock_days"),
+        safe_float(offer.get("points"), None),
+    )
+
+
+class OfferIndex:
+    """Bitmap/sorted-array index supporting filter + sort + limit queries."""
+
+    def __init__(self, offers: Iterable[Dict[str, Any]] = ()):
+        self._rows: List[Optional[Dict[str, Any]]] = []
+        self._values: List[Optional[Dict[str, Any]]] = []  # indexed values per row
+        self._free: List[int] = []
+        self._by_key: Dict[Tuple, int] = {}
+        self._live = 0
+        self._bitmaps: Dict[str, Dict[Any, int]] = {f: {} for f in FACETS}
+        self._sorted: Dict[str, List[Tuple[float, int]]] = {f: [] for f in SORT_FIELDS}
+        self._missing: Dict[str, int] = {f: 0 for f in SORT_FIELDS}
+        self.version = 0
+        self.apply_offers(offers)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    # ---------------------------------------------------------------
+    # Maintenance
+    # ---------------------------------------------------------------
+
+    @staticmethod
+    def _indexed_values(offer: Dict[str, Any]) -> Dict[str, Any]:
+        values = {f: offer.get(f) for f in FACETS if f != "points_band"}
+        values["points_band"] = points_band(offer.get("points"))
+        for f in SORT_FIELDS:
+            values[f] = safe_float(offer.get(f), None)
+        return values
+
+    def _insert(self, key: Tuple, offer: Dict[str, Any], values: Dict[str, Any]) -> None:
+        if self._free:
+            pos = self._free.pop()
+            self._rows[pos] = offer
+            self._values[pos] = values
+        else:
+            pos = len(self._rows)
+            self._rows.append(offer)
+            self._values.append(values)
+        bit = 1 << pos
+        self._by_key[key] = pos
+        self._live |= bit
+        for f in FACETS:
+            bitmaps = self._bitmaps[f]
+            bitmaps[values[f]] = bitmaps.get(values[f], 0) | bit
+        for f in SORT_FIELDS:
+            if values[f] is None:
+                self._missing[f] |= bit
+            else:
+                bisect.insort(self._sorted[f], (values[f], pos))
+
+    def _delete(self, key: Tuple) -> None:
+        pos = self._by_key.pop(key)
+        values = self._values[pos]
+        bit = 1 << pos
+        self._live &= ~bit
+        for f in FACETS:
+            bitmaps = self._bitmaps[f]
+            remaining = bitmaps[values[f]] & ~bit
+            if remaining:
+                bitmaps[values[f]] = remaining
+            else:
+                del bitmaps[values[f]]
+        for f in SORT_FIELDS:
+            if values[f] is None:
+                self._missing[f] &= ~bit
+            else:
+                arr = self._sorted[f]
+                del arr[bisect.bisect_left(arr, (values[f], pos))]
+        self._rows[pos] = None
+        self._values[pos] = None
+        self._free.append(pos)
+
+    def apply_offers(self, offers: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Make the index hold exactly ``offers`` (a full latest set), touching
+        only rows whose indexed values changed. Returns change counts.
+        """
+        incoming: Dict[Tuple, Dict[str, Any]] = {}
+        for offer in offers:
+            incoming[offer_key(offer)] = offer
+
+        counts = {"added": 0, "removed": 0, "updated": 0, "unchanged": 0}
+        for key in [k for k in self._by_key if k not in incoming]:
+            self._delete(key)
+            counts["removed"] += 1
+        for key, offer in incoming.items():
+            values = self._indexed_values(offer)
+            pos = self._by_key.get(key)
+            if pos is None:
+                self._insert(key, offer, values)
+                counts["added"] += 1
+            elif self._values[pos] != values:
+                self._delete(key)
+                self._insert(key, offer, values)
+                counts["updated"] += 1
+            else:
+                # Same indexed values (new id/run_id/updated_at): swap the row in place
+                self._rows[pos] = offer
+                counts["unchanged"] += 1
+
+        self.version += 1
+        logger.debug("offer_index_applied", extra={"version": self.version, **counts})
+        return counts
+
+    # ---------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------
+
+    def _mask(self, filters: Dict[str, Any]) -> int:
+        mask = self._live
+        for f, wanted in filters.items():
+            if wanted is None:
+                continue
+            if f not in self._bitmaps:
+                raise ValueError(f"Unknown filter {f!r}; expected one of {FACETS}")
+            bitmaps = self._bitmaps[f]
+            if isinstance(wanted, (list, tuple, set, frozenset)):
+                any_of = 0
+                for value in wanted:
+                    any_of |= bitmaps.get(value, 0)
+            else:
+                any_of = bitmaps.get(wanted, 0)
+            mask &= any_of
+            if not mask:
+                break
+        return mask
+
+    def count(self, **filters) -> int:
+        return bin(self._mask(filters)).count("1")
+
+    def facet_counts(self, facet: str, **filters) -> Dict[Any, int]:
+        """Rows per value of ``facet`` among rows matching the other filters."""
+        filters.pop(facet, None)
+        mask = self._mask(filters)
+        counts = {}
+        for value, bits in self._bitmaps[facet].items():
+            n = bin(bits & mask).count("1")
+            if n:
+                counts[value] = n
+        return counts
+
+    def query(self, sort: Optional[str] = "rate", limit: Optional[int] = 50, offset: int = 0,
+              **filters) -> List[Dict[str, Any]]:
+        """
+        Offers matching every filter, ordered by ``sort`` (``"apr"``,
+        ``"-rate"``, ...; None for index order). Filter values may be a
+        single value or a collection meaning "any of". Rows missing the sort
+        value come last.
+        """
+        mask = self._mask(filters)
+        want = None if limit is None else offset + limit
+        out: List[int] = []
+        if not mask:
+            return []
+
+        if sort is None:
+            pos = 0
+            bits = mask
+            while bits and (want is None or len(out) < want):
+                if bits & 1:
+                    out.append(pos)
+                bits >>= 1
+                pos += 1
+        else:
+            field = sort.lstrip("-")
+            if field not in self._sorted:
+                raise ValueError(f"Unknown sort field {sort!r}; expected one of {SORT_FIELDS}")
+            arr = self._sorted[field]
+            walk = reversed(arr) if sort.startswith("-") else arr
+            for _, pos in walk:
+                if (mask >> pos) & 1:
+                    out.append(pos)
+                    if want is not None and len(out) >= want:
+                        break
+            missing = mask & self._missing[field]
+            pos = 0
+            while missing and (want is None or len(out) < want):
+                if missing & 1:
+                    out.append(pos)
+                missing >>= 1
+                pos += 1
+
+        return [self._rows[p] for p in out[offset:want]]
+
+
+def load_latest(sb, include_sample: bool = False) -> List[Dict[str, Any]]:
+    return sb.call("get_latest_rates_with_fallback", {"include_sample": include_sample}) or []
+
+
+def build_index(sb, include_sample: bool = False) -> OfferIndex:
+    return OfferIndex(load_latest(sb, include_sample))
+
+
+def refresh_index(index: OfferIndex, sb, include_sample: bool = False) -> Dict[str, int]:
+    """Bring ``index`` up to the latest published run, touching only changed rows."""
+    counts = index.apply_offers(load_latest(sb, include_sample))
+    logger.info(f"🔄 Offer index v{index.version}: {counts}")
+    return counts
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Query the latest offers through the in-memory index")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    parser.add_argument("--include-sample", action="store_true")
+    for f in FACETS:
+        parser.add_argument(f"--{f.replace('_', '-')}", dest=f, action="append", default=None)
+    parser.add_argument("--sort", default="rate")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--facet", default=None, help="Print counts per value of this facet instead")
+    args = parser.parse_args()
+
+    index = build_index(make_writer(load_config(args.sources)), args.include_sample)
+    filters = {}
+    for f in FACETS:
+        values = getattr(args, f)
+        if values:
+            # lock_days is numeric in the data
+            filters[f] = [int(v) for v in values] if f == "lock_days" else values
+
+    if args.facet:
+        result: Any = index.facet_counts(args.facet, **filters)
+    else:
+        result = index.query(sort=args.sort, limit=args.limit, offset=args.offset, **filters)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
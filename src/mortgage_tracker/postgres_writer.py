@@ -0,0 +1,427 @@
+"""
+Direct Postgres writer that bulk-loads a run with COPY.
+
+PostgREST inserts go through JSON encoding, HTTP and row-by-row planning.
+This writer (opt-in with WRITER=postgres) connects straight to
+DATABASE_URL, buffers the run's snapshots and offers in memory and
+streams them with ``COPY ... FROM STDIN`` inside a single transaction
+when the run finishes.
+
+It exposes the same methods as ``SupabaseWriter`` so ``run_collector`` does
+not care which one it is talking to.
+"""
+import io
+import json
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import Source
+
+logger = logging.getLogger("mortgage_tracker.postgres")
+
+COPY_FORMATS = ("binary", "csv")
+
+SNAPSHOT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("run_id", "int8"),
+    ("source_id", "int8"),
+    ("http_status", "int4"),
+    ("raw_text", "text"),
+    ("raw_json", "jsonb"),
+    ("parse_status", "text"),
+    ("parse_error", "text"),
+)
+
+# Only copied when some snapshot in the run carries them (migrations 005/006)
+OPTIONAL_SNAPSHOT_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("raw_sha256", "text"),
+    ("page_sha256", "text"),
+    ("page_bytes", "int4"),
+    ("trim_regions", "jsonb"),
+)
+
+OFFER_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("run_id", "int8"),
+    ("source_id", "int8"),
+    ("lender_name", "text"),
+    ("category", "text"),
+    ("rate", "numeric"),
+    ("apr", "numeric"),
+    ("points", "numeric"),
+    ("lender_fees", "numeric"),
+    ("loan_amount", "numeric"),
+    ("ltv", "numeric"),
+    ("fico", "int4"),
+    ("state", "text"),
+    ("term_months", "int4"),
+    ("lock_days", "int4"),
+    ("details_json", "jsonb"),
+    ("data_source", "text"),
+)
+
+# Only copied when some offer in the run carries them (migration 011)
+OPTIONAL_OFFER_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("offer_key", "text"),
+)
+
+RUN_SOURCE_COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("run_id", "int8"),
+    ("source_id", "int8"),
+    ("offer_keys", "text[]"),
+    ("offers_changed", "int4"),
+)
+
+
+class PostgresWriter:
+    """Writes runs straight to Postgres, loading snapshots and offers with COPY."""
+
+    def __init__(self, database_url: str, copy_format: str = "binary"):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise ImportError(
+                "WRITER=postgres needs psycopg, which is not installed; "
+                "install it with `pip install .[postgres]` or unset WRITER to use the REST API"
+            ) from e
+        if copy_format not in COPY_FORMATS:
+            raise ValueError(f"copy_format must be one of {COPY_FORMATS}, got {copy_format!r}")
+
+        self._psycopg = psycopg
+        self.copy_format = copy_format
+        self.conn = psycopg.connect(database_url)
+        self._snapshots: List[Dict[str, Any]] = []
+        self._offers: List[Dict[str, Any]] = []
+        self._blobs: Dict[str, Any] = {}
+        self._run_sources: List[Dict[str, Any]] = []
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def create_run(self, status: str = "started", run_type: str = "real") -> int:
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "insert into public.runs (status, run_type) values (%s, %s) returning id",
+                (status, run_type),
+            )
+            run_id = cur.fetchone()[0]
+        self.conn.commit()
+        logger.info("run_created", extra={"run_id": run_id, "run_type": run_type})
+        return run_id
+
+    def finish_run(self, run_id: int, status: str, stats: Optional[Dict[str, Any]] = None,
+                   error_text: Optional[str] = None, publish: bool = True) -> None:
+        """
+        Flush the buffered rows, close the run and (unless ``publish`` is
+        False, e.g. for a run over a subset of sources) republish
+        latest_rates, in one transaction.
+        """
+        try:
+            with self.conn.cursor() as cur:
+                snapshots, offers = self._flush(cur)
+                self._update_run(cur, run_id, status, stats, error_text)
+                if publish and status in ("success", "partial"):
+                    cur.execute("select public.refresh_latest_rates(%s)", (run_id,))
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error("copy_failed", extra={"run_id": run_id, "error": str(e)})
+            # Leave a trace of the failed load rather than a run stuck in 'started'
+            with self.conn.cursor() as cur:
+                self._update_run(cur, run_id, "failed", stats, f"bulk load failed: {e}")
+            self.conn.commit()
+            raise
+        logger.info(
+            "run_finished",
+            extra={"run_id": run_id, "status": status, "snapshots": snapshots, "offers": offers},
+        )
+
+    def finish_shard(self, run_id: int, shard: int, shard_count: int, status: str,
+                     stats: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Flush one shard's buffered rows and record its outcome (migration
+        017) in one transaction. The run itself stays open for the merge.
+        """
+        try:
+            with self.conn.cursor() as cur:
+                snapshots, offers = self._flush(cur)
+                cur.execute(
+                    "select public.save_run_shard(%s, %s, %s, %s, %s)",
+                    (run_id, shard, shard_count, status, self._psycopg.types.json.Jsonb(stats or {})),
+                )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error("copy_failed", extra={"run_id": run_id, "shard": shard, "error": str(e)})
+            with self.conn.cursor() as cur:
+                cur.execute(
+                    "select public.save_run_shard(%s, %s, %s, 'failed', %s)",
+                    (run_id, shard, shard_count,
+                     self._psycopg.types.json.Jsonb({**(stats or {}), "error": f"bulk load failed: {e}"})),
+                )
+            self.conn.commit()
+            raise
+        logger.info(
+            "shard_finished",
+            extra={"run_id": run_id, "shard": shard, "status": status, "snapshots": snapshots, "offers": offers},
+        )
+
+    def finish_job(self, job_id: int, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+                   error: Optional[str] = None) -> bool:
+        """
+        Report a queue job (migration 018). A 'done' job's buffered rows
+        are loaded in the same transaction, and only if the worker still
+        holds the job, so a reclaimed job's work is never stored twice.
+        Returns False when the job was lost.
+        """
+        if status != "done":
+            self._snapshots, self._offers, self._blobs, self._run_sources = [], [], {}, []
+        try:
+            with self.conn.cursor() as cur:
+                snapshots, offers = self._flush(cur) if status == "done" else (0, 0)
+                cur.execute(
+                    "select public.finish_run_job(%s, %s, %s, %s, %s)",
+                    (job_id, worker, status, self._psycopg.types.json.Jsonb(result) if result is not None else None, error),
+                )
+                held = cur.fetchone()[0]
+            if not held:
+                self.conn.rollback()
+                logger.warning("job_lost", extra={"job_id": job_id, "worker": worker})
+                return False
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            logger.error("copy_failed", extra={"job_id": job_id, "error": str(e)})
+            raise
+        logger.info(
+            "job_finished",
+            extra={"job_id": job_id, "status": status, "snapshots": snapshots, "offers": offers},
+        )
+        return True
+
+    def _flush(self, cur) -> Tuple[int, int]:
+        """COPY the buffered blobs, snapshots, offers and run markers. Returns (snapshots, offers)."""
+        snapshots, offers, blobs = self._snapshots, self._offers, self._blobs
+        run_sources = self._run_sources
+        self._snapshots, self._offers, self._blobs, self._run_sources = [], [], {}, []
+        snapshot_columns = SNAPSHOT_COLUMNS + tuple(
+            col for col in OPTIONAL_SNAPSHOT_COLUMNS if any(s.get(col[0]) is not None for s in snapshots)
+        )
+        offer_columns = OFFER_COLUMNS + tuple(
+            col for col in OPTIONAL_OFFER_COLUMNS if any(o.get(col[0]) is not None for o in offers)
+        )
+        self._insert_blobs(cur, blobs)
+        self._copy(cur, "rate_snapshots", snapshot_columns, snapshots)
+        self._copy(cur, "offers_normalized", offer_columns, offers)
+        self._copy(cur, "run_sources", RUN_SOURCE_COLUMNS, run_sources)
+        return len(snapshots), len(offers)
+
+    def upsert_source(self, src: Source) -> int:
+        row = src.row()
+        with self.conn.cursor() as cur:
+            cur.execute(
+                """
+                insert into public.sources (name, org_type, homepage_url, rate_url, method, enabled, notes)
+                values (%s, %s, %s, %s, %s, %s, %s)
+                on conflict (name) do update set
+                  org_type = excluded.org_type,
+                  homepage_url = excluded.homepage_url,
+                  rate_url = excluded.rate_url,
+                  method = excluded.method,
+                  enabled = excluded.enabled,
+                  notes = excluded.notes,
+                  updated_at = now()
+                returning id
+                """,
+                (
+                    row["name"],
+                    row["org_type"],
+                    row["homepage_url"],
+                    row["rate_url"],
+                    row["method"],
+                    row["enabled"],
+                    row["notes"],
+                ),
+            )
+            source_id = cur.fetchone()[0]
+        self.conn.commit()
+        return source_id
+
+    def insert_snapshot(self, snapshot: Dict[str, Any]) -> Optional[int]:
+        # Rows are loaded at finish_run, so there is no id to hand back yet.
+        self._snapshots.append(snapshot)
+        return None
+
+    def insert_offers(self, offers: List[Dict[str, Any]]) -> None:
+        self._offers.extend(offers)
+
+    def insert_run_source(self, row: Dict[str, Any]) -> None:
+        self._run_sources.append(row)
+
+    def get_source_offer_state(self, source_id: int) -> List[Dict[str, Any]]:
+        return self.call("get_source_offer_state", {"p_source_id": source_id})
+
+    def get_snapshot(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        with self.conn.cursor(row_factory=self._psycopg.rows.dict_row) as cur:
+            cur.execute("select * from public.rate_snapshots where id = %s", (snapshot_id,))
+            return cur.fetchone()
+
+    def put_blob(self, blob) -> None:
+        self._blobs[blob.sha256] = blob
+
+    def get_blob(self, sha256: str) -> Optional[Tuple[str, bytes]]:
+        with self.conn.cursor() as cur:
+            cur.execute("select codec, data from public.snapshot_blobs where sha256 = %s", (sha256,))
+            row = cur.fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def _rpc_param(self, value: Any) -> Any:
+        if isinstance(value, (dict, list)):
+            return self._psycopg.types.json.Jsonb(value)
+        if isinstance(value, float):
+            return Decimal(repr(value))
+        return value
+
+    def call(self, fn: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """
+        Invoke a database function and commit.
+
+        Mirrors PostgREST RPC results: a scalar for scalar functions, a list
+        of row dicts for table functions. Dict and list arguments are sent
+        as jsonb, as PostgREST does; floats as numeric, which (unlike
+        float8) also resolves against numeric parameters.
+        """
+        params = {k: self._rpc_param(v) for k, v in (params or {}).items()}
+        args = ", ".join(f"{k} => %({k})s" for k in params)
+        with self.conn.cursor(row_factory=self._psycopg.rows.dict_row) as cur:
+            cur.execute(f"select * from public.{fn}({args})", params)
+            rows = cur.fetchall() if cur.description else []
+            names = [c.name for c in cur.description or []]
+        self.conn.commit()
+        if names == [fn]:
+            return rows[0][fn] if rows else None
+        return rows
+
+    def get_inline_snapshots(self, before: str, limit: int) -> List[Dict[str, Any]]:
+        with self.conn.cursor(row_factory=self._psycopg.rows.dict_row) as cur:
+            cur.execute(
+                """
+                select id, created_at, raw_text from public.rate_snapshots
+                 where created_at < %s and raw_text is not null
+                 order by id limit %s
+                """,
+                (before, limit),
+            )
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def attach_snapshot_blob(self, snapshot: Dict[str, Any], blob) -> None:
+        with self.conn.cursor() as cur:
+            self._insert_blobs(cur, {blob.sha256: blob})
+            cur.execute(
+                """
+                update public.rate_snapshots set raw_text = null, raw_sha256 = %s
+                 where id = %s and created_at = %s
+                """,
+                (blob.sha256, snapshot["id"], snapshot["created_at"]),
+            )
+        self.conn.commit()
+
+    def get_runs(self, run_type: str = "real", statuses=("success", "partial"), since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Finished runs of a type, oldest first."""
+        with self.conn.cursor(row_factory=self._psycopg.rows.dict_row) as cur:
+            cur.execute(
+                """
+                select id, run_type, status, created_at, finished_at, stats_json
+                  from public.runs
+                 where run_type = %s and status = any(%s)
+                   and (%s::timestamptz is null or created_at >= %s::timestamptz)
+                 order by created_at
+                """,
+                (run_type, list(statuses), since, since),
+            )
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def get_run_offers(self, run_id: int) -> List[Dict[str, Any]]:
+        with self.conn.cursor(row_factory=self._psycopg.rows.dict_row) as cur:
+            # Reconstructs change-only runs too (migration 011)
+            cur.execute("select * from public.get_run_offers(%s) order by id", (run_id,))
+            rows = cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def _insert_blobs(self, cur, blobs: Dict[str, Any]) -> None:
+        if not blobs:
+            return
+        # Only ship bytes the store has not seen before
+        cur.execute("select sha256 from public.snapshot_blobs where sha256 = any(%s)", (list(blobs),))
+        known = {row[0] for row in cur.fetchall()}
+        missing = [b for sha, b in blobs.items() if sha not in known]
+        if missing:
+            cur.executemany(
+                """
+                insert into public.snapshot_blobs (sha256, codec, raw_bytes, stored_bytes, data)
+                values (%s, %s, %s, %s, %s)
+                on conflict (sha256) do nothing
+                """,
+                [(b.sha256, b.codec, b.raw_bytes, b.stored_bytes, b.data) for b in missing],
+            )
+        logger.info("blobs_stored", extra={"new": len(missing), "deduplicated": len(known)})
+
+    def _update_run(self, cur, run_id: int, status: str, stats: Optional[Dict[str, Any]], error_text: Optional[str]) -> None:
+        cur.execute(
+            """
+            update public.runs
+               set finished_at = now(), status = %s, stats_json = %s, error_text = %s
+             where id = %s
+            """,
+            (status, self._psycopg.types.json.Jsonb(stats or {}), error_text, run_id),
+        )
+
+    def _copy(self, cur, table: str, columns: Sequence[Tuple[str, str]], rows: List[Dict[str, Any]]) -> None:
+        if not rows:
+            return
+        names = ", ".join(name for name, _ in columns)
+        if self.copy_format == "binary":
+            with cur.copy(f"copy public.{table} ({names}) from stdin (format binary)") as copy:
+                copy.set_types([pg_type for _, pg_type in columns])
+                for row in rows:
+                    copy.write_row([_binary_value(row.get(name), pg_type) for name, pg_type in columns])
+        else:
+            with cur.copy(f"copy public.{table} ({names}) from stdin (format csv)") as copy:
+                buf = io.StringIO()
+                for row in rows:
+                    buf.write(",".join(_csv_field(row.get(name), pg_type) for name, pg_type in columns))
+                    buf.write("\n")
+                copy.write(buf.getvalue())
+        logger.info("copy_loaded", extra={"table": table, "rows": len(rows), "format": self.copy_format})
+
+
+def _binary_value(value: Any, pg_type: str) -> Any:
+    if value is None:
+        return None
+    if pg_type == "numeric":
+        # The binary numeric dumper wants exact decimals, not floats
+        return Decimal(str(value))
+    if pg_type == "jsonb":
+        from psycopg.types.json import Jsonb
+        return Jsonb(value)
+    return value
+
+
+def _csv_field(value: Any, pg_type: str = "text") -> str:
+    """Render one CSV field; unquoted empty means NULL, quoted empty is ''."""
+    if value is None:
+        return ""
+    if pg_type.endswith("[]"):
+        # Array literal of plain tokens (hex keys): {a,b,c}
+        value = "{" + ",".join(str(v) for v in value) + "}"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return '"' + str(value).replace('"', '""') + '"'
@@ -1,23 +1,125 @@
-from typing import List, Dict
+import heapq
+import math
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Ordering names accepted by TopNRanker; prefix with "-" for descending
+SORT_FIELDS = {
+    "rate": "rate",
+    "apr": "apr",
+    "points": "points",
+    "fees": "lender_fees",
+}
+
+DEFAULT_ORDER = ("rate", "apr")
+
+
+class _Worst:
+    """Heap entry wrapper that inverts ordering, so heap[0] is the worst kept offer."""
+
+    __slots__ = ("key", "offer")
+
+    def __init__(self, key: Tuple, offer: Dict):
+        self.key = key
+        self.offer = offer
+
+    def __lt__(self, other: "_Worst") -> bool:
+        return other.key < self.key
+
+
+class TopNRanker:
+    """
+    Keeps the best ``n`` offers per category as offers stream in.
+
+    Each category holds a bounded heap, so adding an offer costs at most
+    O(log n) and memory stays at ``n`` offers per category however many are
+    fed in. Sort keys are converted to floats once, when the offer is added.
+
+    ``order`` lists the fields compared in turn (``rate``, ``apr``,
+    ``points``, ``fees``; ``"-points"`` for descending); missing or
+    non-numeric values always rank last. ``tie_break`` names further string
+    fields (e.g. ``lender_name``); offers still equal after that keep the
+    order they were added in.
+
+    Rankers built with the same settings (say, one per worker) combine with
+    ``merge``.
+    """
+
+    def __init__(self, n: int = 10, order: Sequence[str] = DEFAULT_ORDER, tie_break: Sequence[str] = ()):
+        if n < 1:
+            raise ValueError(f"n must be at least 1, got {n}")
+        self.n = n
+        self.order = tuple(order)
+        self.tie_break = tuple(tie_break)
+        self._fields: List[Tuple[str, float]] = []
+        for name in self.order:
+            field = SORT_FIELDS.get(name.lstrip("-"))
+            if field is None:
+                raise ValueError(f"Unknown sort field {name!r}; expected one of {sorted(SORT_FIELDS)}")
+            self._fields.append((field, -1.0 if name.startswith("-") else 1.0))
+        self._heaps: Dict[Any, List[_Worst]] = {}
+        self._seq = 0
+
+    def sort_key(self, offer: Dict) -> Tuple:
+        key: List[Any] = []
+        for field, sign in self._fields:
+            value = safe_float(offer.get(field), None)
+            key.append(math.inf if value is None else sign * value)
+        for field in self.tie_break:
+            key.append(str(offer.get(field) or ""))
+        return tuple(key)
+
+    def add(self, offer: Dict) -> bool:
+        """Offer one row to the ranking. Returns True if it is currently kept."""
+        return self._push(offer.get("category"), self.sort_key(offer), offer)
+
+    def add_many(self, offers: Iterable[Dict]) -> "TopNRanker":
+        for offer in offers:
+            self.add(offer)
+        return self
+
+    def _push(self, category, key: Tuple, offer: Dict) -> bool:
+        # Insertion sequence last: stable among equal keys, and never
+        # falls through to comparing the offer dicts themselves
+        key = key + (self._seq,)
+        self._seq += 1
+        heap = self._heaps.setdefault(category, [])
+        if len(heap) < self.n:
+            heapq.heappush(heap, _Worst(key, offer))
+            return True
+        if key < heap[0].key:
+            heapq.heapreplace(heap, _Worst(key, offer))
+            return True
+        return False
+
+    def merge(self, other: "TopNRanker") -> "TopNRanker":
+        """Fold another ranker's kept offers into this one (in place)."""
+        if (other.order, other.tie_break) != (self.order, self.tie_break):
+            raise ValueError("Cannot merge rankers with different orderings")
+        for category, heap in other._heaps.items():
+            for entry in sorted(heap, key=lambda e: e.key):
+                self._push(category, entry.key[:-1], entry.offer)
+        return self
+
+    def categories(self) -> List[Any]:
+        return list(self._heaps)
+
+    def top(self, category, limit: Optional[int] = None) -> List[Dict]:
+        """Best offers for one category, best first."""
+        entries = sorted(self._heaps.get(category, []), key=lambda e: e.key)
+        return [e.offer for e in entries[:limit]]
+
+    def result(self) -> Dict[Any, List[Dict]]:
+        return {cat: self.top(cat) for cat in self._heaps}
 
 
 def top_n_per_category(rows: List[Dict], n: int = 10) -> dict:
-    grouped: dict = {}
-    for r in rows:
-        cat = r.get("category")
-        grouped.setdefault(cat, []).append(r)
-    result: dict = {}
-    for cat, items in grouped.items():
-        items.sort(key=lambda x: (
-            _safe_float(x.get("rate"), 9999.0),
-            _safe_float(x.get("apr"), 9999.0),
-        ))
-        result[cat] = items[:n]
-    return result
-
-
-def _safe_float(v, default):
+    return TopNRanker(n).add_many(rows).result()
+
+
+def safe_float(v, default):
+    """``float(v)``, or ``default`` for None, NaN and values that do not convert."""
     try:
-        return float(v) if v is not None else default
+        f = float(v) if v is not None else default
     except Exception:
         return default
+    return default if f is not None and math.isnan(f) else f
@@ -0,0 +1,118 @@
+"""
+Retention and compaction for offer / snapshot history (migration 008).
+
+    python -m mortgage_tracker.retention purge-samples [--keep-latest]
+    python -m mortgage_tracker.retention compact-snapshots --older-than-days 30
+    python -m mortgage_tracker.retention drop-partitions --before 2025-01-01
+    python -m mortgage_tracker.retention ensure-partitions [--months-ahead 2]
+
+Deletes run in the database as single set-based statements; compaction packs
+old inline raw_text into the content-addressed blob store (migration 005)
+and then drops blobs nothing points at any more.
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from .blobstore import encode_blob
+from .config import load_config
+from .supabase_client import make_writer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger("mortgage_tracker.retention")
+
+
+def purge_sample_runs(sb, keep_latest: bool = False) -> int:
+    """Delete sample runs (and, by cascade, their offers and snapshots)."""
+    deleted = sb.call("purge_sample_runs", {"p_keep_latest": keep_latest}) or 0
+    logger.info(f"🗑️  Deleted {deleted} sample run(s)")
+    return deleted
+
+
+def compact_snapshots(sb, older_than_days: int = 30, batch_size: int = 100) -> Dict[str, Any]:
+    """Move raw_text of snapshots older than the cutoff into snapshot_blobs."""
+    before = (datetime.now(timezone.utc) - timedelta(days=older_than_days)).isoformat()
+    packed = 0
+    raw_bytes = 0
+    stored_bytes = 0
+    while True:
+        batch = sb.get_inline_snapshots(before, batch_size)
+        if not batch:
+            break
+        for snapshot in batch:
+            blob = encode_blob(snapshot["raw_text"])
+            sb.attach_snapshot_blob(snapshot, blob)
+            packed += 1
+            raw_bytes += blob.raw_bytes
+            stored_bytes += blob.stored_bytes
+        logger.info(f"📦 Packed {packed} snapshot(s) so far")
+
+    orphans = sb.call("gc_snapshot_blobs") or 0
+    result = {
+        "snapshots_packed": packed,
+        "raw_bytes": raw_bytes,
+        "compressed_bytes": stored_bytes,
+        "orphan_blobs_deleted": orphans,
+    }
+    logger.info(f"✅ Compaction finished: {result}")
+    return result
+
+
+def drop_partitions(sb, before: str) -> list:
+    """Drop monthly history partitions that end on or before `before` (YYYY-MM-DD)."""
+    dropped = sb.call("drop_history_partitions", {"p_before": before}) or []
+    for name in dropped:
+        logger.info(f"🗑️  Dropped partition {name}")
+    return dropped
+
+
+def ensure_partitions(sb, months_ahead: int = 2) -> int:
+    created = sb.call("ensure_history_partitions", {"p_months_ahead": months_ahead}) or 0
+    logger.info(f"🗓️  Created {created} partition(s)")
+    return created
+
+
+def main():
+    """CLI entry point."""
+    parser = argparse.ArgumentParser(description="Retention and compaction for rate history")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("purge-samples", help="Delete all sample runs and their data")
+    p.add_argument("--keep-latest", action="store_true", help="Keep the currently published sample run")
+
+    p = sub.add_parser("compact-snapshots", help="Pack old inline snapshots into compressed blobs")
+    p.add_argument("--older-than-days", type=int, default=30)
+    p.add_argument("--batch-size", type=int, default=100)
+
+    p = sub.add_parser("drop-partitions", help="Drop whole months of offer/snapshot history")
+    p.add_argument("--before", required=True, help="Drop months ending on or before this date (YYYY-MM-DD)")
+
+    p = sub.add_parser("ensure-partitions", help="Create upcoming monthly partitions")
+    p.add_argument("--months-ahead", type=int, default=2)
+
+    args = parser.parse_args()
+
+    try:
+        sb = make_writer(load_config(args.sources))
+        if args.command == "purge-samples":
+            purge_sample_runs(sb, keep_latest=args.keep_latest)
+        elif args.command == "compact-snapshots":
+            compact_snapshots(sb, older_than_days=args.older_than_days, batch_size=args.batch_size)
+        elif args.command == "drop-partitions":
+            drop_partitions(sb, args.before)
+        elif args.command == "ensure-partitions":
+            ensure_partitions(sb, months_ahead=args.months_ahead)
+    except Exception as e:
+        logger.exception(f"Fatal error: {e}")
+        sys.exit(3)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Daily rate history rollups (migration 009).
+
+After each successful real run the collector calls ``rollup_run``, which
+folds only that run into ``rate_history_daily`` (per lender/category/day)
+and ``market_history_daily`` (per category/day). Trend queries then read a
+few hundred pre-aggregated rows instead of raw offers.
+
+    python -m mortgage_tracker.rollup trend "30Y fixed" --days 90
+    python -m mortgage_tracker.rollup trend "30Y fixed" --lender "DCU (Digital Federal Credit Union)"
+"""
+import argparse
+import json
+import logging
+import sys
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("mortgage_tracker.rollup")
+
+
+def rollup_run(sb, run_id: int) -> int:
+    """Fold a finished run into the daily history tables. Returns lender rows written."""
+    rows = sb.call("rollup_run", {"p_run_id": run_id}) or 0
+    logger.info(f"📈 Rolled up run {run_id} into {rows} lender/category row(s)")
+    return rows
+
+
+def rate_trend(sb, category: str, days: int = 90, lender: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Daily history for a category, oldest first.
+
+    Without ``lender`` the rows are market aggregates (min/median/mean of the
+    lenders' best rates that day); with it, that lender's own daily stats.
+    """
+    return sb.call("get_rate_trend", {"p_category": category, "p_days": days, "p_lender": lender}) or []
+
+
+def lender_vs_market(sb, lender: str, category: str, days: int = 90) -> List[Dict[str, Any]]:
+    """Per day: the lender's best rate next to the market median and the spread."""
+    market = {row["day"]: row for row in rate_trend(sb, category, days)}
+    result = []
+    for row in rate_trend(sb, category, days, lender=lender):
+        m = market.get(row["day"])
+        market_median = _num(m["median_rate"]) if m else None
+        lender_rate = _num(row["min_rate"])
+        result.append({
+            "day": row["day"],
+            "lender_rate": lender_rate,
+            "market_median_rate": market_median,
+            "spread": round(lender_rate - market_median, 4)
+            if lender_rate is not None and market_median is not None else None,
+            "market_lenders": m["lenders"] if m else None,
+        })
+    return result
+
+
+def _num(v) -> Optional[float]:
+    return float(v) if v is not None else None
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Query daily rate history rollups")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("trend", help="Print the daily trend for a category")
+    p.add_argument("category")
+    p.add_argument("--lender", default=None)
+    p.add_argument("--days", type=int, default=90)
+
+    p = sub.add_parser("rollup", help="(Re)build the rollup rows for one run")
+    p.add_argument("run_id", type=int)
+
+    args = parser.parse_args()
+    sb = make_writer(load_config(args.sources))
+
+    if args.command == "trend":
+        rows = rate_trend(sb, args.category, args.days, lender=args.lender)
+        json.dump(rows, sys.stdout, indent=2, default=str)
+        sys.stdout.write("\n")
+    elif args.command == "rollup":
+        rollup_run(sb, args.run_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Cached read service for the latest published rates.
+
+The rates page used to call ``get_latest_rates_with_fallback`` on every
+visit although the data changes about once a day. This service keeps the
+published offers in an ``OfferIndex`` and every rendered response in
+memory, so requests never reach the database. Once per
+``--check-interval`` seconds a single request looks at
+``get_latest_run_summary``; when a new run has been published the index is
+brought up to date and the response cache is dropped.
+
+Responses carry a strong ETag (a hash of the body; the gzipped variant
+gets its own, with a ``-gz`` suffix) and honour If-None-Match, so
+revalidating clients get a bodyless 304.
+
+    GET /rates?category=30Y%20fixed&sort=apr&limit=10
+    GET /rates?state=MA&lender_name=...&lock_days=30
+    GET /summary      # per-category market summary (migration 013)
+    GET /healthz
+
+    python -m mortgage_tracker.serve --include-sample --port 8080
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .offer_index import FACETS, OfferIndex, refresh_index
+from .sketch import get_market_summary
+
+logger = logging.getLogger("mortgage_tracker.serve")
+
+CHECK_INTERVAL = 60.0
+MAX_RESPONSES = 512
+GZIP_MIN_BYTES = 1024
+NUMERIC_FACETS = ("lock_days",)
+
+
+class Response:
+    """A rendered JSON body with its ETags and (lazily) gzipped form."""
+
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.etag = f'"{digest}"'
+        # A strong validator names one representation: the gzipped bytes differ
+        self.gzip_etag = f'"{digest}-gz"'
+        self._gzipped: Optional[bytes] = None
+
+    @property
+    def gzipped(self) -> bytes:
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzipped
+
+
+def _render(status: int, payload: Any) -> Response:
+    return Response(status, json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8"))
+
+
+class RatesCache:
+    """
+    The published offers plus rendered responses, refreshed when a new run
+    is published. Thread-safe; at most one thread talks to the database.
+    """
+
+    def __init__(self, sb, include_sample: bool = False, check_interval: float = CHECK_INTERVAL,
+                 max_responses: int = MAX_RESPONSES):
+        self.sb = sb
+        self.include_sample = include_sample
+        self.check_interval = check_interval
+        self.max_responses = max_responses
+        self.index = OfferIndex()
+        self.run: Optional[Dict[str, Any]] = None
+        self.market: Optional[Dict[str, Any]] = None
+        self._responses: "OrderedDict[Tuple, Response]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._checked_at = 0.0
+
+    def _run_key(self, run: Optional[Dict[str, Any]]) -> Optional[Tuple]:
+        return (run["run_id"], run["data_source"]) if run else None
+
+    def check(self, force: bool = False) -> bool:
+        """Pick up a newly published run. Returns True when the cache was invalidated."""
+        if not force and time.monotonic() - self._checked_at < self.check_interval:
+            return False
+        if not self._check_lock.acquire(blocking=force):
+            return False  # another thread is checking; keep serving what we have
+        try:
+            self._checked_at = time.monotonic()
+            rows = self.sb.call("get_latest_run_summary", {"include_sample": self.include_sample}) or []
+            run = rows[0] if rows else None
+            if self._run_key(run) == self._run_key(self.run) and not force:
+                return False
+            market = get_market_summary(self.sb, self.include_sample) if run else None
+            with self._lock:
+                if run:
+                    refresh_index(self.index, self.sb, self.include_sample)
+                else:
+                    self.index.apply_offers([])
+                self.run, self.market = run, market
+                self._responses.clear()
+            logger.info(f"🔄 Serving run {run['run_id'] if run else None} ({len(self.index)} offers)")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️  Could not check for a new run, serving cached data: {e}")
+            return False
+        finally:
+            self._check_lock.release()
+
+    def get(self, path: str, params: Dict[str, List[str]]) -> Response:
+        self.check()
+        key = (path, tuple(sorted((k, tuple(v)) for k, v in params.items())))
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None:
+                self._responses.move_to_end(key)
+                return cached
+            response = self._build(path, params)
+            if response.status == 200:
+                self._responses[key] = response
+                if len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+            return response
+
+    def _meta(self) -> Dict[str, Any]:
+        run = self.run or {}
+        return {
+            "run_id": run.get("run_id"),
+            "data_source": run.get("data_source"),
+            "is_fallback": run.get("is_fallback", False),
+            "distinct_lenders": run.get("distinct_lenders", 0),
+            "last_updated": run.get("last_updated"),
+        }
+
+    def _build(self, path: str, params: Dict[str, List[str]]) -> Response:
+        if path == "/healthz":
+            return _render(200, {"ok": True, **self._meta(), "offers": len(self.index)})
+        if path == "/summary":
+            return _render(200, {**self._meta(), "market": (self.market or {}).get("market", {})})
+        if path != "/rates":
+            return _render(404, {"error": "not found"})
+
+        filters: Dict[str, Any] = {}
+        for f in FACETS:
+            if f in params:
+                values = params[f]
+                try:
+                    filters[f] = [int(v) for v in values] if f in NUMERIC_FACETS else values
+                except ValueError:
+                    return _render(400, {"error": f"{f} must be an integer"})
+        try:
+            sort = params.get("sort", ["apr"])[0] or None
+            limit = int(params["limit"][0]) if "limit" in params else None
+            offset = int(params.get("offset", ["0"])[0])
+            offers = self.index.query(sort=sort, limit=limit, offset=offset, **filters)
+        except ValueError as e:
+            return _render(400, {"error": str(e)})
+        return _render(200, {**self._meta(), "count": self.index.count(**filters), "offers": offers})
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+def make_handler(cache: RatesCache):
+    class Handler(BaseHTTPRequestHandler):
+        server_version = "mortgage-tracker"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            response = cache.get(url.path.rstrip("/") or "/", parse_qs(url.query))
+            gzipped = len(response.body) >= GZIP_MIN_BYTES and "gzip" in (self.headers.get("Accept-Encoding") or "")
+            etag = response.gzip_etag if gzipped else response.etag
+            not_modified = response.status == 200 and _etag_matches(self.headers.get("If-None-Match"), etag)
+            self.send_response(304 if not_modified else response.status)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"public, max-age={int(cache.check_interval)}")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Vary", "Accept-Encoding")
+            if not_modified:
+                self.end_headers()
+                return
+            body = response.body
+            if gzipped:
+                body = response.gzipped
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Serve the latest rates as cached JSON")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--include-sample", action="store_true", help="Fall back to sample data")
+    parser.add_argument("--check-interval", type=float, default=CHECK_INTERVAL,
+                        help="Seconds between checks for a newly published run")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    cache = RatesCache(make_writer(load_config(args.sources)), args.include_sample, args.check_interval)
+    cache.check(force=True)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(cache))
+    logger.info(f"🌐 Serving latest rates on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
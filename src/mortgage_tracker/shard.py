@@ -0,0 +1,93 @@
+"""
+Static sharding of one collector run across processes or machines
+(migration 017).
+
+Sources are split into N slices by a stable hash, so every runner agrees
+on which slice it owns without talking to the others and a source stays
+in the same slice from run to run. The key is the source's rate_url (its
+id or name when it has none), which keeps sources sharing a page in one
+shard where their fetch is still coalesced.
+
+A sharded run has three steps; the shards can run anywhere in between:
+
+    RUN_ID=$(python -m mortgage_tracker.main --create-run)
+    python -m mortgage_tracker.main --run-id $RUN_ID --shard 0/4   # ... 3/4
+    python -m mortgage_tracker.main --merge-run $RUN_ID
+
+Each shard writes its snapshots and offers under the shared run id and
+records its own stats in ``run_shards``. The merge adds the shard stats
+up, merges their market sketches, sets the run's final status (a missing
+shard makes the run partial at best) and then publishes the run exactly
+as a single-process run would.
+"""
+import hashlib
+from typing import Any, Dict, Iterable, List, Tuple
+
+from .config import Source
+from .health import merge_health
+from .sketch import merge_sketches
+
+# CollectorStats fields that add up across shards, and the lists that are
+# concatenated (capped as CollectorStats.to_dict caps them)
+SUMMED_STATS = (
+    "sources_total",
+    "sources_enabled",
+    "sources_success",
+    "sources_failed",
+    "sources_skipped",
+    "offers_inserted",
+    "offers_unchanged",
+    "apr_flagged",
+    "offers_quarantined",
+    "fetches",
+    "fetches_coalesced",
+)
+LISTED_STATS = (("parse_errors", 10), ("apr_flags", 10), ("quarantined", 20))
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """``"i/N"`` -> (i, N) with 0 <= i < N."""
+    index, sep, count = spec.partition("/")
+    try:
+        if not sep:
+            raise ValueError
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard must look like i/N, got {spec!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+
+def shard_key(src: Source) -> str:
+    return src.rate_url or src.id or src.name
+
+
+def shard_index(src: Source, count: int) -> int:
+    """The shard a source belongs to; stable across processes and Python versions."""
+    digest = hashlib.blake2b(shard_key(src).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+def shard_sources(sources: Iterable[Source], index: int, count: int) -> List[Source]:
+    return [s for s in sources if shard_index(s, count) == index]
+
+
+def merge_shard_stats(shard_stats: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Combine the ``stats_json`` of a run's shards into the run's stats."""
+    shard_stats = list(shard_stats)
+    merged: Dict[str, Any] = {
+        key: sum(int(s.get(key) or 0) for s in shard_stats) for key in SUMMED_STATS
+    }
+    for key, limit in LISTED_STATS:
+        merged[key] = [item for s in shard_stats for item in s.get(key) or []][:limit]
+    market = merge_sketches(s["market_sketch"] for s in shard_stats if s.get("market_sketch"))
+    merged["market"] = market.summary()
+    merged["market_sketch"] = market.to_dict()
+    selection = next((s["selection"] for s in shard_stats if s.get("selection")), None)
+    if selection:
+        merged["selection"] = selection
+    health = merge_health(s.get("health") for s in shard_stats)
+    if health:
+        merged["health"] = health
+    return merged
@@ -0,0 +1,212 @@
+"""
+Per-category market summaries built from mergeable sketches (migration 013).
+
+Each run folds its offers into one ``MarketSketch``: per category, a
+histogram of rates and APRs quantized to 0.001 percentage points (the
+precision lenders publish at) plus the set of lenders seen. Merging two
+sketches adds bin counts and unions lender sets, so a run split across
+workers or shards combines to exactly the same summary as one process.
+
+``summary()`` reduces a sketch to the small dict stored on
+``runs.stats_json["market"]`` and served by ``get_market_summary``:
+
+    {"30Y fixed": {"offers": 41, "lenders": 17,
+                   "rate": {"p10": 5.875, "median": 6.25, "p90": 6.75},
+                   "apr": {"p10": 5.96, "median": 6.39, "p90": 6.9}}}
+
+    python -m mortgage_tracker.sketch                   # published real run
+    python -m mortgage_tracker.sketch --include-sample  # fall back to sample data
+"""
+import argparse
+import json
+import logging
+import math
+import sys
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from .rank import safe_float
+
+logger = logging.getLogger("mortgage_tracker.sketch")
+
+RESOLUTION = 0.001
+QUANTILES = (("p10", 0.10), ("median", 0.50), ("p90", 0.90))
+
+
+class QuantileSketch:
+    """Histogram of values quantized to ``RESOLUTION``; merges exactly."""
+
+    def __init__(self, bins: Optional[Dict[int, int]] = None):
+        self.bins: Counter = Counter(bins or {})
+
+    @property
+    def count(self) -> int:
+        return sum(self.bins.values())
+
+    def add(self, value) -> None:
+        x = safe_float(value, None)
+        if x is not None:
+            self.bins[round(x / RESOLUTION)] += 1
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        self.bins.update(other.bins)
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile: the smallest value with at least ``q`` of the mass at or below it."""
+        total = self.count
+        if not total:
+            return None
+        rank = max(1, math.ceil(q * total))
+        seen = 0
+        for b in sorted(self.bins):
+            seen += self.bins[b]
+            if seen >= rank:
+                return round(b * RESOLUTION, 3)
+        return None
+
+    def to_list(self) -> List[List[int]]:
+        return [[b, c] for b, c in sorted(self.bins.items())]
+
+    @classmethod
+    def from_list(cls, pairs: Iterable[Iterable[int]]) -> "QuantileSketch":
+        return cls({int(b): int(c) for b, c in pairs})
+
+
+class CategorySketch:
+    """Rate and APR sketches plus the lenders seen for one category."""
+
+    def __init__(self):
+        self.offers = 0
+        self.rate = QuantileSketch()
+        self.apr = QuantileSketch()
+        self.lenders = set()
+
+    def add(self, offer: Dict[str, Any]) -> None:
+        self.offers += 1
+        self.rate.add(offer.get("rate"))
+        self.apr.add(offer.get("apr"))
+        if offer.get("lender_name"):
+            self.lenders.add(offer["lender_name"])
+
+    def merge(self, other: "CategorySketch") -> "CategorySketch":
+        self.offers += other.offers
+        self.rate.merge(other.rate)
+        self.apr.merge(other.apr)
+        self.lenders |= other.lenders
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "offers": self.offers,
+            "lenders": len(self.lenders),
+            "rate": {name: self.rate.quantile(q) for name, q in QUANTILES},
+            "apr": {name: self.apr.quantile(q) for name, q in QUANTILES},
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offers": self.offers,
+            "rate": self.rate.to_list(),
+            "apr": self.apr.to_list(),
+            "lenders": sorted(self.lenders),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CategorySketch":
+        sketch = cls()
+        sketch.offers = int(data.get("offers") or 0)
+        sketch.rate = QuantileSketch.from_list(data.get("rate") or [])
+        sketch.apr = QuantileSketch.from_list(data.get("apr") or [])
+        sketch.lenders = set(data.get("lenders") or [])
+        return sketch
+
+
+class MarketSketch:
+    """
+    Per-category sketches of a run's offers.
+
+    ``to_dict``/``from_dict`` round-trip the full sketch (JSON-safe), so
+    partial sketches can be shipped between processes and merged.
+    """
+
+    def __init__(self):
+        self.categories: Dict[str, CategorySketch] = {}
+
+    def add(self, offer: Dict[str, Any]) -> None:
+        category = offer.get("category")
+        if category is None:
+            return
+        sketch = self.categories.get(category)
+        if sketch is None:
+            sketch = self.categories[category] = CategorySketch()
+        sketch.add(offer)
+
+    def add_many(self, offers: Iterable[Dict[str, Any]]) -> None:
+        for offer in offers:
+            self.add(offer)
+
+    def merge(self, other: "MarketSketch") -> "MarketSketch":
+        for category, sketch in other.categories.items():
+            mine = self.categories.get(category)
+            if mine is None:
+                mine = self.categories[category] = CategorySketch()
+            mine.merge(sketch)
+        return self
+
+    @property
+    def lenders(self) -> int:
+        """Distinct lenders across all categories."""
+        names = set()
+        for sketch in self.categories.values():
+            names |= sketch.lenders
+        return len(names)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        return {category: self.categories[category].summary() for category in sorted(self.categories)}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"resolution": RESOLUTION, "categories": {c: s.to_dict() for c, s in self.categories.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MarketSketch":
+        if data.get("resolution", RESOLUTION) != RESOLUTION:
+            raise ValueError(f"Sketch resolution {data.get('resolution')} != {RESOLUTION}")
+        market = cls()
+        for category, sketch in (data.get("categories") or {}).items():
+            market.categories[category] = CategorySketch.from_dict(sketch)
+        return market
+
+
+def merge_sketches(sketches: Iterable[Dict[str, Any]]) -> MarketSketch:
+    """Combine serialized sketches (e.g. ``stats_json["market_sketch"]`` of several shards)."""
+    market = MarketSketch()
+    for data in sketches:
+        market.merge(MarketSketch.from_dict(data))
+    return market
+
+
+def get_market_summary(sb, include_sample: bool = False) -> Optional[Dict[str, Any]]:
+    """Precomputed summary of the published real run (or the sample run, as a fallback)."""
+    rows = sb.call("get_market_summary", {"include_sample": include_sample}) or []
+    return rows[0] if rows else None
+
+
+def main():
+    """CLI entry point."""
+    from .config import load_config
+    from .supabase_client import make_writer
+
+    parser = argparse.ArgumentParser(description="Print the market summary of the published run")
+    parser.add_argument("--sources", default="sources.yaml", help="Path to sources.yaml file")
+    parser.add_argument("--include-sample", action="store_true", help="Fall back to the sample run")
+    args = parser.parse_args()
+
+    sb = make_writer(load_config(args.sources))
+    result = get_market_summary(sb, args.include_sample)
+    json.dump(result, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import logging
+import os
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from supabase import Client, create_client
 
+from .config import Source
+
 logger = logging.getLogger("mortgage_tracker.supabase")
 
 
@@ -11,6 +14,10 @@ class SupabaseWriter:
     def __init__(self, url: str, service_key: str):
         self.client: Client = create_client(url, service_key)
 
+    def close(self) -> None:
+        # The PostgREST client keeps an HTTP connection pool open
+        self.client.postgrest.session.close()
+
     def create_run(self, status: str = "started", run_type: str = "real") -> int:
         data = {
             "status": status,
@@ -21,7 +28,8 @@ class SupabaseWriter:
         logger.info("run_created", extra={"run_id": run_id, "run_type": run_type})
         return run_id
 
-    def finish_run(self, run_id: int, status: str, stats: Optional[Dict[str, Any]] = None, error_text: Optional[str] = None) -> None:
+    def finish_run(self, run_id: int, status: str, stats: Optional[Dict[str, Any]] = None,
+                   error_text: Optional[str] = None, publish: bool = True) -> None:
         update = {
             "finished_at": datetime.now(timezone.utc).isoformat(),
             "status": status,
@@ -29,31 +37,33 @@ class SupabaseWriter:
             "error_text": error_text,
         }
         self.client.table("runs").update(update).eq("id", run_id).execute()
+        if publish and status in ("success", "partial"):
+            # Republish latest_rates / latest_run_summary from this run (migration 007)
+            self.client.rpc("refresh_latest_rates", {"p_run_id": run_id}).execute()
         logger.info("run_finished", extra={"run_id": run_id, "status": status})
 
-    def upsert_source(self, src: Dict[str, Any]) -> int:
+    def finish_shard(self, run_id: int, shard: int, shard_count: int, status: str,
+                     stats: Optional[Dict[str, Any]] = None) -> None:
+        # Rows are already written; record the shard's outcome (migration 017)
+        self.call("save_run_shard", {
+            "p_run_id": run_id,
+            "p_shard": shard,
+            "p_shard_count": shard_count,
+            "p_status": status,
+            "p_stats": stats or {},
+        })
+        logger.info("shard_finished", extra={"run_id": run_id, "shard": shard, "status": status})
+
+    def upsert_source(self, src: Source) -> int:
         # Insert or ensure exists by name
-        # Use parser_key as method for backward compatibility
-        parser_key = src.get("parser_key")
-        method_val = src.get("method")
-        method = parser_key or method_val or "unknown"
-        
-        data = {
-            "name": src.get("name"),
-            "org_type": src.get("org_type"),
-            "homepage_url": src.get("homepage_url"),
-            "rate_url": src.get("rate_url") or src.get("url"),
-            "method": method,
-            "enabled": bool(src.get("enabled", True)),
-            "notes": src.get("notes"),
-        }
+        data = src.row()
         
         # First try to find existing source
-        existing = self.client.table("sources").select("id").eq("name", src.get("name")).execute()
+        existing = self.client.table("sources").select("id").eq("name", src.name).execute()
         
         if existing.data:
             # Update existing
-            res = self.client.table("sources").update(data).eq("name", src.get("name")).execute()
+            res = self.client.table("sources").update(data).eq("name", src.name).execute()
         else:
             # Insert new
             res = self.client.table("sources").insert(data).execute()
@@ -68,3 +78,101 @@ class SupabaseWriter:
         if not offers:
             return
         self.client.table("offers_normalized").insert(offers).execute()
+
+    def get_snapshot(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        res = self.client.table("rate_snapshots").select("*").eq("id", snapshot_id).execute()
+        return res.data[0] if res.data else None
+
+    def put_blob(self, blob) -> None:
+        # Content-addressed: skip the upload entirely when the bytes are already stored
+        existing = self.client.table("snapshot_blobs").select("sha256").eq("sha256", blob.sha256).execute()
+        if existing.data:
+            return
+        self.client.table("snapshot_blobs").upsert(
+            {
+                "sha256": blob.sha256,
+                "codec": blob.codec,
+                "raw_bytes": blob.raw_bytes,
+                "stored_bytes": blob.stored_bytes,
+                "data": "\\x" + blob.data.hex(),
+            },
+            on_conflict="sha256",
+            ignore_duplicates=True,
+        ).execute()
+
+    def get_blob(self, sha256: str) -> Optional[Tuple[str, bytes]]:
+        res = self.client.table("snapshot_blobs").select("codec, data").eq("sha256", sha256).execute()
+        if not res.data:
+            return None
+        row = res.data[0]
+        # PostgREST returns bytea as a \x-prefixed hex string
+        return row["codec"], bytes.fromhex(row["data"][2:])
+
+    def call(self, fn: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Invoke a database function through PostgREST RPC."""
+        return self.client.rpc(fn, params or {}).execute().data
+
+    def get_inline_snapshots(self, before: str, limit: int) -> List[Dict[str, Any]]:
+        """Snapshots created before `before` that still carry raw_text inline."""
+        res = (
+            self.client.table("rate_snapshots")
+            .select("id, created_at, raw_text")
+            .lt("created_at", before)
+            .not_.is_("raw_text", "null")
+            .order("id")
+            .limit(limit)
+            .execute()
+        )
+        return res.data
+
+    def attach_snapshot_blob(self, snapshot: Dict[str, Any], blob) -> None:
+        self.put_blob(blob)
+        self.client.table("rate_snapshots").update(
+            {"raw_text": None, "raw_sha256": blob.sha256}
+        ).eq("id", snapshot["id"]).eq("created_at", snapshot["created_at"]).execute()
+
+    def get_runs(self, run_type: str = "real", statuses=("success", "partial"), since: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Finished runs of a type, oldest first."""
+        def query():
+            q = (
+                self.client.table("runs")
+                .select("id, run_type, status, created_at, finished_at, stats_json")
+                .eq("run_type", run_type)
+                .in_("status", list(statuses))
+            )
+            if since:
+                q = q.gte("created_at", since)
+            return q.order("created_at")
+        return self._select_all(query)
+
+    def get_run_offers(self, run_id: int) -> List[Dict[str, Any]]:
+        # Reconstructs change-only runs too (migration 011)
+        return self._select_all(
+            lambda: self.client.rpc("get_run_offers", {"p_run_id": run_id}).order("id")
+        )
+
+    def insert_run_source(self, row: Dict[str, Any]) -> None:
+        self.client.table("run_sources").insert(row).execute()
+
+    def get_source_offer_state(self, source_id: int) -> List[Dict[str, Any]]:
+        return self.call("get_source_offer_state", {"p_source_id": source_id}) or []
+
+    def _select_all(self, query, page_size: int = 1000) -> List[Dict[str, Any]]:
+        # PostgREST caps responses, so page through with range()
+        rows: List[Dict[str, Any]] = []
+        start = 0
+        while True:
+            res = query().range(start, start + page_size - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < page_size:
+                return rows
+            start += page_size
+
+
+def make_writer(cfg):
+    """Pick the run writer: direct Postgres COPY with WRITER=postgres, REST otherwise."""
+    if cfg.writer == "postgres":
+        from .postgres_writer import PostgresWriter
+        logger.info("writer_selected", extra={"writer": "postgres_copy"})
+        return PostgresWriter(cfg.database_url, copy_format=os.environ.get("COPY_FORMAT", "binary"))
+    return SupabaseWriter(cfg.supabase_url, cfg.supabase_service_role_key)
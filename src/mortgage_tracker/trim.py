@@ -0,0 +1,104 @@
+"""
+Snapshot trimming: keep only the rate-bearing parts of a page.
+
+Parsers only look at ``<table>`` elements (and embedded JSON for script-driven
+pages), so with ``SNAPSHOT_MODE=trimmed`` the collector stores just those
+regions instead of the whole page. Provenance is kept alongside: the sha256
+and byte length of the full page plus the ``[start, end)`` byte offsets of
+every region that was kept.
+
+A trimmed snapshot is only used when the source's parser produces exactly the
+same offers from it as from the full page; otherwise the full page is stored.
+Pages that parsed to no offers are never trimmed: an empty result matches
+any trim, and those pages are the ones to re-parse once the parser is fixed.
+"""
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger("mortgage_tracker.trim")
+
+_TABLE_TAG = re.compile(r"<(/?)table\b[^>]*>", re.IGNORECASE)
+_JSON_SCRIPT = re.compile(
+    r"<script\b[^>]*type\s*=\s*[\"']application/(?:ld\+)?json[\"'][^>]*>.*?</script\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def find_regions(text: str) -> List[Tuple[int, int]]:
+    """Return sorted, non-overlapping (start, end) character spans worth keeping."""
+    spans: List[Tuple[int, int]] = []
+
+    # Outermost tables only; nested tables come along with their parent
+    depth = 0
+    start = 0
+    for m in _TABLE_TAG.finditer(text):
+        if not m.group(1):
+            if depth == 0:
+                start = m.start()
+            depth += 1
+        elif depth > 0:
+            depth -= 1
+            if depth == 0:
+                spans.append((start, m.end()))
+    if depth > 0:
+        spans.append((start, len(text)))
+
+    spans.extend((m.start(), m.end()) for m in _JSON_SCRIPT.finditer(text))
+
+    merged: List[Tuple[int, int]] = []
+    for s, e in sorted(spans):
+        if merged and s <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+        else:
+            merged.append((s, e))
+    return merged
+
+
+def trim_page(text: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Cut a page down to its tables and embedded JSON.
+
+    Returns:
+        (trimmed_text, provenance) where provenance holds page_sha256,
+        page_bytes and trim_regions (byte offsets into the original page).
+    """
+    spans = find_regions(text)
+
+    byte_regions: List[List[int]] = []
+    char_pos = 0
+    byte_pos = 0
+    for s, e in spans:
+        byte_pos += len(text[char_pos:s].encode("utf-8"))
+        region_bytes = len(text[s:e].encode("utf-8"))
+        byte_regions.append([byte_pos, byte_pos + region_bytes])
+        byte_pos += region_bytes
+        char_pos = e
+
+    raw = text.encode("utf-8")
+    provenance = {
+        "page_sha256": hashlib.sha256(raw).hexdigest(),
+        "page_bytes": len(raw),
+        "trim_regions": byte_regions,
+    }
+    return "\n".join(text[s:e] for s, e in spans), provenance
+
+
+def trim_snapshot(snapshot: Dict[str, Any], parser, offers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Replace a snapshot's raw_text with its trimmed form if the parser agrees."""
+    text = snapshot.get("raw_text")
+    if not text or not offers:
+        return snapshot
+    trimmed, provenance = trim_page(text)
+    try:
+        reparsed = parser.parse(text=trimmed, js=snapshot.get("raw_json"))
+    except Exception as e:
+        logger.warning(f"trim_rejected: parser failed on trimmed page: {e}")
+        return snapshot
+    if reparsed != offers:
+        logger.info("trim_rejected: trimmed page parses differently, keeping full page")
+        return snapshot
+    snapshot["raw_text"] = trimmed
+    snapshot.update(provenance)
+    return snapshot
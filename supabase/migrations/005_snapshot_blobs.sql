@@ -0,0 +1,32 @@
+-- Migration 005: Content-addressed, compressed snapshot storage
+-- Raw pages are stored once per distinct content (keyed by sha256 of the
+-- uncompressed bytes) and rate_snapshots points at them instead of carrying
+-- its own copy in raw_text.
+
+begin;
+
+create table if not exists public.snapshot_blobs (
+  sha256 text primary key,
+  codec text not null check (codec in ('zstd','gzip')),
+  raw_bytes integer not null,
+  stored_bytes integer not null,
+  data bytea not null,
+  created_at timestamptz not null default now()
+);
+
+comment on table public.snapshot_blobs is
+  'Compressed raw page bodies, deduplicated by sha256 of the uncompressed text';
+
+alter table public.rate_snapshots
+  add column if not exists raw_sha256 text references public.snapshot_blobs(sha256);
+
+comment on column public.rate_snapshots.raw_sha256 is
+  'Content hash of the raw page in snapshot_blobs; raw_text is NULL when this is set';
+
+create index if not exists idx_rate_snapshots_raw_sha256 on public.rate_snapshots(raw_sha256);
+
+-- Same rules as the other raw tables: service role only
+alter table public.snapshot_blobs enable row level security;
+revoke select on public.snapshot_blobs from anon;
+
+commit;
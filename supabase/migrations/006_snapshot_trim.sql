@@ -0,0 +1,19 @@
+-- Migration 006: Provenance for trimmed snapshots
+-- With SNAPSHOT_MODE=trimmed, raw_text holds only the tables / embedded JSON
+-- the parser needs. These columns tie it back to the page that was fetched.
+
+begin;
+
+alter table public.rate_snapshots
+  add column if not exists page_sha256 text,
+  add column if not exists page_bytes integer,
+  add column if not exists trim_regions jsonb;
+
+comment on column public.rate_snapshots.page_sha256 is
+  'sha256 of the full fetched page when raw_text was trimmed';
+comment on column public.rate_snapshots.page_bytes is
+  'Size in bytes of the full fetched page when raw_text was trimmed';
+comment on column public.rate_snapshots.trim_regions is
+  'Byte offsets [start, end) into the full page of each region kept in raw_text';
+
+commit;
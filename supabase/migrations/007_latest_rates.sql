@@ -0,0 +1,296 @@
+-- Migration 007: Materialized latest rates
+-- get_latest_rates_with_fallback used to find the latest run and de-duplicate
+-- its offers on every page view. The collector now rebuilds latest_rates and
+-- latest_run_summary once when a run finishes (refresh_latest_rates), and the
+-- RPC / view just read those tables.
+
+begin;
+
+-- =====================================================
+-- STEP 1: Tables
+-- =====================================================
+
+-- One published offer set per data_source ('real' and 'sample')
+create table if not exists public.latest_rates (
+  id bigint not null,
+  run_id bigint not null references public.runs(id) on delete cascade,
+  source_id bigint,
+  source_name text,
+  lender_name text not null,
+  category text not null,
+  rate numeric,
+  apr numeric,
+  points numeric,
+  lender_fees numeric,
+  state text,
+  loan_amount numeric,
+  ltv integer,
+  fico integer,
+  lock_days integer,
+  updated_at timestamptz,
+  data_source text not null check (data_source in ('real', 'sample')),
+  details_json jsonb,
+  primary key (data_source, id)
+);
+
+create index if not exists idx_latest_rates_order
+  on public.latest_rates(data_source, category, apr, rate);
+
+create table if not exists public.latest_run_summary (
+  data_source text primary key check (data_source in ('real', 'sample')),
+  run_id bigint not null references public.runs(id) on delete cascade,
+  run_status text not null,
+  distinct_lenders integer not null,
+  offers_total integer not null,
+  category_counts jsonb not null default '{}'::jsonb,
+  last_updated timestamptz,
+  refreshed_at timestamptz not null default now()
+);
+
+COMMENT ON TABLE public.latest_rates IS
+  'De-duplicated offers of the latest successful run per data_source, rebuilt by refresh_latest_rates()';
+COMMENT ON TABLE public.latest_run_summary IS
+  'Per data_source summary of the run published in latest_rates';
+
+alter table public.latest_rates enable row level security;
+alter table public.latest_run_summary enable row level security;
+revoke select on public.latest_rates from anon;
+revoke select on public.latest_run_summary from anon;
+
+-- =====================================================
+-- STEP 2: Rebuild function, called by the collector at finish_run
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.refresh_latest_rates(p_run_id bigint)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_run public.runs%ROWTYPE;
+  v_current_created timestamptz;
+BEGIN
+  SELECT * INTO v_run FROM public.runs WHERE id = p_run_id;
+
+  IF NOT FOUND OR v_run.status NOT IN ('success', 'partial') THEN
+    RETURN;
+  END IF;
+  -- Sample runs only count as published when fully successful (as before)
+  IF v_run.run_type = 'sample' AND v_run.status <> 'success' THEN
+    RETURN;
+  END IF;
+
+  -- Serialise concurrent refreshes of the same data_source
+  PERFORM pg_advisory_xact_lock(hashtext('refresh_latest_rates:' || v_run.run_type));
+
+  -- Never let an older run overwrite a newer one
+  SELECT r.created_at INTO v_current_created
+  FROM public.latest_run_summary s
+  JOIN public.runs r ON r.id = s.run_id
+  WHERE s.data_source = v_run.run_type;
+
+  IF v_current_created IS NOT NULL AND v_current_created > v_run.created_at THEN
+    RETURN;
+  END IF;
+
+  DELETE FROM public.latest_rates WHERE data_source = v_run.run_type;
+
+  INSERT INTO public.latest_rates
+  SELECT DISTINCT ON (o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points)
+    o.id,
+    o.run_id,
+    s.id,
+    s.name,
+    o.lender_name,
+    o.category,
+    o.rate,
+    o.apr,
+    o.points,
+    o.lender_fees,
+    o.state,
+    o.loan_amount,
+    o.ltv::integer,
+    o.fico::integer,
+    o.lock_days::integer,
+    o.created_at,
+    o.data_source,
+    o.details_json
+  FROM public.offers_normalized o
+  JOIN public.sources s ON o.source_id = s.id
+  WHERE o.run_id = p_run_id
+    AND o.data_source = v_run.run_type
+  ORDER BY o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points, o.created_at DESC;
+
+  INSERT INTO public.latest_run_summary AS sm (
+    data_source, run_id, run_status, distinct_lenders, offers_total, category_counts, last_updated, refreshed_at
+  )
+  SELECT
+    v_run.run_type,
+    p_run_id,
+    v_run.status,
+    COUNT(DISTINCT lr.lender_name)::integer,
+    COUNT(lr.id)::integer,
+    COALESCE(
+      (SELECT jsonb_object_agg(c.category, c.n)
+       FROM (SELECT category, COUNT(*) AS n FROM public.latest_rates
+             WHERE data_source = v_run.run_type GROUP BY category) c),
+      '{}'::jsonb
+    ),
+    MAX(lr.updated_at),
+    now()
+  FROM public.latest_rates lr
+  WHERE lr.data_source = v_run.run_type
+  ON CONFLICT (data_source) DO UPDATE SET
+    run_id = excluded.run_id,
+    run_status = excluded.run_status,
+    distinct_lenders = excluded.distinct_lenders,
+    offers_total = excluded.offers_total,
+    category_counts = excluded.category_counts,
+    last_updated = excluded.last_updated,
+    refreshed_at = excluded.refreshed_at;
+END;
+$$;
+
+COMMENT ON FUNCTION public.refresh_latest_rates(bigint) IS
+  'Atomically republish latest_rates / latest_run_summary from a finished run';
+
+REVOKE EXECUTE ON FUNCTION public.refresh_latest_rates(bigint) FROM public, anon;
+
+-- =====================================================
+-- STEP 3: Read paths
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.get_latest_rates_with_fallback(
+  include_sample boolean DEFAULT false
+)
+RETURNS TABLE (
+  id bigint,
+  run_id bigint,
+  source_id bigint,
+  source_name text,
+  lender_name text,
+  category text,
+  rate numeric,
+  apr numeric,
+  points numeric,
+  lender_fees numeric,
+  state text,
+  loan_amount numeric,
+  ltv integer,
+  fico integer,
+  lock_days integer,
+  updated_at timestamptz,
+  data_source text,
+  is_fallback boolean,
+  details_json jsonb
+)
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_source text;
+BEGIN
+  IF EXISTS (SELECT 1 FROM public.latest_run_summary s
+             WHERE s.data_source = 'real' AND s.distinct_lenders > 0) THEN
+    v_source := 'real';
+  ELSIF include_sample THEN
+    v_source := 'sample';
+  ELSE
+    RETURN;
+  END IF;
+
+  RETURN QUERY
+    SELECT
+      lr.id, lr.run_id, lr.source_id, lr.source_name, lr.lender_name, lr.category,
+      lr.rate, lr.apr, lr.points, lr.lender_fees, lr.state, lr.loan_amount,
+      lr.ltv, lr.fico, lr.lock_days, lr.updated_at, lr.data_source,
+      (v_source = 'sample') AS is_fallback,
+      lr.details_json
+    FROM public.latest_rates lr
+    WHERE lr.data_source = v_source
+    ORDER BY lr.category, lr.apr, lr.rate;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_latest_run_summary(
+  include_sample boolean DEFAULT false
+)
+RETURNS TABLE (
+  run_id bigint,
+  data_source text,
+  is_fallback boolean,
+  run_status text,
+  distinct_lenders integer,
+  offers_total integer,
+  category_counts jsonb,
+  last_updated timestamptz
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT s.run_id, s.data_source, s.data_source = 'sample', s.run_status,
+         s.distinct_lenders, s.offers_total, s.category_counts, s.last_updated
+  FROM public.latest_run_summary s
+  WHERE (s.data_source = 'real' AND s.distinct_lenders > 0)
+     OR (include_sample AND s.data_source = 'sample'
+         AND NOT EXISTS (SELECT 1 FROM public.latest_run_summary r
+                         WHERE r.data_source = 'real' AND r.distinct_lenders > 0))
+  LIMIT 1;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_latest_rates_with_fallback(boolean) TO anon;
+GRANT EXECUTE ON FUNCTION public.get_latest_rates_with_fallback(boolean) TO authenticated;
+GRANT EXECUTE ON FUNCTION public.get_latest_run_summary(boolean) TO anon;
+GRANT EXECUTE ON FUNCTION public.get_latest_run_summary(boolean) TO authenticated;
+
+DROP VIEW IF EXISTS public.latest_rates_view;
+
+CREATE VIEW public.latest_rates_view AS
+SELECT
+  lr.id,
+  lr.run_id,
+  lr.source_id,
+  lr.lender_name,
+  lr.category,
+  lr.rate,
+  lr.apr,
+  lr.points,
+  lr.lender_fees,
+  lr.state,
+  lr.loan_amount,
+  lr.ltv,
+  lr.fico,
+  lr.lock_days,
+  lr.updated_at,
+  lr.data_source
+FROM public.latest_rates lr
+WHERE lr.data_source = 'real'
+ORDER BY lr.category, lr.rate, lr.apr;
+
+COMMENT ON VIEW public.latest_rates_view IS
+  'Public view showing only REAL rates from the most recent successful real run';
+
+grant select on public.latest_rates_view to anon;
+
+-- =====================================================
+-- STEP 4: Publish what is already there
+-- =====================================================
+
+DO $$
+DECLARE
+  r record;
+BEGIN
+  FOR r IN
+    SELECT DISTINCT ON (run_type) id
+    FROM public.runs
+    WHERE (run_type = 'real' AND status IN ('success', 'partial'))
+       OR (run_type = 'sample' AND status = 'success')
+    ORDER BY run_type, created_at DESC
+  LOOP
+    PERFORM public.refresh_latest_rates(r.id);
+  END LOOP;
+END $$;
+
+commit;
@@ -0,0 +1,223 @@
+-- Migration 008: Monthly partitions for offer/snapshot history, composite
+-- indexes for the read paths, and retention helpers.
+--
+-- offers_normalized and rate_snapshots become RANGE partitioned on
+-- created_at with one partition per month plus a DEFAULT partition as a
+-- safety net. Old months can then be dropped as whole tables instead of
+-- row-by-row deletes, and per-run lookups only touch the month they live in.
+--
+-- Run `python -m mortgage_tracker.retention ensure-partitions` regularly
+-- (the daily workflow does) to keep future months created ahead of time.
+
+begin;
+
+-- =====================================================
+-- STEP 1: Partition maintenance
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.ensure_history_partitions(
+  p_months_ahead integer DEFAULT 2,
+  p_from date DEFAULT NULL
+)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_parent text;
+  v_month date;
+  v_next date;
+  v_last date;
+  v_name text;
+  v_created integer := 0;
+BEGIN
+  v_last := (date_trunc('month', now()) + make_interval(months => p_months_ahead))::date;
+
+  FOREACH v_parent IN ARRAY ARRAY['offers_normalized', 'rate_snapshots'] LOOP
+    IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table pt
+                   WHERE pt.partrelid = to_regclass('public.' || v_parent)) THEN
+      CONTINUE;
+    END IF;
+
+    v_month := date_trunc('month', COALESCE(p_from, now()::date))::date;
+    WHILE v_month <= v_last LOOP
+      v_next := (v_month + interval '1 month')::date;
+      v_name := format('%s_%s', v_parent, to_char(v_month, 'YYYYMM'));
+
+      IF to_regclass('public.' || v_name) IS NULL THEN
+        -- Rows for this month may have landed in the DEFAULT partition;
+        -- park them, create the partition, then route them back.
+        EXECUTE format('CREATE TEMP TABLE _partition_move (LIKE public.%I) ON COMMIT DROP', v_parent);
+        IF to_regclass('public.' || v_parent || '_default') IS NOT NULL THEN
+          EXECUTE format(
+            'WITH moved AS (DELETE FROM public.%I WHERE created_at >= %L AND created_at < %L RETURNING *)
+             INSERT INTO _partition_move SELECT * FROM moved',
+            v_parent || '_default', v_month, v_next
+          );
+        END IF;
+        EXECUTE format(
+          'CREATE TABLE public.%I PARTITION OF public.%I FOR VALUES FROM (%L) TO (%L)',
+          v_name, v_parent, v_month, v_next
+        );
+        EXECUTE format('INSERT INTO public.%I SELECT * FROM _partition_move', v_parent);
+        DROP TABLE _partition_move;
+        v_created := v_created + 1;
+      END IF;
+
+      v_month := v_next;
+    END LOOP;
+  END LOOP;
+
+  RETURN v_created;
+END;
+$$;
+
+COMMENT ON FUNCTION public.ensure_history_partitions(integer, date) IS
+  'Create monthly partitions of offers_normalized / rate_snapshots up to p_months_ahead months from now';
+
+-- =====================================================
+-- STEP 2: Convert offers_normalized and rate_snapshots
+-- =====================================================
+
+DO $$
+DECLARE
+  v_table text;
+  v_legacy text;
+  v_seq text;
+  v_first date;
+BEGIN
+  FOREACH v_table IN ARRAY ARRAY['offers_normalized', 'rate_snapshots'] LOOP
+    IF (SELECT c.relkind FROM pg_class c
+        WHERE c.oid = ('public.' || v_table)::regclass) = 'p' THEN
+      CONTINUE;  -- already partitioned
+    END IF;
+
+    v_legacy := v_table || '_legacy';
+    v_seq := pg_get_serial_sequence('public.' || v_table, 'id');
+
+    EXECUTE format('ALTER TABLE public.%I RENAME TO %I', v_table, v_legacy);
+    -- Keep the id sequence alive when the legacy table is dropped
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY NONE', v_seq);
+
+    EXECUTE format(
+      'CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING COMMENTS)
+       PARTITION BY RANGE (created_at)',
+      v_table, v_legacy
+    );
+    EXECUTE format('ALTER TABLE public.%I ADD PRIMARY KEY (id, created_at)', v_table);
+    EXECUTE format('CREATE TABLE public.%I PARTITION OF public.%I DEFAULT', v_table || '_default', v_table);
+
+    EXECUTE format('SELECT min(created_at)::date FROM public.%I', v_legacy) INTO v_first;
+    PERFORM public.ensure_history_partitions(2, COALESCE(v_first, now()::date));
+
+    EXECUTE format('INSERT INTO public.%I SELECT * FROM public.%I', v_table, v_legacy);
+    EXECUTE format('DROP TABLE public.%I', v_legacy);
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY public.%I.id', v_seq, v_table);
+
+    EXECUTE format(
+      'ALTER TABLE public.%I
+         ADD FOREIGN KEY (run_id) REFERENCES public.runs(id) ON DELETE CASCADE,
+         ADD FOREIGN KEY (source_id) REFERENCES public.sources(id) ON DELETE CASCADE',
+      v_table
+    );
+    IF v_table = 'rate_snapshots' THEN
+      ALTER TABLE public.rate_snapshots
+        ADD FOREIGN KEY (raw_sha256) REFERENCES public.snapshot_blobs(sha256);
+    END IF;
+
+    EXECUTE format('ALTER TABLE public.%I ENABLE ROW LEVEL SECURITY', v_table);
+    EXECUTE format('REVOKE SELECT ON public.%I FROM anon', v_table);
+  END LOOP;
+END $$;
+
+-- =====================================================
+-- STEP 3: Indexes matching the read paths
+-- =====================================================
+
+-- refresh_latest_rates / per-run lookups: WHERE run_id = ? AND data_source = ?
+create index if not exists idx_offers_run_data_source on public.offers_normalized(run_id, data_source);
+create index if not exists idx_offers_source_created on public.offers_normalized(source_id, created_at desc);
+create index if not exists idx_offers_category_updated on public.offers_normalized(category, updated_at desc);
+
+create index if not exists idx_rate_snapshots_run on public.rate_snapshots(run_id);
+create index if not exists idx_rate_snapshots_source_created on public.rate_snapshots(source_id, created_at desc);
+create index if not exists idx_rate_snapshots_raw_sha256 on public.rate_snapshots(raw_sha256);
+-- Dropped with the legacy table (001_rates.sql); snapshots are still listed by fetch time
+create index if not exists idx_rate_snapshots_fetched_at on public.rate_snapshots(fetched_at desc);
+
+-- "latest successful run of a type": WHERE run_type = ? AND status IN (...) ORDER BY created_at DESC
+create index if not exists idx_runs_type_status_created on public.runs(run_type, status, created_at desc);
+
+-- =====================================================
+-- STEP 4: Retention helpers (service role only)
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.purge_sample_runs(p_keep_latest boolean DEFAULT false)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_deleted integer;
+BEGIN
+  -- Offers, snapshots and published rows go with the run (ON DELETE CASCADE)
+  DELETE FROM public.runs r
+  WHERE r.run_type = 'sample'
+    AND (NOT p_keep_latest OR r.id IS DISTINCT FROM (
+      SELECT s.run_id FROM public.latest_run_summary s WHERE s.data_source = 'sample'
+    ));
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.drop_history_partitions(p_before date)
+RETURNS text[]
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_part record;
+  v_dropped text[] := '{}';
+BEGIN
+  FOR v_part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    JOIN pg_namespace n ON n.oid = p.relnamespace
+    WHERE n.nspname = 'public'
+      AND p.relname IN ('offers_normalized', 'rate_snapshots')
+      AND c.relname ~ '_[0-9]{6}$'
+      -- the partition's month ends on or before p_before
+      AND (to_date(right(c.relname, 6), 'YYYYMM') + interval '1 month')::date <= p_before
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('DROP TABLE public.%I', v_part.relname);
+    v_dropped := v_dropped || v_part.relname::text;
+  END LOOP;
+  RETURN v_dropped;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.gc_snapshot_blobs()
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_deleted integer;
+BEGIN
+  DELETE FROM public.snapshot_blobs b
+  WHERE NOT EXISTS (SELECT 1 FROM public.rate_snapshots s WHERE s.raw_sha256 = b.sha256);
+  GET DIAGNOSTICS v_deleted = ROW_COUNT;
+  RETURN v_deleted;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.ensure_history_partitions(integer, date) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.purge_sample_runs(boolean) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.drop_history_partitions(date) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.gc_snapshot_blobs() FROM public, anon;
+
+commit;
@@ -0,0 +1,220 @@
+-- Migration 009: Daily rate history rollups
+-- Trend questions ("30Y fixed over the last 90 days", "lender vs market")
+-- used to scan offers_normalized across many runs. The collector now calls
+-- rollup_run(run_id) after each successful real run, which folds just that
+-- run into two compact daily tables:
+--
+--   rate_history_daily    one row per (category, lender, day)
+--   market_history_daily  one row per (category, day), computed across the
+--                         lenders seen that day (each lender counted once,
+--                         by its best rate), so later runs on the same day
+--                         only refine it.
+
+begin;
+
+create table if not exists public.rate_history_daily (
+  category text not null,
+  lender_name text not null,
+  day date not null,
+  min_rate numeric,
+  median_rate numeric,
+  mean_rate numeric,
+  min_apr numeric,
+  median_apr numeric,
+  mean_apr numeric,
+  offers integer not null,
+  run_id bigint not null,
+  updated_at timestamptz not null default now(),
+  primary key (category, lender_name, day)
+);
+
+create table if not exists public.market_history_daily (
+  category text not null,
+  day date not null,
+  min_rate numeric,
+  median_rate numeric,
+  mean_rate numeric,
+  min_apr numeric,
+  median_apr numeric,
+  mean_apr numeric,
+  lenders integer not null,
+  offers integer not null,
+  updated_at timestamptz not null default now(),
+  primary key (category, day)
+);
+
+create index if not exists idx_rate_history_lender_day
+  on public.rate_history_daily(lender_name, day desc);
+
+-- Aggregates are public-facing, like latest_rates_view
+alter table public.rate_history_daily enable row level security;
+alter table public.market_history_daily enable row level security;
+
+drop policy if exists anon_select_rate_history on public.rate_history_daily;
+create policy anon_select_rate_history on public.rate_history_daily
+  for select to anon using (true);
+drop policy if exists anon_select_market_history on public.market_history_daily;
+create policy anon_select_market_history on public.market_history_daily
+  for select to anon using (true);
+
+grant select on public.rate_history_daily to anon;
+grant select on public.market_history_daily to anon;
+
+-- =====================================================
+-- Incremental rollup of one run
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.rollup_run(p_run_id bigint)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_run public.runs%ROWTYPE;
+  v_day date;
+  v_rows integer;
+BEGIN
+  SELECT * INTO v_run FROM public.runs WHERE id = p_run_id;
+  IF NOT FOUND OR v_run.run_type <> 'real' OR v_run.status NOT IN ('success', 'partial') THEN
+    RETURN 0;
+  END IF;
+
+  v_day := (v_run.created_at AT TIME ZONE 'America/New_York')::date;
+
+  INSERT INTO public.rate_history_daily AS h (
+    category, lender_name, day, min_rate, median_rate, mean_rate,
+    min_apr, median_apr, mean_apr, offers, run_id, updated_at
+  )
+  SELECT
+    o.category,
+    o.lender_name,
+    v_day,
+    min(o.rate),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY o.rate),
+    round(avg(o.rate), 4),
+    min(o.apr),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY o.apr),
+    round(avg(o.apr), 4),
+    count(*)::integer,
+    p_run_id,
+    now()
+  FROM public.offers_normalized o
+  WHERE o.run_id = p_run_id
+    AND o.data_source = 'real'
+  GROUP BY o.category, o.lender_name
+  ON CONFLICT (category, lender_name, day) DO UPDATE SET
+    min_rate = excluded.min_rate,
+    median_rate = excluded.median_rate,
+    mean_rate = excluded.mean_rate,
+    min_apr = excluded.min_apr,
+    median_apr = excluded.median_apr,
+    mean_apr = excluded.mean_apr,
+    offers = excluded.offers,
+    run_id = excluded.run_id,
+    updated_at = excluded.updated_at;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  -- Re-derive the market rows for the categories this run touched
+  INSERT INTO public.market_history_daily AS m (
+    category, day, min_rate, median_rate, mean_rate,
+    min_apr, median_apr, mean_apr, lenders, offers, updated_at
+  )
+  SELECT
+    h.category,
+    v_day,
+    min(h.min_rate),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY h.min_rate),
+    round(avg(h.min_rate), 4),
+    min(h.min_apr),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY h.min_apr),
+    round(avg(h.min_apr), 4),
+    count(*)::integer,
+    sum(h.offers)::integer,
+    now()
+  FROM public.rate_history_daily h
+  WHERE h.day = v_day
+    AND h.category IN (SELECT DISTINCT o.category FROM public.offers_normalized o
+                       WHERE o.run_id = p_run_id AND o.data_source = 'real')
+  GROUP BY h.category
+  ON CONFLICT (category, day) DO UPDATE SET
+    min_rate = excluded.min_rate,
+    median_rate = excluded.median_rate,
+    mean_rate = excluded.mean_rate,
+    min_apr = excluded.min_apr,
+    median_apr = excluded.median_apr,
+    mean_apr = excluded.mean_apr,
+    lenders = excluded.lenders,
+    offers = excluded.offers,
+    updated_at = excluded.updated_at;
+
+  RETURN v_rows;
+END;
+$$;
+
+COMMENT ON FUNCTION public.rollup_run(bigint) IS
+  'Fold one successful real run into rate_history_daily / market_history_daily';
+
+-- =====================================================
+-- Trend read path
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.get_rate_trend(
+  p_category text,
+  p_days integer DEFAULT 90,
+  p_lender text DEFAULT NULL
+)
+RETURNS TABLE (
+  day date,
+  lender_name text,
+  min_rate numeric,
+  median_rate numeric,
+  mean_rate numeric,
+  min_apr numeric,
+  median_apr numeric,
+  mean_apr numeric,
+  lenders integer,
+  offers integer
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT m.day, NULL::text, m.min_rate, m.median_rate, m.mean_rate,
+         m.min_apr, m.median_apr, m.mean_apr, m.lenders, m.offers
+  FROM public.market_history_daily m
+  WHERE p_lender IS NULL
+    AND m.category = p_category
+    AND m.day >= current_date - p_days
+  UNION ALL
+  SELECT h.day, h.lender_name, h.min_rate, h.median_rate, h.mean_rate,
+         h.min_apr, h.median_apr, h.mean_apr, 1, h.offers
+  FROM public.rate_history_daily h
+  WHERE p_lender IS NOT NULL
+    AND h.category = p_category
+    AND h.lender_name = p_lender
+    AND h.day >= current_date - p_days
+  ORDER BY 1;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_rate_trend(text, integer, text) TO anon;
+GRANT EXECUTE ON FUNCTION public.get_rate_trend(text, integer, text) TO authenticated;
+REVOKE EXECUTE ON FUNCTION public.rollup_run(bigint) FROM public, anon;
+
+-- =====================================================
+-- Backfill from existing history, oldest first
+-- =====================================================
+
+DO $$
+DECLARE
+  r record;
+BEGIN
+  FOR r IN
+    SELECT id FROM public.runs
+    WHERE run_type = 'real' AND status IN ('success', 'partial')
+    ORDER BY created_at
+  LOOP
+    PERFORM public.rollup_run(r.id);
+  END LOOP;
+END $$;
+
+commit;
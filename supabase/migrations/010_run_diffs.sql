@@ -0,0 +1,107 @@
+-- Migration 010: Run-to-run change feed
+-- After each successful real run the collector diffs its offers against
+-- the previous successful real run (mortgage_tracker.diff) and stores the
+-- compact change set here: offers added, removed and repriced, keyed by
+-- (lender, category, loan profile). Email and the website can read the
+-- delta instead of re-reading whole result sets.
+
+begin;
+
+create table if not exists public.run_diffs (
+  run_id bigint primary key references public.runs(id) on delete cascade,
+  base_run_id bigint references public.runs(id) on delete set null,
+  added integer not null,
+  removed integer not null,
+  repriced integer not null,
+  unchanged integer not null,
+  changes jsonb not null,
+  created_at timestamptz not null default now()
+);
+
+COMMENT ON TABLE public.run_diffs IS
+  'Offers added / removed / repriced by a real run relative to the previous successful real run';
+
+alter table public.run_diffs enable row level security;
+revoke select on public.run_diffs from anon;
+
+-- =====================================================
+-- Write path (service role only)
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.get_previous_run_id(p_run_id bigint)
+RETURNS bigint
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT p.id
+  FROM public.runs r
+  JOIN public.runs p
+    ON p.run_type = r.run_type
+   AND p.status IN ('success', 'partial')
+   AND p.created_at < r.created_at
+  WHERE r.id = p_run_id
+  ORDER BY p.created_at DESC
+  LIMIT 1;
+$$;
+
+CREATE OR REPLACE FUNCTION public.store_run_diff(
+  p_run_id bigint,
+  p_base_run_id bigint,
+  p_diff jsonb
+)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  INSERT INTO public.run_diffs AS d (
+    run_id, base_run_id, added, removed, repriced, unchanged, changes, created_at
+  )
+  VALUES (
+    p_run_id,
+    p_base_run_id,
+    jsonb_array_length(COALESCE(p_diff->'added', '[]'::jsonb)),
+    jsonb_array_length(COALESCE(p_diff->'removed', '[]'::jsonb)),
+    jsonb_array_length(COALESCE(p_diff->'repriced', '[]'::jsonb)),
+    COALESCE((p_diff->>'unchanged')::integer, 0),
+    p_diff,
+    now()
+  )
+  ON CONFLICT (run_id) DO UPDATE SET
+    base_run_id = excluded.base_run_id,
+    added = excluded.added,
+    removed = excluded.removed,
+    repriced = excluded.repriced,
+    unchanged = excluded.unchanged,
+    changes = excluded.changes,
+    created_at = excluded.created_at;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_previous_run_id(bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.store_run_diff(bigint, bigint, jsonb) FROM public, anon;
+
+-- =====================================================
+-- Read path
+-- =====================================================
+
+-- The stored change set of a run; NULL p_run_id means the published real run
+CREATE OR REPLACE FUNCTION public.get_run_diff(p_run_id bigint DEFAULT NULL)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT d.changes || jsonb_build_object('run_id', d.run_id, 'base_run_id', d.base_run_id)
+  FROM public.run_diffs d
+  WHERE d.run_id = COALESCE(
+    p_run_id,
+    (SELECT s.run_id FROM public.latest_run_summary s WHERE s.data_source = 'real')
+  );
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_run_diff(bigint) TO anon;
+GRANT EXECUTE ON FUNCTION public.get_run_diff(bigint) TO authenticated;
+
+commit;
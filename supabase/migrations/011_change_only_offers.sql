@@ -0,0 +1,359 @@
+-- Migration 011: Change-only offer storage
+-- With OFFER_STORE=changes the collector inserts an offer only when its
+-- priced fields differ from the source's previous run (or its last stored
+-- row is older than the keyframe interval). Every source that was parsed in
+-- a run instead gets one run_sources row listing the offer keys that were
+-- live in that run.
+--
+-- get_run_offers(run_id) reconstructs a run's full offer set: for each live
+-- key, the last stored row at or before that run. Runs written in the
+-- default full mode have no run_sources rows and read as before.
+--
+-- refresh_latest_rates and rollup_run now read through get_run_offers.
+
+begin;
+
+-- =====================================================
+-- STEP 1: Schema
+-- =====================================================
+
+alter table public.offers_normalized add column if not exists offer_key text;
+
+create index if not exists idx_offers_source_key_run
+  on public.offers_normalized(source_id, offer_key, run_id desc)
+  where offer_key is not null;
+
+create table if not exists public.run_sources (
+  run_id bigint not null references public.runs(id) on delete cascade,
+  source_id bigint not null references public.sources(id) on delete cascade,
+  offer_keys text[] not null,
+  offers_changed integer not null default 0,
+  created_at timestamptz not null default now(),
+  primary key (run_id, source_id)
+);
+
+create index if not exists idx_run_sources_source_run on public.run_sources(source_id, run_id desc);
+
+COMMENT ON TABLE public.run_sources IS
+  'Per run and source: offer keys live in that run (change-only storage, migration 011)';
+
+alter table public.run_sources enable row level security;
+revoke select on public.run_sources from anon;
+
+-- =====================================================
+-- STEP 2: Reconstruction
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.get_run_offers(p_run_id bigint)
+RETURNS SETOF public.offers_normalized
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  -- Sources stored in full for this run
+  SELECT o.*
+  FROM public.offers_normalized o
+  WHERE o.run_id = p_run_id
+    AND NOT EXISTS (SELECT 1 FROM public.run_sources rs
+                    WHERE rs.run_id = p_run_id AND rs.source_id = o.source_id)
+  UNION ALL
+  -- Change-only sources: last stored row of every key live in this run
+  SELECT o.*
+  FROM public.run_sources rs
+  CROSS JOIN LATERAL unnest(rs.offer_keys) AS k(offer_key)
+  CROSS JOIN LATERAL (
+    SELECT *
+    FROM public.offers_normalized x
+    WHERE x.source_id = rs.source_id
+      AND x.offer_key = k.offer_key
+      AND x.run_id <= rs.run_id
+    ORDER BY x.run_id DESC
+    LIMIT 1
+  ) o
+  WHERE rs.run_id = p_run_id;
+$$;
+
+COMMENT ON FUNCTION public.get_run_offers(bigint) IS
+  'All offers live in a run, whether it was stored in full or change-only';
+
+-- State the collector diffs a source against: the rows live in the
+-- source's most recent change-only run
+CREATE OR REPLACE FUNCTION public.get_source_offer_state(p_source_id bigint)
+RETURNS TABLE (
+  offer_key text,
+  rate numeric,
+  apr numeric,
+  points numeric,
+  lender_fees numeric,
+  state text,
+  term_months integer,
+  created_at timestamptz
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT o.offer_key, o.rate, o.apr, o.points, o.lender_fees, o.state, o.term_months, o.created_at
+  FROM (
+    SELECT rs.run_id, rs.offer_keys
+    FROM public.run_sources rs
+    JOIN public.runs r ON r.id = rs.run_id
+    WHERE rs.source_id = p_source_id
+      AND r.status IN ('success', 'partial')
+    ORDER BY rs.run_id DESC
+    LIMIT 1
+  ) last_run
+  CROSS JOIN LATERAL unnest(last_run.offer_keys) AS k(offer_key)
+  CROSS JOIN LATERAL (
+    SELECT *
+    FROM public.offers_normalized x
+    WHERE x.source_id = p_source_id
+      AND x.offer_key = k.offer_key
+      AND x.run_id <= last_run.run_id
+    ORDER BY x.run_id DESC
+    LIMIT 1
+  ) o;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_run_offers(bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_source_offer_state(bigint) FROM public, anon;
+
+-- =====================================================
+-- STEP 3: Read paths go through get_run_offers
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.refresh_latest_rates(p_run_id bigint)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_run public.runs%ROWTYPE;
+  v_current_created timestamptz;
+BEGIN
+  SELECT * INTO v_run FROM public.runs WHERE id = p_run_id;
+
+  IF NOT FOUND OR v_run.status NOT IN ('success', 'partial') THEN
+    RETURN;
+  END IF;
+  -- Sample runs only count as published when fully successful (as before)
+  IF v_run.run_type = 'sample' AND v_run.status <> 'success' THEN
+    RETURN;
+  END IF;
+
+  -- Serialise concurrent refreshes of the same data_source
+  PERFORM pg_advisory_xact_lock(hashtext('refresh_latest_rates:' || v_run.run_type));
+
+  -- Never let an older run overwrite a newer one
+  SELECT r.created_at INTO v_current_created
+  FROM public.latest_run_summary s
+  JOIN public.runs r ON r.id = s.run_id
+  WHERE s.data_source = v_run.run_type;
+
+  IF v_current_created IS NOT NULL AND v_current_created > v_run.created_at THEN
+    RETURN;
+  END IF;
+
+  DELETE FROM public.latest_rates WHERE data_source = v_run.run_type;
+
+  -- run_id is the published run. A row carried over unchanged from an
+  -- earlier run was still confirmed by this one, hence the GREATEST.
+  INSERT INTO public.latest_rates
+  SELECT DISTINCT ON (o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points)
+    o.id,
+    p_run_id,
+    s.id,
+    s.name,
+    o.lender_name,
+    o.category,
+    o.rate,
+    o.apr,
+    o.points,
+    o.lender_fees,
+    o.state,
+    o.loan_amount,
+    o.ltv::integer,
+    o.fico::integer,
+    o.lock_days::integer,
+    GREATEST(o.created_at, v_run.created_at),
+    o.data_source,
+    o.details_json
+  FROM public.get_run_offers(p_run_id) o
+  JOIN public.sources s ON o.source_id = s.id
+  WHERE o.data_source = v_run.run_type
+  ORDER BY o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points, o.created_at DESC;
+
+  INSERT INTO public.latest_run_summary AS sm (
+    data_source, run_id, run_status, distinct_lenders, offers_total, category_counts, last_updated, refreshed_at
+  )
+  SELECT
+    v_run.run_type,
+    p_run_id,
+    v_run.status,
+    COUNT(DISTINCT lr.lender_name)::integer,
+    COUNT(lr.id)::integer,
+    COALESCE(
+      (SELECT jsonb_object_agg(c.category, c.n)
+       FROM (SELECT category, COUNT(*) AS n FROM public.latest_rates
+             WHERE data_source = v_run.run_type GROUP BY category) c),
+      '{}'::jsonb
+    ),
+    MAX(lr.updated_at),
+    now()
+  FROM public.latest_rates lr
+  WHERE lr.data_source = v_run.run_type
+  ON CONFLICT (data_source) DO UPDATE SET
+    run_id = excluded.run_id,
+    run_status = excluded.run_status,
+    distinct_lenders = excluded.distinct_lenders,
+    offers_total = excluded.offers_total,
+    category_counts = excluded.category_counts,
+    last_updated = excluded.last_updated,
+    refreshed_at = excluded.refreshed_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.rollup_run(p_run_id bigint)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_run public.runs%ROWTYPE;
+  v_day date;
+  v_rows integer;
+BEGIN
+  SELECT * INTO v_run FROM public.runs WHERE id = p_run_id;
+  IF NOT FOUND OR v_run.run_type <> 'real' OR v_run.status NOT IN ('success', 'partial') THEN
+    RETURN 0;
+  END IF;
+
+  v_day := (v_run.created_at AT TIME ZONE 'America/New_York')::date;
+
+  CREATE TEMP TABLE _rollup_offers ON COMMIT DROP AS
+    SELECT o.category, o.lender_name, o.rate, o.apr
+    FROM public.get_run_offers(p_run_id) o
+    WHERE o.data_source = 'real';
+
+  INSERT INTO public.rate_history_daily AS h (
+    category, lender_name, day, min_rate, median_rate, mean_rate,
+    min_apr, median_apr, mean_apr, offers, run_id, updated_at
+  )
+  SELECT
+    o.category,
+    o.lender_name,
+    v_day,
+    min(o.rate),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY o.rate),
+    round(avg(o.rate), 4),
+    min(o.apr),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY o.apr),
+    round(avg(o.apr), 4),
+    count(*)::integer,
+    p_run_id,
+    now()
+  FROM _rollup_offers o
+  GROUP BY o.category, o.lender_name
+  ON CONFLICT (category, lender_name, day) DO UPDATE SET
+    min_rate = excluded.min_rate,
+    median_rate = excluded.median_rate,
+    mean_rate = excluded.mean_rate,
+    min_apr = excluded.min_apr,
+    median_apr = excluded.median_apr,
+    mean_apr = excluded.mean_apr,
+    offers = excluded.offers,
+    run_id = excluded.run_id,
+    updated_at = excluded.updated_at;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  -- Re-derive the market rows for the categories this run touched
+  INSERT INTO public.market_history_daily AS m (
+    category, day, min_rate, median_rate, mean_rate,
+    min_apr, median_apr, mean_apr, lenders, offers, updated_at
+  )
+  SELECT
+    h.category,
+    v_day,
+    min(h.min_rate),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY h.min_rate),
+    round(avg(h.min_rate), 4),
+    min(h.min_apr),
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY h.min_apr),
+    round(avg(h.min_apr), 4),
+    count(*)::integer,
+    sum(h.offers)::integer,
+    now()
+  FROM public.rate_history_daily h
+  WHERE h.day = v_day
+    AND h.category IN (SELECT DISTINCT o.category FROM _rollup_offers o)
+  GROUP BY h.category
+  ON CONFLICT (category, day) DO UPDATE SET
+    min_rate = excluded.min_rate,
+    median_rate = excluded.median_rate,
+    mean_rate = excluded.mean_rate,
+    min_apr = excluded.min_apr,
+    median_apr = excluded.median_apr,
+    mean_apr = excluded.mean_apr,
+    lenders = excluded.lenders,
+    offers = excluded.offers,
+    updated_at = excluded.updated_at;
+
+  DROP TABLE _rollup_offers;
+  RETURN v_rows;
+END;
+$$;
+
+-- =====================================================
+-- STEP 4: Retention must not drop rows that are still live
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION public.drop_history_partitions(p_before date)
+RETURNS text[]
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_part record;
+  v_dropped text[] := '{}';
+  v_oldest_live timestamptz;
+BEGIN
+  -- Oldest stored row the published real run still reads. The collector
+  -- re-stores rows older than its keyframe interval, so this stays recent.
+  SELECT min(o.created_at) INTO v_oldest_live
+  FROM public.latest_run_summary s
+  CROSS JOIN LATERAL public.get_run_offers(s.run_id) o
+  WHERE s.data_source = 'real';
+
+  IF v_oldest_live IS NOT NULL AND p_before > v_oldest_live::date THEN
+    RAISE EXCEPTION 'drop_history_partitions: offers stored on % are still live; use a date on or before it',
+      v_oldest_live::date;
+  END IF;
+
+  FOR v_part IN
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_class p ON p.oid = i.inhparent
+    JOIN pg_namespace n ON n.oid = p.relnamespace
+    WHERE n.nspname = 'public'
+      AND p.relname IN ('offers_normalized', 'rate_snapshots')
+      AND c.relname ~ '_[0-9]{6}$'
+      -- the partition's month ends on or before p_before
+      AND (to_date(right(c.relname, 6), 'YYYYMM') + interval '1 month')::date <= p_before
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('DROP TABLE public.%I', v_part.relname);
+    v_dropped := v_dropped || v_part.relname::text;
+  END LOOP;
+
+  -- Liveness markers of runs whose rows are gone
+  IF array_length(v_dropped, 1) > 0 THEN
+    DELETE FROM public.run_sources WHERE created_at < p_before;
+  END IF;
+  RETURN v_dropped;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.drop_history_partitions(date) FROM public, anon;
+
+commit;
@@ -0,0 +1,71 @@
+-- Migration 012: Rolling per-series statistics for anomaly detection
+-- The collector keeps an EWMA mean/variance of each (lender, category)
+-- rate series (mortgage_tracker.anomaly). Offers that jump implausibly far
+-- from their series are quarantined (recorded in runs.stats_json, not
+-- published); the state is advanced with the accepted offers after each
+-- successful real run. A series costs one small row. strikes counts
+-- consecutive runs in which every offer of the series was quarantined.
+
+begin;
+
+create table if not exists public.rate_series_state (
+  lender_name text not null,
+  category text not null,
+  mean real not null,
+  var real not null,
+  n integer not null,
+  strikes smallint not null default 0,
+  run_id bigint,
+  updated_at timestamptz not null default now(),
+  primary key (lender_name, category)
+);
+
+alter table public.rate_series_state enable row level security;
+revoke select on public.rate_series_state from anon;
+
+CREATE OR REPLACE FUNCTION public.get_rate_series_state()
+RETURNS TABLE (
+  lender_name text,
+  category text,
+  mean real,
+  var real,
+  n integer,
+  strikes smallint
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT s.lender_name, s.category, s.mean, s.var, s.n, s.strikes
+  FROM public.rate_series_state s;
+$$;
+
+-- p_rows: [{"lender_name", "category", "mean", "var", "n", "strikes"}, ...]
+CREATE OR REPLACE FUNCTION public.save_rate_series_state(p_run_id bigint, p_rows jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  INSERT INTO public.rate_series_state AS s (lender_name, category, mean, var, n, strikes, run_id, updated_at)
+  SELECT r.lender_name, r.category, r.mean, r.var, r.n, COALESCE(r.strikes, 0), p_run_id, now()
+  FROM jsonb_to_recordset(p_rows)
+    AS r(lender_name text, category text, mean real, var real, n integer, strikes smallint)
+  ON CONFLICT (lender_name, category) DO UPDATE SET
+    mean = excluded.mean,
+    var = excluded.var,
+    n = excluded.n,
+    strikes = excluded.strikes,
+    run_id = excluded.run_id,
+    updated_at = excluded.updated_at;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_rate_series_state() FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.save_rate_series_state(bigint, jsonb) FROM public, anon;
+
+commit;
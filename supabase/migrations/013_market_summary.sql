@@ -0,0 +1,42 @@
+-- Migration 013: Precomputed per-category market summaries
+-- The collector folds each run's offers into mergeable sketches
+-- (mortgage_tracker.sketch) and stores the reduced per-category summary
+-- (offers, lenders, p10/median/p90 rate and APR) on runs.stats_json->'market'.
+-- get_market_summary serves it together with the published run's summary,
+-- so pages no longer count lenders or scan updated_at themselves.
+
+begin;
+
+CREATE OR REPLACE FUNCTION public.get_market_summary(
+  include_sample boolean DEFAULT false
+)
+RETURNS TABLE (
+  run_id bigint,
+  data_source text,
+  is_fallback boolean,
+  run_status text,
+  distinct_lenders integer,
+  offers_total integer,
+  last_updated timestamptz,
+  market jsonb
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT s.run_id, s.data_source, s.data_source = 'sample', s.run_status,
+         s.distinct_lenders, s.offers_total, s.last_updated,
+         COALESCE(r.stats_json->'market', '{}'::jsonb)
+  FROM public.latest_run_summary s
+  JOIN public.runs r ON r.id = s.run_id
+  WHERE (s.data_source = 'real' AND s.distinct_lenders > 0)
+     OR (include_sample AND s.data_source = 'sample'
+         AND NOT EXISTS (SELECT 1 FROM public.latest_run_summary l
+                         WHERE l.data_source = 'real' AND l.distinct_lenders > 0))
+  LIMIT 1;
+$$;
+
+GRANT EXECUTE ON FUNCTION public.get_market_summary(boolean) TO anon;
+GRANT EXECUTE ON FUNCTION public.get_market_summary(boolean) TO authenticated;
+
+commit;
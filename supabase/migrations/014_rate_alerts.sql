@@ -0,0 +1,114 @@
+-- Migration 014: Rate alert subscriptions
+-- Subscribers ask to hear when an offer meets their criteria ("30Y fixed
+-- below 5.75% with at most 0.5 points"). After each successful real run the
+-- collector matches the run's new and repriced offers (run_diffs) against
+-- an in-memory index of the active subscriptions (mortgage_tracker.alerts)
+-- and queues one de-duplicated batch per subscriber in alert_batches.
+
+begin;
+
+create table if not exists public.alert_subscriptions (
+  id bigserial primary key,
+  email text not null,
+  category text not null,
+  max_rate numeric,
+  max_apr numeric,
+  max_points numeric,
+  lender_name text,
+  active boolean not null default true,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists idx_alert_subscriptions_active
+  on public.alert_subscriptions(category) where active;
+
+-- One pending notification per subscriber per run
+create table if not exists public.alert_batches (
+  id bigserial primary key,
+  run_id bigint not null references public.runs(id) on delete cascade,
+  email text not null,
+  matches jsonb not null,
+  status text not null default 'pending' check (status in ('pending', 'sent', 'failed')),
+  created_at timestamptz not null default now(),
+  sent_at timestamptz,
+  unique (run_id, email)
+);
+
+create index if not exists idx_alert_batches_pending
+  on public.alert_batches(created_at) where status = 'pending';
+
+alter table public.alert_subscriptions enable row level security;
+alter table public.alert_batches enable row level security;
+revoke select on public.alert_subscriptions from anon;
+revoke select on public.alert_batches from anon;
+
+CREATE OR REPLACE FUNCTION public.create_alert_subscription(
+  p_email text,
+  p_category text,
+  p_max_rate numeric DEFAULT NULL,
+  p_max_apr numeric DEFAULT NULL,
+  p_max_points numeric DEFAULT NULL,
+  p_lender_name text DEFAULT NULL
+)
+RETURNS bigint
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+  INSERT INTO public.alert_subscriptions (email, category, max_rate, max_apr, max_points, lender_name)
+  VALUES (lower(p_email), p_category, p_max_rate, p_max_apr, p_max_points, p_lender_name)
+  RETURNING id;
+$$;
+
+CREATE OR REPLACE FUNCTION public.deactivate_alert_subscription(p_id bigint)
+RETURNS boolean
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+  UPDATE public.alert_subscriptions SET active = false WHERE id = p_id AND active
+  RETURNING true;
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_alert_subscriptions()
+RETURNS TABLE (
+  id bigint,
+  email text,
+  category text,
+  max_rate numeric,
+  max_apr numeric,
+  max_points numeric,
+  lender_name text
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT s.id, s.email, s.category, s.max_rate, s.max_apr, s.max_points, s.lender_name
+  FROM public.alert_subscriptions s
+  WHERE s.active;
+$$;
+
+-- p_batches: [{"email": ..., "matches": [...]}, ...]; re-queuing a run replaces its pending batches
+CREATE OR REPLACE FUNCTION public.queue_alert_batches(p_run_id bigint, p_batches jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  INSERT INTO public.alert_batches AS b (run_id, email, matches)
+  SELECT p_run_id, r.email, r.matches
+  FROM jsonb_to_recordset(p_batches) AS r(email text, matches jsonb)
+  ON CONFLICT (run_id, email) DO UPDATE SET matches = excluded.matches
+  WHERE b.status = 'pending';
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.create_alert_subscription(text, text, numeric, numeric, numeric, text) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.deactivate_alert_subscription(bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_alert_subscriptions() FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.queue_alert_batches(bigint, jsonb) FROM public, anon;
+
+commit;
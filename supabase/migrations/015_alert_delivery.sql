@@ -0,0 +1,95 @@
+-- Migration 015: Alert delivery leases and retries
+-- The collector only queues alert_batches (migration 014); the delivery
+-- worker (python -m mortgage_tracker.emailer deliver) claims pending
+-- batches under a lease, so concurrent workers never send a batch twice,
+-- and records the outcome. Transient failures go back to pending with a
+-- back-off until the attempt limit, then the batch is marked failed.
+-- The outcome is only recorded while the lease is still the caller's: a
+-- worker whose lease expired and was re-claimed cannot overwrite the
+-- result of the worker that holds it now.
+
+begin;
+
+alter table public.alert_batches
+  add column if not exists attempts integer not null default 0,
+  add column if not exists last_error text,
+  add column if not exists claimed_until timestamptz,
+  add column if not exists next_attempt_at timestamptz;
+
+-- The return type and the finish arguments changed: replace, not overload
+DROP FUNCTION IF EXISTS public.claim_alert_batches(integer, integer);
+DROP FUNCTION IF EXISTS public.finish_alert_batch(bigint, boolean, text, integer);
+
+CREATE OR REPLACE FUNCTION public.claim_alert_batches(
+  p_limit integer DEFAULT 100,
+  p_lease_seconds integer DEFAULT 300
+)
+RETURNS TABLE (
+  id bigint,
+  run_id bigint,
+  email text,
+  matches jsonb,
+  attempts integer,
+  claimed_until timestamptz
+)
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+  UPDATE public.alert_batches b
+  SET claimed_until = now() + make_interval(secs => p_lease_seconds),
+      attempts = b.attempts + 1
+  WHERE b.id IN (
+    SELECT c.id
+    FROM public.alert_batches c
+    WHERE c.status = 'pending'
+      AND (c.claimed_until IS NULL OR c.claimed_until < now())
+      AND (c.next_attempt_at IS NULL OR c.next_attempt_at <= now())
+    ORDER BY c.created_at, c.id
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  )
+  RETURNING b.id, b.run_id, b.email, b.matches, b.attempts, b.claimed_until;
+$$;
+
+-- p_claimed_until: the claimed_until claim_alert_batches returned, the lease token
+-- p_retry_after_seconds: NULL = final (sent, or failed for good)
+-- Returns false when the lease was lost and nothing was recorded.
+CREATE OR REPLACE FUNCTION public.finish_alert_batch(
+  p_id bigint,
+  p_claimed_until timestamptz,
+  p_sent boolean,
+  p_error text DEFAULT NULL,
+  p_retry_after_seconds integer DEFAULT NULL
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  UPDATE public.alert_batches b
+  SET status = CASE
+                 WHEN p_sent THEN 'sent'
+                 WHEN p_retry_after_seconds IS NOT NULL THEN 'pending'
+                 ELSE 'failed'
+               END,
+      sent_at = CASE WHEN p_sent THEN now() ELSE b.sent_at END,
+      last_error = p_error,
+      claimed_until = NULL,
+      next_attempt_at = CASE
+                          WHEN p_retry_after_seconds IS NOT NULL
+                          THEN now() + make_interval(secs => p_retry_after_seconds)
+                        END
+  WHERE b.id = p_id
+    AND b.status = 'pending'
+    AND b.claimed_until = p_claimed_until;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows > 0;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.claim_alert_batches(integer, integer) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.finish_alert_batch(bigint, timestamptz, boolean, text, integer) FROM public, anon;
+
+commit;
@@ -0,0 +1,30 @@
+-- Migration 016: Runs over a selection of sources
+-- `mortgage_tracker.main --only/--parser/--reliability` collects a subset of
+-- the catalog for debugging or partial refreshes. Such runs record their
+-- selection in runs.stats_json->'selection' and are never published; they
+-- must not become the baseline of the next full run's change set either,
+-- or every source they skipped would show up as added.
+
+begin;
+
+CREATE OR REPLACE FUNCTION public.get_previous_run_id(p_run_id bigint)
+RETURNS bigint
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT p.id
+  FROM public.runs r
+  JOIN public.runs p
+    ON p.run_type = r.run_type
+   AND p.status IN ('success', 'partial')
+   AND p.created_at < r.created_at
+   AND NOT COALESCE(p.stats_json ? 'selection', false)
+  WHERE r.id = p_run_id
+  ORDER BY p.created_at DESC
+  LIMIT 1;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_previous_run_id(bigint) FROM public, anon;
+
+commit;
@@ -0,0 +1,75 @@
+-- Migration 017: Runs split across shards
+-- `mortgage_tracker.main --shard i/N --run-id ID` collects a stable slice of
+-- the catalog under one logical run. Each shard loads its snapshots and
+-- offers as usual but leaves the run 'started' and records its own outcome
+-- here; `--merge-run ID` then combines the shard stats, sets the run's final
+-- status and publishes it.
+
+begin;
+
+create table if not exists public.run_shards (
+  run_id bigint not null references public.runs(id) on delete cascade,
+  shard integer not null,
+  shard_count integer not null,
+  status text not null check (status in ('success', 'partial', 'failed')),
+  stats_json jsonb not null default '{}'::jsonb,
+  finished_at timestamptz not null default now(),
+  primary key (run_id, shard),
+  check (shard >= 0 and shard < shard_count)
+);
+
+alter table public.run_shards enable row level security;
+revoke select on public.run_shards from anon;
+
+-- A re-run of a shard replaces its earlier outcome
+CREATE OR REPLACE FUNCTION public.save_run_shard(
+  p_run_id bigint,
+  p_shard integer,
+  p_shard_count integer,
+  p_status text,
+  p_stats jsonb
+)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  INSERT INTO public.run_shards AS s (run_id, shard, shard_count, status, stats_json, finished_at)
+  VALUES (p_run_id, p_shard, p_shard_count, p_status, COALESCE(p_stats, '{}'::jsonb), now())
+  ON CONFLICT (run_id, shard) DO UPDATE SET
+    shard_count = excluded.shard_count,
+    status = excluded.status,
+    stats_json = excluded.stats_json,
+    finished_at = excluded.finished_at;
+END;
+$$;
+
+-- The run plus one row per finished shard (shard columns NULL when none has finished)
+CREATE OR REPLACE FUNCTION public.get_run_shards(p_run_id bigint)
+RETURNS TABLE (
+  run_id bigint,
+  run_type text,
+  run_status text,
+  created_at timestamptz,
+  shard integer,
+  shard_count integer,
+  status text,
+  stats_json jsonb,
+  finished_at timestamptz
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT r.id, r.run_type, r.status, r.created_at,
+         s.shard, s.shard_count, s.status, s.stats_json, s.finished_at
+  FROM public.runs r
+  LEFT JOIN public.run_shards s ON s.run_id = r.id
+  WHERE r.id = p_run_id
+  ORDER BY s.shard;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.save_run_shard(bigint, integer, integer, text, jsonb) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_run_shards(bigint) FROM public, anon;
+
+commit;
@@ -0,0 +1,202 @@
+-- Migration 018: Work queue for cooperating collector workers
+-- `mortgage_tracker.main --coordinator` creates a run and enqueues one job
+-- per source; any number of `--worker` processes claim jobs under a lease
+-- (FOR UPDATE SKIP LOCKED, so two workers never hold the same job), collect
+-- the source and report its stats. A job whose lease expires, because its
+-- worker died, goes back to the queue until its attempt limit. The
+-- coordinator waits for the queue to drain, then closes and publishes the
+-- run from the job results. Workers write through the COPY writer
+-- (WRITER=postgres), which stores a job's rows in the same transaction as
+-- its finish_run_job report, so a reclaimed job is never stored twice.
+
+begin;
+
+create table if not exists public.run_jobs (
+  id bigserial primary key,
+  run_id bigint not null references public.runs(id) on delete cascade,
+  source_name text not null,
+  source jsonb not null,
+  status text not null default 'queued'
+    check (status in ('queued', 'running', 'done', 'failed', 'cancelled')),
+  attempts integer not null default 0,
+  max_attempts integer not null default 3,
+  worker text,
+  claimed_until timestamptz,
+  result_json jsonb,
+  last_error text,
+  created_at timestamptz not null default now(),
+  finished_at timestamptz,
+  unique (run_id, source_name)
+);
+
+create index if not exists idx_run_jobs_open
+  on public.run_jobs (created_at, id)
+  where status in ('queued', 'running');
+
+alter table public.run_jobs enable row level security;
+revoke select on public.run_jobs from anon;
+
+-- p_jobs: [{"source_name", "source"}, ...]
+CREATE OR REPLACE FUNCTION public.enqueue_run_jobs(
+  p_run_id bigint,
+  p_jobs jsonb,
+  p_max_attempts integer DEFAULT 3
+)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  INSERT INTO public.run_jobs (run_id, source_name, source, max_attempts)
+  SELECT p_run_id, j.source_name, j.source, p_max_attempts
+  FROM jsonb_to_recordset(p_jobs) AS j(source_name text, source jsonb)
+  ON CONFLICT (run_id, source_name) DO NOTHING;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+-- Claim up to p_limit jobs of open runs (or only of p_run_id). Expired
+-- leases are reclaimed; jobs that used up their attempts are failed.
+CREATE OR REPLACE FUNCTION public.claim_run_jobs(
+  p_worker text,
+  p_limit integer DEFAULT 1,
+  p_lease_seconds integer DEFAULT 300,
+  p_run_id bigint DEFAULT NULL
+)
+RETURNS TABLE (
+  id bigint,
+  run_id bigint,
+  run_type text,
+  source_name text,
+  source jsonb,
+  attempts integer
+)
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+  UPDATE public.run_jobs j
+  SET status = 'failed',
+      last_error = COALESCE(j.last_error, 'lease expired after ' || j.attempts || ' attempt(s)'),
+      claimed_until = NULL,
+      finished_at = now()
+  WHERE j.status = 'running'
+    AND j.claimed_until < now()
+    AND j.attempts >= j.max_attempts
+    AND (p_run_id IS NULL OR j.run_id = p_run_id);
+
+  RETURN QUERY
+  UPDATE public.run_jobs j
+  SET status = 'running',
+      worker = p_worker,
+      attempts = j.attempts + 1,
+      claimed_until = now() + make_interval(secs => p_lease_seconds)
+  FROM public.runs r
+  WHERE r.id = j.run_id
+    AND j.id IN (
+      SELECT c.id
+      FROM public.run_jobs c
+      JOIN public.runs cr ON cr.id = c.run_id
+      WHERE cr.status = 'started'
+        AND (p_run_id IS NULL OR c.run_id = p_run_id)
+        AND (c.status = 'queued' OR (c.status = 'running' AND c.claimed_until < now()))
+        AND c.attempts < c.max_attempts
+      ORDER BY c.created_at, c.id
+      LIMIT p_limit
+      FOR UPDATE OF c SKIP LOCKED
+    )
+  RETURNING j.id, j.run_id, r.run_type, j.source_name, j.source, j.attempts;
+END;
+$$;
+
+-- Report a claimed job: 'done' with its stats, 'failed' for good, or
+-- 'queued' to hand it back for another attempt. Returns false when the
+-- worker no longer holds the job (its lease was reclaimed or the run was
+-- closed); the caller must then discard what it collected.
+CREATE OR REPLACE FUNCTION public.finish_run_job(
+  p_id bigint,
+  p_worker text,
+  p_status text,
+  p_result jsonb DEFAULT NULL,
+  p_error text DEFAULT NULL
+)
+RETURNS boolean
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  IF p_status NOT IN ('done', 'failed', 'queued') THEN
+    RAISE EXCEPTION 'finish_run_job: unknown status %', p_status;
+  END IF;
+  UPDATE public.run_jobs j
+  SET status = CASE
+                 WHEN p_status = 'queued' AND j.attempts >= j.max_attempts THEN 'failed'
+                 ELSE p_status
+               END,
+      result_json = p_result,
+      last_error = p_error,
+      claimed_until = NULL,
+      finished_at = CASE WHEN p_status = 'queued' AND j.attempts < j.max_attempts THEN NULL ELSE now() END
+  FROM public.runs r
+  WHERE j.id = p_id
+    AND j.worker = p_worker
+    AND j.status = 'running'
+    AND r.id = j.run_id
+    AND r.status = 'started';
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows > 0;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.get_run_jobs(p_run_id bigint)
+RETURNS TABLE (
+  id bigint,
+  source_name text,
+  status text,
+  attempts integer,
+  worker text,
+  last_error text,
+  result_json jsonb
+)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT j.id, j.source_name, j.status, j.attempts, j.worker, j.last_error, j.result_json
+  FROM public.run_jobs j
+  WHERE j.run_id = p_run_id
+  ORDER BY j.id;
+$$;
+
+-- Jobs still open when the coordinator gives up on them
+CREATE OR REPLACE FUNCTION public.cancel_run_jobs(p_run_id bigint)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  UPDATE public.run_jobs j
+  SET status = 'cancelled',
+      claimed_until = NULL,
+      finished_at = now()
+  WHERE j.run_id = p_run_id
+    AND j.status IN ('queued', 'running');
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.enqueue_run_jobs(bigint, jsonb, integer) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.claim_run_jobs(text, integer, integer, bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.finish_run_job(bigint, text, text, jsonb, text) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_run_jobs(bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.cancel_run_jobs(bigint) FROM public, anon;
+
+commit;
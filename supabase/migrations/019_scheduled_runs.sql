@@ -0,0 +1,138 @@
+-- Migration 019: Scheduled runs over the sources that are due
+-- The resident collector (python -m mortgage_tracker.daemon) collects each
+-- source at its own cadence, so one of its runs covers only the sources due
+-- at that tick and records them in runs.stats_json->'schedule'. Publishing
+-- such a run replaces the latest_rates rows of the sources it collected and
+-- leaves every other source's rows as they were. A full refresh
+-- (refresh_latest_rates) still replaces everything.
+
+begin;
+
+CREATE OR REPLACE FUNCTION public.publish_run_sources(p_run_id bigint)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_run public.runs%ROWTYPE;
+  v_rows integer;
+BEGIN
+  SELECT * INTO v_run FROM public.runs WHERE id = p_run_id;
+
+  IF NOT FOUND OR v_run.status NOT IN ('success', 'partial') THEN
+    RETURN 0;
+  END IF;
+
+  PERFORM pg_advisory_xact_lock(hashtext('refresh_latest_rates:' || v_run.run_type));
+
+  CREATE TEMP TABLE _run_offers ON COMMIT DROP AS
+  SELECT DISTINCT ON (o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points)
+    o.*
+  FROM public.get_run_offers(p_run_id) o
+  WHERE o.data_source = v_run.run_type
+  ORDER BY o.lender_name, o.category, o.loan_amount, o.ltv, o.fico, o.lock_days, o.points, o.created_at DESC;
+
+  -- Every source the run looked at, whether or not it produced offers
+  DELETE FROM public.latest_rates lr
+  WHERE lr.data_source = v_run.run_type
+    AND lr.source_id IN (SELECT DISTINCT s.source_id FROM public.rate_snapshots s WHERE s.run_id = p_run_id);
+
+  -- The same offer published by another source: the fresher row wins
+  DELETE FROM public.latest_rates lr
+  USING _run_offers o
+  WHERE lr.data_source = v_run.run_type
+    AND (lr.lender_name, lr.category, lr.loan_amount, lr.ltv, lr.fico, lr.lock_days, lr.points)
+        IS NOT DISTINCT FROM
+        (o.lender_name, o.category, o.loan_amount, o.ltv::integer, o.fico::integer, o.lock_days::integer, o.points);
+
+  INSERT INTO public.latest_rates
+  SELECT
+    o.id,
+    p_run_id,
+    s.id,
+    s.name,
+    o.lender_name,
+    o.category,
+    o.rate,
+    o.apr,
+    o.points,
+    o.lender_fees,
+    o.state,
+    o.loan_amount,
+    o.ltv::integer,
+    o.fico::integer,
+    o.lock_days::integer,
+    GREATEST(o.created_at, v_run.created_at),
+    o.data_source,
+    o.details_json
+  FROM _run_offers o
+  JOIN public.sources s ON o.source_id = s.id;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+  INSERT INTO public.latest_run_summary AS sm (
+    data_source, run_id, run_status, distinct_lenders, offers_total, category_counts, last_updated, refreshed_at
+  )
+  SELECT
+    v_run.run_type,
+    p_run_id,
+    v_run.status,
+    COUNT(DISTINCT lr.lender_name)::integer,
+    COUNT(lr.id)::integer,
+    COALESCE(
+      (SELECT jsonb_object_agg(c.category, c.n)
+       FROM (SELECT category, COUNT(*) AS n FROM public.latest_rates
+             WHERE data_source = v_run.run_type GROUP BY category) c),
+      '{}'::jsonb
+    ),
+    MAX(lr.updated_at),
+    now()
+  FROM public.latest_rates lr
+  WHERE lr.data_source = v_run.run_type
+  ON CONFLICT (data_source) DO UPDATE SET
+    run_id = excluded.run_id,
+    run_status = excluded.run_status,
+    distinct_lenders = excluded.distinct_lenders,
+    offers_total = excluded.offers_total,
+    category_counts = excluded.category_counts,
+    last_updated = excluded.last_updated,
+    refreshed_at = excluded.refreshed_at;
+
+  RETURN v_rows;
+END;
+$$;
+
+-- The published offers as the collector diffs and summarises them
+CREATE OR REPLACE FUNCTION public.get_published_offers(p_data_source text DEFAULT 'real')
+RETURNS SETOF public.latest_rates
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT * FROM public.latest_rates lr WHERE lr.data_source = p_data_source;
+$$;
+
+-- A scheduled run covers only some sources: like a selection run it is no
+-- baseline for the next run's change set
+CREATE OR REPLACE FUNCTION public.get_previous_run_id(p_run_id bigint)
+RETURNS bigint
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT p.id
+  FROM public.runs r
+  JOIN public.runs p
+    ON p.run_type = r.run_type
+   AND p.status IN ('success', 'partial')
+   AND p.created_at < r.created_at
+   AND NOT COALESCE(p.stats_json ?| array['selection', 'schedule'], false)
+  WHERE r.id = p_run_id
+  ORDER BY p.created_at DESC
+  LIMIT 1;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.publish_run_sources(bigint) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_published_offers(text) FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.get_previous_run_id(bigint) FROM public, anon;
+
+commit;
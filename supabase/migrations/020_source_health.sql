@@ -0,0 +1,93 @@
+-- Migration 020: Per-source outcome history and adaptive back-off
+-- The collector records every collected source's outcome here (success:
+-- offers stored, empty: fetched but no usable offers, error) with its
+-- latency and yield (mortgage_tracker.health). A source that misses
+-- several runs in a row is only probed at next_probe_at, the wait doubling
+-- with every failed probe; the first probe that yields offers puts it back
+-- on every run. Each run's decisions are listed in runs.stats_json->'health'.
+-- A run (or shard) whose every source was deferred collected nothing: its
+-- status is 'skipped' and it is never published.
+
+begin;
+
+alter table public.runs drop constraint if exists runs_status_check;
+alter table public.runs add constraint runs_status_check
+  check (status in ('started', 'success', 'partial', 'failed', 'skipped'));
+alter table public.run_shards drop constraint if exists run_shards_status_check;
+alter table public.run_shards add constraint run_shards_status_check
+  check (status in ('success', 'partial', 'failed', 'skipped'));
+
+create table if not exists public.source_health (
+  source_name text primary key,
+  successes integer not null default 0,
+  empties integer not null default 0,
+  errors integer not null default 0,
+  misses integer not null default 0,
+  backoff smallint not null default 0,
+  next_probe_at timestamptz,
+  last_outcome text check (last_outcome in ('success', 'empty', 'error')),
+  latency_ms real,
+  last_offers integer not null default 0,
+  offers_total bigint not null default 0,
+  last_success_at timestamptz,
+  run_id bigint,
+  updated_at timestamptz not null default now()
+);
+
+alter table public.source_health enable row level security;
+revoke select on public.source_health from anon;
+
+CREATE OR REPLACE FUNCTION public.get_source_health()
+RETURNS SETOF public.source_health
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+AS $$
+  SELECT * FROM public.source_health;
+$$;
+
+-- p_rows: [{"source_name", "successes", "empties", "errors", "misses", "backoff",
+--           "next_probe_at", "last_outcome", "latency_ms", "last_offers",
+--           "offers_total", "last_success_at"}, ...]
+CREATE OR REPLACE FUNCTION public.save_source_health(p_run_id bigint, p_rows jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+DECLARE
+  v_rows integer;
+BEGIN
+  INSERT INTO public.source_health AS h (
+    source_name, successes, empties, errors, misses, backoff, next_probe_at, last_outcome,
+    latency_ms, last_offers, offers_total, last_success_at, run_id, updated_at
+  )
+  SELECT r.source_name, r.successes, r.empties, r.errors, r.misses, r.backoff, r.next_probe_at,
+         r.last_outcome, r.latency_ms, r.last_offers, r.offers_total, r.last_success_at, p_run_id, now()
+  FROM jsonb_to_recordset(p_rows) AS r(
+    source_name text, successes integer, empties integer, errors integer, misses integer,
+    backoff smallint, next_probe_at timestamptz, last_outcome text, latency_ms real,
+    last_offers integer, offers_total bigint, last_success_at timestamptz
+  )
+  ON CONFLICT (source_name) DO UPDATE SET
+    successes = excluded.successes,
+    empties = excluded.empties,
+    errors = excluded.errors,
+    misses = excluded.misses,
+    backoff = excluded.backoff,
+    next_probe_at = excluded.next_probe_at,
+    last_outcome = excluded.last_outcome,
+    latency_ms = excluded.latency_ms,
+    last_offers = excluded.last_offers,
+    offers_total = excluded.offers_total,
+    last_success_at = excluded.last_success_at,
+    run_id = excluded.run_id,
+    updated_at = excluded.updated_at;
+  GET DIAGNOSTICS v_rows = ROW_COUNT;
+  RETURN v_rows;
+END;
+$$;
+
+REVOKE EXECUTE ON FUNCTION public.get_source_health() FROM public, anon;
+REVOKE EXECUTE ON FUNCTION public.save_source_health(bigint, jsonb) FROM public, anon;
+
+commit;
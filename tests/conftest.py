@@ -0,0 +1,94 @@
+"""
+Shared fixtures.
+
+Database tests need TEST_DATABASE_URL: a scratch Postgres database with
+supabase/migrations applied. They are skipped without it. Each test
+truncates the tables it may touch, so never point it at real data.
+"""
+import os
+
+import pytest
+
+from mortgage_tracker.config import Config, Defaults, Source
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# Truncated before every database test (CASCADE takes the dependent tables)
+TABLES = (
+    "runs",
+    "sources",
+    "latest_rates",
+    "latest_run_summary",
+    "snapshot_blobs",
+    "rate_series_state",
+    "source_health",
+)
+
+
+@pytest.fixture
+def pg_url():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    psycopg = pytest.importorskip("psycopg")
+    with psycopg.connect(TEST_DATABASE_URL, autocommit=True) as conn:
+        conn.execute(
+            "truncate " + ", ".join(f"public.{t}" for t in TABLES) + " restart identity cascade"
+        )
+    return TEST_DATABASE_URL
+
+
+@pytest.fixture
+def pg(pg_url):
+    """An autocommit connection returning dict rows, for setup and assertions."""
+    import psycopg
+    from psycopg.rows import dict_row
+
+    with psycopg.connect(pg_url, autocommit=True, row_factory=dict_row) as conn:
+        yield conn
+
+
+def make_source(name: str = "Test Bank", **kwargs) -> Source:
+    fields = {
+        "org_type": "bank",
+        "homepage_url": "https://example.com/",
+        "rate_url": f"https://example.com/{name.lower().replace(' ', '-')}",
+        "parser_key": "example_html_table",
+        "enabled": True,
+    }
+    fields.update(kwargs)
+    return Source(name=name, **fields)
+
+
+def make_config(**kwargs) -> Config:
+    fields = {
+        "supabase_url": "https://example.supabase.co",
+        "supabase_service_role_key": "service-key",
+        "email_provider_key": None,
+        "defaults": Defaults(),
+        "sources": [],
+    }
+    fields.update(kwargs)
+    return Config(**fields)
+
+
+def make_offer(run_id: int, source_id: int, **kwargs):
+    offer = {
+        "run_id": run_id,
+        "source_id": source_id,
+        "lender_name": "Example Bank A",
+        "category": "30Y fixed",
+        "rate": 6.25,
+        "apr": 6.35,
+        "points": 0.0,
+        "lender_fees": 1200.0,
+        "loan_amount": 600000,
+        "ltv": 80,
+        "fico": 760,
+        "state": "MA",
+        "term_months": 360,
+        "lock_days": 30,
+        "details_json": {"source": "test"},
+        "data_source": "real",
+    }
+    offer.update(kwargs)
+    return offer
@@ -0,0 +1,95 @@
+"""Alert matching: the rate-threshold index, filters and one alert per deal."""
+import random
+
+from mortgage_tracker.alerts import AlertIndex, Subscription, alert_candidates, match_batches
+
+
+def _sub(id, max_rate=None, category="30Y fixed", email=None, **kwargs):
+    return Subscription(id=id, email=email or f"user{id}@example.com", category=category, max_rate=max_rate, **kwargs)
+
+
+def _offer(rate, lender="Bank A", category="30Y fixed", apr=None, points=0.0, **kwargs):
+    return {"key": f"{lender}|{category}", "lender_name": lender, "category": category,
+            "rate": rate, "apr": apr, "points": points, **kwargs}
+
+
+def _ids(subs):
+    return sorted(s.id for s in subs)
+
+
+def test_rate_equal_to_the_limit_matches():
+    index = AlertIndex([_sub(1, 6.0), _sub(2, 6.125), _sub(3, 5.875), _sub(4, None)])
+    assert _ids(index.match(_offer(6.0))) == [1, 2, 4]
+    assert _ids(index.match(_offer(6.0001))) == [2, 4]
+    # Unknown rate: only subscriptions without a rate limit
+    assert _ids(index.match(_offer(None))) == [4]
+
+
+def test_category_and_lender_filters():
+    index = AlertIndex([
+        _sub(1, 6.5),
+        _sub(2, 6.5, lender_name="Bank A"),
+        _sub(3, 6.5, lender_name="Bank B"),
+        _sub(4, 6.5, category="15Y fixed"),
+    ])
+    assert _ids(index.match(_offer(6.0, lender="Bank A"))) == [1, 2]
+    assert _ids(index.match(_offer(6.0, lender="Bank C"))) == [1]
+    assert _ids(index.match(_offer(5.5, lender="Bank B", category="15Y fixed"))) == [4]
+
+
+def test_apr_and_points_limits_are_checked_after_the_bisect():
+    index = AlertIndex([_sub(1, 6.5, max_apr=6.6), _sub(2, 6.5, max_points=0.5)])
+    assert _ids(index.match(_offer(6.25, apr=6.7, points=0.0))) == [2]
+    assert _ids(index.match(_offer(6.25, apr=6.5, points=1.0))) == [1]
+    # An unknown APR never satisfies an APR limit
+    assert _ids(index.match(_offer(6.25, apr=None))) == [2]
+
+
+def test_a_repriced_offer_only_alerts_newly_satisfied_subscriptions():
+    index = AlertIndex([_sub(1, 6.5), _sub(2, 6.125), _sub(3, 5.0)])
+    # Was 6.25 (already met #1), now 6.0: only #2 is news
+    assert _ids(index.match(_offer(6.0, prev_rate=6.25, prev_apr=None))) == [2]
+    # Moved, but within what #1 was already told about
+    assert index.match(_offer(6.2, prev_rate=6.25, prev_apr=None)) == []
+
+
+def test_unchanged_offers_never_fire_again():
+    index = AlertIndex([_sub(1, 6.5)])
+    changes = {"added": [], "removed": [], "repriced": [], "unchanged": 40}
+    assert match_batches(index, alert_candidates(changes)) == []
+
+    changes = {"added": [_offer(6.0, lender="Bank N")], "repriced": [_offer(6.0, prev_rate=6.1)], "unchanged": 1}
+    (batch,) = match_batches(index, alert_candidates(changes))
+    assert [m["lender_name"] for m in batch["matches"]] == ["Bank N"]
+
+
+def test_one_batch_per_email_and_each_offer_listed_once():
+    index = AlertIndex([
+        _sub(1, 6.5, email="a@example.com"),
+        _sub(2, 6.25, email="a@example.com", lender_name="Bank A"),
+        _sub(3, 6.5, email="b@example.com"),
+    ])
+    batches = match_batches(index, [_offer(6.125), _offer(6.375, lender="Bank B")])
+    assert [b["email"] for b in batches] == ["a@example.com", "b@example.com"]
+    a = batches[0]["matches"]
+    assert [(m["lender_name"], sorted(m["subscription_ids"])) for m in a] == [("Bank A", [1, 2]), ("Bank B", [1])]
+
+
+def test_index_matches_a_scan_of_every_subscription():
+    rng = random.Random(7)
+    categories, lenders = ["30Y fixed", "15Y fixed"], ["Bank A", "Bank B", None]
+    subs = [
+        _sub(i, rng.choice([None, 5.75, 6.0, 6.25, 6.5]), category=rng.choice(categories),
+             max_apr=rng.choice([None, 6.4]), lender_name=rng.choice(lenders))
+        for i in range(300)
+    ]
+    index = AlertIndex(subs)
+    for _ in range(200):
+        offer = _offer(rng.choice([None, 5.75, 6.0, 6.1, 6.25, 7.0]), lender=rng.choice(lenders[:2]),
+                       category=rng.choice(categories), apr=rng.choice([None, 6.3, 6.5]))
+        expected = [
+            s.id for s in subs
+            if s.category == offer["category"] and s.lender_name in (None, offer["lender_name"])
+            and s.matches(offer["rate"], offer["apr"], offer["points"])
+        ]
+        assert _ids(index.match(offer)) == sorted(expected)
@@ -0,0 +1,96 @@
+"""Rate series anomaly detection: warm-up, thresholds, re-basing and shard merging."""
+import json
+
+from mortgage_tracker.anomaly import MAX_STRIKES, MIN_JUMP, WARMUP_RUNS, AnomalyDetector, SeriesState
+
+KEY = ("Bank A", "30Y fixed")
+
+
+def _offer(rate, lender="Bank A", category="30Y fixed"):
+    return {"lender_name": lender, "category": category, "rate": rate}
+
+
+def _run(detector, *rates):
+    """One run over ``rates`` of the Bank A series: (accepted, quarantined) rates."""
+    accepted, quarantined = detector.screen([_offer(r) for r in rates])
+    detector.commit()
+    return [o["rate"] for o in accepted], [q["rate"] for q in quarantined]
+
+
+def test_new_series_are_not_scored_during_warmup():
+    detector = AnomalyDetector()
+    for rate in (6.25, 6.25, 6.25):
+        assert _run(detector, rate) == ([rate], [])
+    assert detector.state[KEY].n == WARMUP_RUNS
+    # From the fourth run on the same jump is caught
+    assert _run(detector, 9.5) == ([], [9.5])
+
+
+def test_a_jump_in_the_warmup_is_accepted():
+    detector = AnomalyDetector({KEY: SeriesState(6.25, 0.0, WARMUP_RUNS - 1)})
+    assert _run(detector, 9.5) == ([9.5], [])
+
+
+def test_quarantine_needs_both_the_z_score_and_the_absolute_jump():
+    flat = AnomalyDetector({KEY: SeriesState(6.25, 0.0, 10)})
+    # Many deviations off a flat series, but less than MIN_JUMP: a real move
+    assert _run(flat, 6.25 + MIN_JUMP - 0.05) == ([6.25 + MIN_JUMP - 0.05], [])
+
+    noisy = AnomalyDetector({KEY: SeriesState(6.25, 1.0, 10)})
+    # A full point, but only one deviation of this noisy series
+    assert _run(noisy, 7.25) == ([7.25], [])
+
+    caught = AnomalyDetector({KEY: SeriesState(6.25, 0.0, 10)})
+    accepted, quarantined = caught.screen([_offer(9.25), _offer(6.3, lender="Bank B")])
+    assert [o["lender_name"] for o in accepted] == ["Bank B"]
+    assert quarantined == [{"lender": "Bank A", "category": "30Y fixed", "rate": 9.25,
+                            "expected_rate": 6.25, "jump": 3.0, "z": 60.0}]
+
+
+def test_quarantined_rates_do_not_move_the_baseline():
+    detector = AnomalyDetector({KEY: SeriesState(6.25, 0.0, 10)})
+    _run(detector, 9.25, 6.3)
+    series = detector.state[KEY]
+    assert series.n == 11 and series.strikes == 0
+    assert abs(series.mean - (6.25 + 0.2 * 0.05)) < 1e-9
+
+
+def test_strikes_rebase_a_series_that_really_moved():
+    detector = AnomalyDetector({KEY: SeriesState(6.25, 0.0, 10)})
+    for strike in range(1, MAX_STRIKES):
+        assert _run(detector, 9.25) == ([], [9.25])
+        assert detector.state[KEY].strikes == strike
+        assert detector.state[KEY].mean == 6.25
+
+    assert _run(detector, 9.25) == ([], [9.25])
+    series = detector.state[KEY]
+    assert (series.mean, series.var, series.n, series.strikes) == (9.25, 0.0, 1, 0)
+    # Back in warm-up at the new level
+    assert _run(detector, 9.3) == ([9.3], [])
+
+
+def test_an_accepted_run_clears_the_strikes():
+    detector = AnomalyDetector({KEY: SeriesState(6.25, 0.0, 10)})
+    _run(detector, 9.25)
+    _run(detector, 6.25)
+    assert detector.state[KEY].strikes == 0
+
+
+def test_shard_observations_merge_like_one_process():
+    def state():
+        return {KEY: SeriesState(6.25, 0.01, 10), ("Bank B", "15Y fixed"): SeriesState(5.5, 0.0, 10)}
+
+    offers = [_offer(6.3), _offer(9.9), _offer(5.6, "Bank B", "15Y fixed"), _offer(6.2), _offer(7.0, "Bank C")]
+    single = AnomalyDetector(state())
+    single.screen(offers)
+    expected = single.commit()
+
+    shards = [AnomalyDetector(state()) for _ in range(2)]
+    shards[0].screen(offers[:2])
+    shards[1].screen(offers[2:])
+    merger = AnomalyDetector(state())
+    for shard in shards:
+        # Handed over through the run_shards stats_json
+        merger.add_pending(json.loads(json.dumps(shard.pending())))
+    assert sorted(merger.commit(), key=str) == sorted(expected, key=str)
+    assert merger.pending() == {"observed": [], "rejected": []}
@@ -0,0 +1,129 @@
+"""sources.yaml validation, the compiled-catalog caches and merged catalogs."""
+import os
+from pathlib import Path
+
+import pytest
+
+from mortgage_tracker import config
+from mortgage_tracker.config import compile_source, load_sources, merge_catalogs
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def compiles(monkeypatch, tmp_path):
+    """Fresh caches (the disk one under tmp_path); counts real compilations."""
+    monkeypatch.setenv("CONFIG_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(config, "_compiled", {})
+    calls = []
+    real = config.compile_sources_file
+
+    def counting(text, path="sources.yaml"):
+        calls.append(path)
+        return real(text, path)
+
+    monkeypatch.setattr(config, "compile_sources_file", counting)
+    return calls
+
+
+def _catalog(path: Path, *names: str, rate: str = "https://example.com/rates") -> str:
+    path.write_text(
+        "defaults: {state: MA}\n"
+        "sources:\n"
+        + "".join(f"  - {{name: {n}, rate_url: '{rate}', parser_key: example_html_table, enabled: true}}\n"
+                  for n in names)
+    )
+    return str(path)
+
+
+@pytest.mark.parametrize("entry,message", [
+    ({"name": "A", "rate_ulr": "https://example.com"}, r"sources\[3\]: unknown key\(s\) rate_ulr"),
+    ({"rate_url": "https://example.com"}, "name is required"),
+    ({"name": "A", "enabled": "yes"}, r"sources\[3\] \(A\): enabled must be true or false"),
+    ({"name": "A", "rate_url": "example.com/rates"}, "rate_url must be an http"),
+    ({"name": "A", "parser_reliability": "great"}, "parser_reliability must be one of"),
+    ({"name": "A", "tags": "MA_local"}, "tags must be a list of strings"),
+    ({"name": "A", "schedule": "fortnightly"}, "schedule must be one of"),
+    ({"name": "A", "notes": ["a"]}, "notes must be a string"),
+    (["name", "A"], "expected a mapping"),
+])
+def test_invalid_entries_are_rejected_by_name(entry, message):
+    with pytest.raises(ValueError, match=message):
+        compile_source(entry, 3)
+
+
+def test_legacy_spellings_are_resolved():
+    source = compile_source({"name": "A", "url": "https://example.com/r", "method": "none", "enabled": True}, 0)
+    assert (source.rate_url, source.parser_key, source.skip_reason) == ("https://example.com/r", None, "no parser_key")
+
+
+def test_errors_name_the_file(tmp_path, compiles):
+    path = tmp_path / "sources.yaml"
+    path.write_text("sources:\n  - {name: A, colour: red}\n")
+    with pytest.raises(ValueError, match=r"sources\.yaml: sources\[0\]: unknown key\(s\) colour"):
+        load_sources(str(path))
+
+
+def test_duplicate_names_in_one_file_are_rejected(tmp_path, compiles):
+    with pytest.raises(ValueError, match="duplicate source name 'A'"):
+        load_sources(_catalog(tmp_path / "sources.yaml", "A", "B", "A"))
+
+
+def test_unchanged_file_is_compiled_once(tmp_path, compiles):
+    path = _catalog(tmp_path / "sources.yaml", "A", "B")
+    first = load_sources(path)
+    assert load_sources(path) == first
+    assert len(compiles) == 1
+
+    # A new process: the disk cache answers by content hash
+    config._compiled.clear()
+    assert load_sources(path) == first
+    assert len(compiles) == 1
+
+
+def test_touching_without_editing_does_not_recompile(tmp_path, compiles):
+    path = _catalog(tmp_path / "sources.yaml", "A")
+    load_sources(path)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    load_sources(path)
+    assert len(compiles) == 1
+
+
+def test_edit_invalidates_the_cache(tmp_path, compiles):
+    path = tmp_path / "sources.yaml"
+    _catalog(path, "A")
+    mtime = os.stat(path).st_mtime_ns
+    assert [s.name for s in load_sources(str(path))[1]] == ["A"]
+
+    # Same size: the new mtime sends it to the content hash, which differs
+    _catalog(path, "B")
+    os.utime(path, ns=(mtime, mtime + 10**9))
+    assert [s.name for s in load_sources(str(path))[1]] == ["B"]
+
+    _catalog(path, "B", "C")
+    assert [s.name for s in load_sources(str(path))[1]] == ["B", "C"]
+    assert len(compiles) == 3
+
+
+def test_merged_catalogs_keep_the_first_of_each_name(tmp_path, compiles):
+    first = _catalog(tmp_path / "a.yaml", "A", "B", rate="https://example.com/first")
+    second = tmp_path / "b.yaml"
+    second.write_text(
+        "defaults: {state: NH}\n"
+        "sources:\n"
+        "  - {name: B, rate_url: 'https://example.com/second', parser_key: example_html_table}\n"
+        "  - {name: C, rate_url: 'https://example.com/second', parser_key: example_html_table}\n"
+    )
+    defaults, sources = merge_catalogs([first, str(second)])
+    assert defaults == {"state": "MA"}
+    assert [(s.name, s.rate_url) for s in sources] == [
+        ("A", "https://example.com/first"),
+        ("B", "https://example.com/first"),
+        ("C", "https://example.com/second"),
+    ]
+
+
+def test_shipped_catalog_compiles(compiles):
+    _, sources = load_sources(str(REPO / "sources.yaml"))
+    assert sources and all(s.name for s in sources)
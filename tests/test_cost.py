@@ -0,0 +1,77 @@
+"""Cost grids: payments, break-even against the cheapest upfront offer, and the engine's cache."""
+import math
+
+import numpy as np
+
+from mortgage_tracker.cost import CostEngine, cost_grid
+
+
+def _offer(rate, lender="Bank A", category="30Y fixed", points=0.0, fees=0.0):
+    return {"lender_name": lender, "category": category, "rate": rate, "points": points, "lender_fees": fees}
+
+
+def _payment(principal, annual_rate, months):
+    r = annual_rate / 1200.0
+    return principal * r / (1 - (1 + r) ** -months)
+
+
+def test_payment_and_interest_follow_the_amortization_formula():
+    grid = cost_grid([_offer(6.0), _offer(5.5, category="15Y fixed")], (300000,), (60, 360))
+    assert abs(grid.monthly_payment[0, 0] - 1798.65) < 0.01
+    assert abs(grid.monthly_payment[1, 0] - _payment(300000, 5.5, 180)) < 1e-6
+    # Over the whole term the loan is repaid: interest is every payment less the principal
+    assert abs(grid.interest[0, 0, 1] - (360 * grid.monthly_payment[0, 0] - 300000)) < 1e-4
+    # A horizon past the term stops at the term
+    assert abs(grid.interest[1, 0, 1] - (180 * grid.monthly_payment[1, 0] - 300000)) < 1e-4
+
+
+def test_upfront_and_total_cost():
+    grid = cost_grid([_offer(6.0, points=1.0, fees=1500)], (400000,), (84,))
+    assert grid.upfront[0, 0] == 5500
+    assert grid.total_cost[0, 0, 0] == grid.upfront[0, 0] + grid.interest[0, 0, 0]
+
+
+def test_break_even_against_the_cheapest_upfront_offer():
+    offers = [
+        _offer(6.5),                                 # the baseline: nothing upfront
+        _offer(6.0, lender="Bank B", points=1.0),    # pays points for a lower payment
+        _offer(6.75, lender="Bank C", fees=900),     # pays more upfront and monthly
+        _offer(6.75, lender="Bank D", category="15Y fixed", fees=900),
+    ]
+    grid = cost_grid(offers, (300000,), (360,))
+    extra = 3000
+    saving = _payment(300000, 6.5, 360) - _payment(300000, 6.0, 360)
+    assert grid.break_even_months[:, 0].tolist() == [0, math.ceil(extra / saving), math.inf, 0]
+
+
+def test_offers_without_a_rate_get_nan():
+    grid = cost_grid([_offer(None), _offer(6.0, lender="Bank B")], (300000,), (60,))
+    assert np.isnan(grid.monthly_payment[0, 0]) and np.isnan(grid.total_cost[0, 0, 0])
+    assert grid.break_even_months[1, 0] == 0
+
+
+def test_engine_caches_per_run_and_offer_set():
+    offers = [_offer(6.0), _offer(6.25, lender="Bank B"), _offer(5.5, lender="Bank C", category="15Y fixed")]
+    engine = CostEngine()
+    grid = engine.grid(1, offers)
+    assert engine.grid(1, [dict(o) for o in offers]) is grid
+
+    subset = engine.grid(1, offers[:2])
+    assert subset is not grid and len(subset.offers) == 2
+    repriced = engine.grid(1, [offers[0], _offer(6.125, lender="Bank B"), offers[2]])
+    assert repriced is not grid and repriced.offers[1]["rate"] == 6.125
+    assert engine.grid(2, offers) is not grid
+
+    rows = engine.compare(1, offers[:2], 450000, 84)
+    assert [r["lender_name"] for r in rows] == ["Bank A", "Bank B"]
+
+
+def test_engine_evicts_the_least_recently_used_grid():
+    engine = CostEngine(max_entries=2)
+    offers = [_offer(6.0)]
+    first = engine.grid(1, offers)
+    second = engine.grid(2, offers)
+    assert engine.grid(1, offers) is first
+    engine.grid(3, offers)
+    assert engine.grid(1, offers) is first
+    assert engine.grid(2, offers) is not second
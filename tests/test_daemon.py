@@ -0,0 +1,116 @@
+"""The resident collector's schedule and its recovery from failed runs."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from mortgage_tracker import daemon, main
+
+from conftest import make_source
+
+
+class FakeWriter:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def catalog(monkeypatch, tmp_path):
+    path = tmp_path / "sources.yaml"
+    path.write_text(
+        "sources:\n"
+        "  - {name: Hourly, org_type: aggregator, rate_url: 'https://example.com/a', parser_key: example_html_table, enabled: true}\n"
+        "  - {name: Daily, org_type: bank, rate_url: 'https://example.com/b', parser_key: example_html_table, enabled: true}\n"
+    )
+    monkeypatch.setenv("SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-key")
+    monkeypatch.delenv("WRITER", raising=False)
+    writers = []
+
+    def make_writer(cfg):
+        writers.append(FakeWriter())
+        return writers[-1]
+
+    monkeypatch.setattr(main, "make_writer", make_writer)
+    monkeypatch.setattr(daemon, "make_writer", make_writer)
+    return str(path), writers
+
+
+def test_failed_run_closes_the_writer_and_opens_a_fresh_one(catalog, monkeypatch):
+    path, writers = catalog
+
+    def failing_run(**kwargs):
+        raise ConnectionError("server closed the connection")
+
+    monkeypatch.setattr(daemon, "run_collector", failing_run)
+    assert daemon.run_daemon(sources_path=path, tick=1, max_runs=1) == 1
+    first, second = writers
+    assert first.closed
+    # The replacement is closed on the way out
+    assert second.closed
+
+
+def test_schedule_is_due_an_interval_after_collection():
+    hourly = make_source("Hourly", org_type="aggregator")
+    daily = make_source("Daily")
+    schedule = daemon.Schedule()
+    assert schedule.due([hourly, daily], 0.0) == [hourly, daily]
+
+    schedule.mark([hourly, daily], 0.0)
+    assert schedule.due([hourly, daily], 3599.0) == []
+    assert schedule.due([hourly, daily], 3600.0) == [hourly]
+    assert schedule.next_due_in([hourly, daily], 600.0) == 3000.0
+
+    schedule.defer("Daily", 5000.0)
+    assert schedule.due([hourly, daily], 5000.0) == [hourly, daily]
+    schedule.forget(["Hourly"])
+    assert schedule.next_due_in([hourly], 1.0) == 0.0
+
+
+def _record_runs(monkeypatch, *results):
+    """run_collector stand-in: records each run's due sources and plays back ``results``."""
+    seen, results = [], list(results)
+
+    def run(**kwargs):
+        seen.append(sorted(s.name for s in kwargs["scheduled"]))
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(daemon, "run_collector", run)
+    return seen
+
+
+def test_only_the_collected_sources_are_marked(catalog, monkeypatch):
+    path, _ = catalog
+    seen = _record_runs(
+        monkeypatch,
+        {"collected": ["Hourly"], "deferred": {}},
+        {"collected": ["Daily"], "deferred": {}},
+    )
+    assert daemon.run_daemon(sources_path=path, tick=1, max_runs=2) == 2
+    assert seen == [["Daily", "Hourly"], ["Daily"]]
+
+
+def test_a_failed_run_marks_nothing(catalog, monkeypatch):
+    path, _ = catalog
+    seen = _record_runs(monkeypatch, ConnectionError("server closed the connection"),
+                        {"collected": ["Daily", "Hourly"], "deferred": {}})
+    assert daemon.run_daemon(sources_path=path, tick=1, max_runs=2) == 2
+    assert seen == [["Daily", "Hourly"], ["Daily", "Hourly"]]
+
+
+def test_a_deferred_source_comes_due_at_its_probe(catalog, monkeypatch):
+    path, _ = catalog
+    probe_at = datetime.now(timezone.utc) + timedelta(seconds=1.5)
+    seen = _record_runs(
+        monkeypatch,
+        {"collected": ["Hourly"], "deferred": {"Daily": probe_at}},
+        {"collected": ["Daily"], "deferred": {}},
+    )
+    assert daemon.run_daemon(sources_path=path, tick=1, max_runs=2) == 2
+    assert seen == [["Daily", "Hourly"], ["Daily"]]
+    assert datetime.now(timezone.utc) >= probe_at
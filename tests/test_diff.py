@@ -0,0 +1,72 @@
+"""Offer identity, the run-to-run change set and change-only storage."""
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from mortgage_tracker.diff import changed_offers, diff_offers, offer_hash
+
+
+def _offer(lender="Bank A", category="30Y fixed", rate=6.25, apr=6.35, **kwargs):
+    return {"lender_name": lender, "category": category, "loan_amount": 600000, "ltv": 80,
+            "fico": 760, "lock_days": 30, "points": 0.0, "rate": rate, "apr": apr, **kwargs}
+
+
+def test_offer_hash_ignores_how_numbers_are_spelled():
+    assert offer_hash(_offer()) == offer_hash(_offer(loan_amount="600000", points=Decimal("0.00")))
+    assert offer_hash(_offer()) != offer_hash(_offer(points=0.5))
+    # Price is not part of the identity
+    assert offer_hash(_offer()) == offer_hash(_offer(rate=7.0))
+
+
+def test_diff_offers_sorts_offers_into_added_removed_and_repriced():
+    previous = [_offer("Bank A"), _offer("Bank B"), _offer("Bank C", rate=6.0)]
+    current = [_offer("Bank A"), _offer("Bank C", rate=5.875), _offer("Bank D")]
+
+    changes = diff_offers(previous, current)
+
+    assert [r["lender_name"] for r in changes["added"]] == ["Bank D"]
+    assert [r["lender_name"] for r in changes["removed"]] == ["Bank B"]
+    (repriced,) = changes["repriced"]
+    assert repriced["lender_name"] == "Bank C"
+    assert (repriced["prev_rate"], repriced["rate"], repriced["rate_delta"]) == (6.0, 5.875, -0.125)
+    assert repriced["apr_delta"] == 0.0
+    assert changes["unchanged"] == 1
+
+
+def test_diff_offers_ignores_noise_and_sample_offers():
+    changes = diff_offers(
+        [_offer(rate=6.25), _offer("Demo", data_source="sample")],
+        [_offer(rate=6.2501), _offer("Other demo", data_source="sample")],
+    )
+    assert changes == {"added": [], "removed": [], "repriced": [], "unchanged": 1}
+
+
+def test_diff_offers_reports_an_apr_that_appears():
+    (repriced,) = diff_offers([_offer(apr=None)], [_offer(apr=6.4)])["repriced"]
+    assert repriced["prev_apr"] is None and repriced["apr_delta"] is None
+
+
+def _stored(offer, age_days=1.0, **changes):
+    created = datetime.now(timezone.utc) - timedelta(days=age_days)
+    return {"offer_key": offer_hash(offer), "created_at": created.isoformat(), **offer, **changes}
+
+
+def test_changed_offers_writes_new_and_repriced_offers_only():
+    same, repriced, new = _offer("Bank A"), _offer("Bank B"), _offer("Bank C")
+    stored = [_stored(same, rate=Decimal("6.250")), _stored(repriced, rate=6.5)]
+
+    changed = changed_offers([same, repriced, new], stored)
+
+    assert [o["lender_name"] for o in changed] == ["Bank B", "Bank C"]
+    # Every offer gets its key, written or not
+    assert same["offer_key"] == offer_hash(same)
+
+
+def test_changed_offers_rewrites_rows_older_than_the_keyframe():
+    offer = _offer()
+    assert changed_offers([offer], [_stored(offer, age_days=8)], keyframe_days=7) == [offer]
+    assert changed_offers([offer], [_stored(offer, age_days=6)], keyframe_days=7) == []
+
+
+def test_changed_offers_compares_text_fields_exactly():
+    offer = _offer(state="MA")
+    assert changed_offers([offer], [_stored(offer, state="NH")]) == [offer]
@@ -0,0 +1,270 @@
+"""Alert delivery pipeline against an in-process SMTP sink."""
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+
+import pytest
+
+from mortgage_tracker import emailer
+from mortgage_tracker.emailer import DeliveryPipeline, Message, RenderCache, SmtpProvider, deliver_pending
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode("ascii") + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self.reply("220 sink ESMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode("ascii", "replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 sink")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.split(":", 1)[1].strip().strip("<>")
+                code = sink.refusal(address)
+                if code:
+                    self.reply(f"{code} refused by the sink")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data += chunk
+                sink.accept(recipients, data)
+                self.reply("250 OK queued")
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class SmtpSink:
+    """
+    Records delivered messages. ``delay`` holds each DATA for a while, to
+    observe how many messages are in flight; ``refuse`` maps a recipient
+    to the RCPT reply codes it gets before it is accepted.
+    """
+
+    def __init__(self, delay: float = 0.0, refuse=None):
+        self.delay = delay
+        self.refuse = {k: list(v) for k, v in (refuse or {}).items()}
+        self.lock = threading.Lock()
+        self.messages = []
+        self.accepted_at = []
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SmtpHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def refusal(self, address: str):
+        with self.lock:
+            codes = self.refuse.get(address)
+            return codes.pop(0) if codes else None
+
+    def accept(self, recipients, data: bytes) -> None:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+            self.messages.append((recipients, message_from_bytes(data)))
+            self.accepted_at.append(time.monotonic())
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def sink_factory():
+    sinks, providers = [], []
+
+    def make(**kwargs):
+        sink = SmtpSink(**kwargs)
+        provider = SmtpProvider("127.0.0.1", sink.port, sender="alerts@example.com", starttls=False, timeout=5)
+        sinks.append(sink)
+        providers.append(provider)
+        return sink, provider
+
+    yield make
+    for provider in providers:
+        provider.close()
+    for sink in sinks:
+        sink.close()
+
+
+@pytest.fixture
+def pipeline_factory():
+    pipelines = []
+
+    def make(provider, **kwargs):
+        pipelines.append(DeliveryPipeline(provider, **kwargs))
+        return pipelines[-1]
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.close()
+
+
+def _message(to: str, subject: str = "Rate alert") -> Message:
+    return Message(to, subject, "text body", "<p>html body</p>")
+
+
+class FakeQueue:
+    """The alert_batches functions deliver_pending calls, over an in-memory list."""
+
+    def __init__(self, batches):
+        self.pending = list(batches)
+        self.finished = {}
+
+    def call(self, fn, params=None):
+        if fn == "claim_alert_batches":
+            claimed, self.pending = self.pending[:params["p_limit"]], self.pending[params["p_limit"]:]
+            return [{**batch, "claimed_until": "2026-01-01T00:05:00+00:00"} for batch in claimed]
+        if fn == "finish_alert_batch":
+            self.finished[params["p_id"]] = params
+            return True
+        raise AssertionError(f"unexpected call {fn}")
+
+
+def _match(lender: str, rate: float, subscription_id: int):
+    return {"subscription_id": subscription_id, "category": "30Y fixed", "lender_name": lender,
+            "rate": rate, "apr": rate + 0.1, "points": 0.0, "prev_rate": None}
+
+
+def test_templates_render_once_per_unique_content(sink_factory, pipeline_factory, monkeypatch):
+    sink, provider = sink_factory()
+    rendered = []
+    real_render = emailer.render_alert
+
+    def counting_render(matches):
+        rendered.append(matches)
+        return real_render(matches)
+
+    monkeypatch.setattr(emailer, "render_alert", counting_render)
+    # Four subscribers, two distinct contents (subscription ids do not count)
+    queue = FakeQueue([
+        {"id": i, "email": f"user{i}@example.com", "attempts": 1,
+         "matches": [_match("Bank A" if i % 2 else "Bank B", 6.25, subscription_id=100 + i)]}
+        for i in range(4)
+    ])
+    cache = RenderCache()
+
+    stats = deliver_pending(queue, pipeline_factory(provider, concurrency=2, rate_limit=0), cache=cache)
+
+    assert len(rendered) == 2
+    assert (cache.misses, cache.hits) == (2, 2)
+    assert (stats.claimed, stats.sent, stats.failed) == (4, 4, 0)
+    assert all(params["p_sent"] for params in queue.finished.values())
+    assert sorted(r[0] for r, _ in sink.messages) == [f"user{i}@example.com" for i in range(4)]
+    subjects = {m["To"]: m["Subject"] for _, m in sink.messages}
+    assert subjects["user1@example.com"] == "Rate alert: 30Y fixed at 6.250% from Bank A"
+
+
+def test_concurrency_is_bounded(sink_factory, pipeline_factory):
+    sink, provider = sink_factory(delay=0.15)
+    results = pipeline_factory(provider, concurrency=3, rate_limit=0).deliver(
+        [_message(f"user{i}@example.com") for i in range(9)]
+    )
+    assert all(r.sent for r in results)
+    assert sink.max_in_flight == 3
+    # One connection per worker thread, reused across its messages
+    assert sink.connections == 3
+
+
+def test_connections_are_reused_across_rounds(sink_factory, pipeline_factory):
+    sink, provider = sink_factory(delay=0.01)
+    queue = FakeQueue([
+        {"id": i, "email": f"user{i}@example.com", "attempts": 1, "matches": [_match("Bank A", 6.25, i)]}
+        for i in range(40)
+    ])
+    stats = deliver_pending(queue, pipeline_factory(provider, concurrency=4, rate_limit=0), batch_size=5)
+    assert (stats.claimed, stats.sent) == (40, 40)
+    # Eight rounds, still one connection per worker thread
+    assert sink.connections <= 4
+
+
+def test_transient_4xx_is_retried(sink_factory, pipeline_factory):
+    sink, provider = sink_factory(refuse={"flaky@example.com": [451], "gone@example.com": [550]})
+    results = pipeline_factory(provider, concurrency=1, rate_limit=0, retries=3).deliver([
+        _message("flaky@example.com"),
+        _message("gone@example.com"),
+    ])
+    flaky, gone = results
+    assert flaky.sent and flaky.attempts == 2
+    # Permanent: one attempt, not handed back for a retry
+    assert not gone.sent and gone.attempts == 1 and not gone.transient
+    assert [r for r, _ in sink.messages] == [["flaky@example.com"]]
+
+
+def test_rate_limit_is_respected(sink_factory, pipeline_factory):
+    sink, provider = sink_factory()
+    rate = 20.0
+    started = time.monotonic()
+    results = pipeline_factory(provider, concurrency=4, rate_limit=rate).deliver(
+        [_message(f"user{i}@example.com") for i in range(30)]
+    )
+    assert all(r.sent for r in results)
+    # A full bucket (rate tokens) goes at once; the other 10 wait for refills
+    assert time.monotonic() - started >= (30 - rate) / rate * 0.9
+    # Token bucket: any stretch of messages fits in one bucket plus its refills (one of slack for timing)
+    times = sorted(sink.accepted_at)
+    for i in range(len(times)):
+        for j in range(i, len(times)):
+            assert j - i + 1 <= rate + rate * (times[j] - times[i]) + 1
+
+
+def test_a_lost_lease_cannot_overwrite_the_outcome(pg, pg_url):
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    run_id = pg.execute("insert into public.runs (status, run_type) values ('success', 'real') returning id").fetchone()["id"]
+    pg.execute(
+        "insert into public.alert_batches (run_id, email, matches) values (%s, 'user@example.com', '[]'::jsonb)",
+        (run_id,),
+    )
+    slow, fast = PostgresWriter(pg_url), PostgresWriter(pg_url)
+    try:
+        (first,) = slow.call("claim_alert_batches", {"p_limit": 1})
+        pg.execute("update public.alert_batches set claimed_until = now() - interval '1 second'")
+        (again,) = fast.call("claim_alert_batches", {"p_limit": 1})
+        assert again["attempts"] == 2
+
+        finish = {"p_id": first["id"], "p_error": None, "p_retry_after_seconds": None}
+        assert fast.call("finish_alert_batch", {**finish, "p_claimed_until": again["claimed_until"],
+                                                "p_sent": True}) is True
+        # The slow worker gave up on it; too late to mark it failed
+        assert slow.call("finish_alert_batch", {**finish, "p_claimed_until": first["claimed_until"],
+                                                "p_sent": False, "p_error": "timeout"}) is False
+    finally:
+        slow.close()
+        fast.close()
+    row = pg.execute("select status, last_error from public.alert_batches").fetchone()
+    assert row == {"status": "sent", "last_error": None}
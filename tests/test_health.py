@@ -0,0 +1,152 @@
+"""Source back-off (migration 020): when sources back off, and runs with every source deferred."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from mortgage_tracker.health import BACKOFF_BASE, BACKOFF_MAX, PROBE_SLACK, HealthTracker, SourceHealth
+from mortgage_tracker.main import merge_run, run_collector, run_coordinator
+
+from conftest import make_offer, make_source
+
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_three_misses_back_a_source_off():
+    tracker = HealthTracker()
+    for outcome in ("empty", "error"):
+        tracker.record("Quiet", outcome, 120.0, 0, now=NOW)
+    assert tracker.state["Quiet"].backoff == 0
+
+    tracker.record("Quiet", "empty", 60.0, 0, now=NOW)
+    health = tracker.state["Quiet"]
+    assert (health.misses, health.backoff) == (3, 1)
+    assert health.next_probe_at == NOW + timedelta(seconds=BACKOFF_BASE)
+    assert (health.empties, health.errors) == (2, 1)
+    assert [d["source"] for d in tracker.decisions["backed_off"]] == ["Quiet"]
+
+
+def test_each_missed_probe_doubles_the_wait_up_to_the_cap():
+    tracker = HealthTracker({"Quiet": SourceHealth(misses=3, backoff=1)})
+    waits = []
+    for _ in range(6):
+        tracker.record("Quiet", "error", 10.0, 0, now=NOW)
+        waits.append((tracker.state["Quiet"].next_probe_at - NOW).total_seconds())
+    assert waits == [BACKOFF_BASE * 2, BACKOFF_BASE * 4, BACKOFF_BASE * 8, BACKOFF_BASE * 16,
+                     BACKOFF_MAX, BACKOFF_MAX]
+
+
+def test_a_probe_with_offers_promotes_the_source():
+    tracker = HealthTracker({"Quiet": SourceHealth(misses=5, backoff=2, next_probe_at=NOW, latency_ms=100.0)})
+    tracker.record("Quiet", "success", 200.0, 12, now=NOW)
+    health = tracker.state["Quiet"]
+    assert (health.misses, health.backoff, health.next_probe_at) == (0, 0, None)
+    assert health.last_success_at == NOW and health.offers_total == 12
+    assert 100.0 < health.latency_ms < 200.0
+    assert tracker.decisions["promoted"] == [{"source": "Quiet", "misses": 5, "offers": 12}]
+
+
+def test_unknown_outcomes_are_refused():
+    with pytest.raises(ValueError, match="outcome"):
+        HealthTracker().record("Quiet", "maybe", 1.0, 0)
+
+
+def test_split_defers_only_backed_off_sources_not_yet_due():
+    waiting, due, early, fresh = (make_source(n) for n in ("Waiting", "Due", "Early", "Fresh"))
+    disabled = make_source("Disabled", enabled=False)
+    tracker = HealthTracker({
+        "Waiting": SourceHealth(misses=3, backoff=1, next_probe_at=NOW + timedelta(days=1)),
+        "Due": SourceHealth(misses=3, backoff=1, next_probe_at=NOW - timedelta(minutes=1)),
+        # A run that starts a little early still probes
+        "Early": SourceHealth(misses=3, backoff=1, next_probe_at=NOW + timedelta(seconds=PROBE_SLACK - 60)),
+        "Disabled": SourceHealth(misses=3, backoff=1, next_probe_at=NOW + timedelta(days=1)),
+    })
+
+    collect, deferred = tracker.split([waiting, due, early, fresh, disabled], now=NOW)
+
+    assert deferred == [waiting]
+    assert collect == [due, early, fresh, disabled]
+    assert [d["source"] for d in tracker.decisions["probed"]] == ["Due", "Early"]
+
+
+@pytest.fixture
+def backed_off(pg, pg_url, monkeypatch, tmp_path):
+    """A published run, then a catalog whose every source is backed off for two more days."""
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    catalog = tmp_path / "sources.yaml"
+    catalog.write_text(
+        "sources:\n"
+        "  - {name: Quiet A, org_type: bank, rate_url: 'http://127.0.0.1:9/a', parser_key: example_html_table, enabled: true}\n"
+        "  - {name: Quiet B, org_type: bank, rate_url: 'http://127.0.0.1:9/b', parser_key: example_html_table, enabled: true}\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WRITER", "postgres")
+    monkeypatch.setenv("DATABASE_URL", pg_url)
+    monkeypatch.delenv("SOURCE_BACKOFF", raising=False)
+
+    writer = PostgresWriter(pg_url)
+    try:
+        run_id = writer.create_run(run_type="real")
+        source_id = writer.upsert_source(make_source("Quiet A"))
+        writer.insert_offers([make_offer(run_id, source_id)])
+        writer.finish_run(run_id, status="success", stats={"sources_success": 1})
+    finally:
+        writer.close()
+    pg.execute(
+        "insert into public.source_health (source_name, misses, backoff, next_probe_at) "
+        "select name, 3, 1, now() + interval '2 days' from unnest(array['Quiet A', 'Quiet B']) as name"
+    )
+    return str(catalog), _published(pg)
+
+
+def _published(pg):
+    return (
+        pg.execute("select * from public.latest_rates order by id").fetchall(),
+        pg.execute("select * from public.latest_run_summary").fetchall(),
+    )
+
+
+def _status(pg, run_id):
+    return pg.execute("select status from public.runs where id = %s", (run_id,)).fetchone()["status"]
+
+
+def test_fully_deferred_run_is_skipped_and_not_published(pg, backed_off):
+    catalog, before = backed_off
+    result = run_collector(sources_path=catalog)
+
+    assert result["status"] == "skipped"
+    assert result["collected"] == [] and sorted(result["deferred"]) == ["Quiet A", "Quiet B"]
+    assert result["stats"]["sources_skipped"] == 2
+    assert _status(pg, result["run_id"]) == "skipped"
+    assert _published(pg) == before
+
+
+def test_fully_deferred_shards_merge_to_a_skipped_run(pg, backed_off):
+    catalog, before = backed_off
+    run_id = pg.execute("insert into public.runs (status, run_type) values ('started', 'real') returning id").fetchone()["id"]
+    for index in range(2):
+        assert run_collector(sources_path=catalog, shard=(index, 2), run_id=run_id)["status"] == "skipped"
+
+    assert merge_run(run_id, sources_path=catalog)["status"] == "skipped"
+    assert _status(pg, run_id) == "skipped"
+    assert _published(pg) == before
+
+
+def test_missing_shard_of_a_deferred_run_fails_it(pg, backed_off):
+    catalog, before = backed_off
+    run_id = pg.execute("insert into public.runs (status, run_type) values ('started', 'real') returning id").fetchone()["id"]
+    run_collector(sources_path=catalog, shard=(0, 2), run_id=run_id)
+
+    # The missing shard's sources were never looked at, let alone deferred
+    assert merge_run(run_id, sources_path=catalog)["status"] == "failed"
+    assert _published(pg) == before
+
+
+def test_coordinator_with_nothing_to_queue_skips_the_run(pg, backed_off):
+    catalog, before = backed_off
+    result = run_coordinator(sources_path=catalog, timeout=5, poll_interval=0.1)
+
+    assert result["status"] == "skipped"
+    assert pg.execute("select count(*) as n from public.run_jobs").fetchone()["n"] == 0
+    assert _published(pg) == before
@@ -0,0 +1,115 @@
+"""PostgresWriter COPY loads (against TEST_DATABASE_URL) and writer selection."""
+import sys
+from decimal import Decimal
+
+import pytest
+
+from mortgage_tracker import supabase_client
+from mortgage_tracker.config import load_config
+from mortgage_tracker.supabase_client import SupabaseWriter, make_writer
+
+from conftest import make_config, make_offer, make_source
+
+
+@pytest.fixture
+def rest_client(monkeypatch):
+    """SupabaseWriter without a network: create_client returns a placeholder."""
+    monkeypatch.setattr(supabase_client, "create_client", lambda url, key: object())
+
+
+@pytest.mark.parametrize("copy_format", ["binary", "csv"])
+def test_copy_loads_a_run(pg, pg_url, copy_format):
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    writer = PostgresWriter(pg_url, copy_format=copy_format)
+    try:
+        run_id = writer.create_run(run_type="real")
+        source_id = writer.upsert_source(make_source())
+        writer.insert_snapshot({
+            "run_id": run_id,
+            "source_id": source_id,
+            "http_status": 200,
+            "raw_text": 'a "quoted", comma\nand newline',
+            "raw_json": None,
+            "parse_status": "success",
+            "parse_error": None,
+        })
+        writer.insert_offers([
+            make_offer(run_id, source_id),
+            make_offer(run_id, source_id, lender_name='Bank, "B"', category="15Y fixed", rate=5.5,
+                       apr=None, lender_fees=None, details_json={"note": "a,b \"c\""}),
+        ])
+        writer.finish_run(run_id, status="success", stats={"sources_success": 1})
+    finally:
+        writer.close()
+
+    run = pg.execute("select status, stats_json from public.runs where id = %s", (run_id,)).fetchone()
+    assert run == {"status": "success", "stats_json": {"sources_success": 1}}
+    snapshot = pg.execute("select raw_text, http_status from public.rate_snapshots").fetchone()
+    assert snapshot == {"raw_text": 'a "quoted", comma\nand newline', "http_status": 200}
+    offers = pg.execute(
+        "select lender_name, rate, apr, lender_fees, details_json from public.offers_normalized order by rate desc"
+    ).fetchall()
+    assert offers == [
+        {"lender_name": "Example Bank A", "rate": Decimal("6.25"), "apr": Decimal("6.35"),
+         "lender_fees": Decimal("1200.0"), "details_json": {"source": "test"}},
+        {"lender_name": 'Bank, "B"', "rate": Decimal("5.5"), "apr": None,
+         "lender_fees": None, "details_json": {"note": "a,b \"c\""}},
+    ]
+    # Published in the same transaction
+    assert pg.execute("select count(*) as n from public.latest_rates").fetchone()["n"] == 2
+
+
+@pytest.mark.parametrize("copy_format", ["binary", "csv"])
+def test_failed_load_rolls_back_the_whole_run(pg, pg_url, copy_format):
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    writer = PostgresWriter(pg_url, copy_format=copy_format)
+    try:
+        run_id = writer.create_run(run_type="real")
+        source_id = writer.upsert_source(make_source())
+        writer.insert_snapshot({
+            "run_id": run_id, "source_id": source_id, "http_status": 200,
+            "raw_text": "<html></html>", "raw_json": None, "parse_status": "success", "parse_error": None,
+        })
+        # The second offer points at a source that does not exist
+        writer.insert_offers([make_offer(run_id, source_id), make_offer(run_id, source_id + 999)])
+        with pytest.raises(Exception):
+            writer.finish_run(run_id, status="success", stats={})
+    finally:
+        writer.close()
+
+    assert pg.execute("select count(*) as n from public.rate_snapshots").fetchone()["n"] == 0
+    assert pg.execute("select count(*) as n from public.offers_normalized").fetchone()["n"] == 0
+    assert pg.execute("select count(*) as n from public.latest_rates").fetchone()["n"] == 0
+    run = pg.execute("select status, error_text from public.runs where id = %s", (run_id,)).fetchone()
+    assert run["status"] == "failed"
+    assert run["error_text"].startswith("bulk load failed")
+
+
+def test_rest_writer_is_the_default_even_with_database_url(rest_client):
+    cfg = make_config(database_url="postgresql://localhost/postgres")
+    assert isinstance(make_writer(cfg), SupabaseWriter)
+
+
+def test_load_config_keeps_rest_when_only_database_url_is_set(monkeypatch, tmp_path):
+    catalog = tmp_path / "sources.yaml"
+    catalog.write_text("sources: []\n")
+    monkeypatch.setenv("SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-key")
+    monkeypatch.setenv("DATABASE_URL", "postgresql://localhost/postgres")
+    monkeypatch.delenv("WRITER", raising=False)
+    assert load_config(str(catalog)).writer == "rest"
+
+    monkeypatch.setenv("WRITER", "postgres")
+    monkeypatch.delenv("DATABASE_URL")
+    with pytest.raises(ValueError, match="WRITER=postgres requires DATABASE_URL"):
+        load_config(str(catalog))
+
+
+def test_postgres_writer_without_psycopg_fails_clearly(monkeypatch):
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    monkeypatch.setitem(sys.modules, "psycopg", None)
+    with pytest.raises(ImportError, match=r"pip install \.\[postgres\]"):
+        PostgresWriter("postgresql://localhost/postgres")
@@ -0,0 +1,63 @@
+"""TopNRanker against the sort it replaced."""
+import math
+import random
+
+import pytest
+
+from mortgage_tracker.rank import TopNRanker, safe_float, top_n_per_category
+
+CATEGORIES = ("30Y fixed", "15Y fixed", "5/6 ARM")
+
+
+def _sorted_top_n(rows, n):
+    """The old top_n_per_category: a stable sort on (rate, apr), missing values last."""
+    def value(v):
+        # The old sort kept NaN as a float, which left its order undefined; it ranks last now
+        f = safe_float(v, None)
+        return 9999.0 if f is None else f
+
+    grouped = {}
+    for r in rows:
+        grouped.setdefault(r.get("category"), []).append(r)
+    return {
+        cat: sorted(items, key=lambda x: (value(x.get("rate")), value(x.get("apr"))))[:n]
+        for cat, items in grouped.items()
+    }
+
+
+def _rows(seed, count=200):
+    rng = random.Random(seed)
+    # Few distinct values, so ties are common
+    rates = [6.0, 6.125, 6.25, "6.25", None, math.nan, "n/a"]
+    aprs = [6.1, 6.2, None, math.nan]
+    return [
+        {"id": i, "category": rng.choice(CATEGORIES), "rate": rng.choice(rates), "apr": rng.choice(aprs)}
+        for i in range(count)
+    ]
+
+
+def _ids(result):
+    return {cat: [r["id"] for r in rows] for cat, rows in result.items()}
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("n", [1, 3, 10])
+def test_ranker_matches_the_sort(seed, n):
+    rows = _rows(seed)
+    assert _ids(top_n_per_category(rows, n)) == _ids(_sorted_top_n(rows, n))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_merged_rankers_match_the_sort(seed):
+    rows = _rows(seed)
+    split = random.Random(seed).randrange(len(rows))
+    first = TopNRanker(5).add_many(rows[:split])
+    second = TopNRanker(5).add_many(rows[split:])
+    assert _ids(first.merge(second).result()) == _ids(_sorted_top_n(rows, 5))
+
+
+def test_missing_and_nan_rates_rank_last():
+    rows = [{"id": 1, "category": "30Y fixed", "rate": math.nan, "apr": 6.0},
+            {"id": 2, "category": "30Y fixed", "rate": None, "apr": 5.0},
+            {"id": 3, "category": "30Y fixed", "rate": 7.5, "apr": None}]
+    assert _ids(top_n_per_category(rows, 3)) == {"30Y fixed": [3, 2, 1]}
@@ -0,0 +1,155 @@
+"""The run_jobs work queue (migration 018) against TEST_DATABASE_URL."""
+import json
+import threading
+
+import pytest
+
+from mortgage_tracker.main import run_worker
+
+from conftest import make_offer, make_source
+
+
+def _open_run(pg, jobs: int, max_attempts: int = 3) -> int:
+    run_id = pg.execute("insert into public.runs (status, run_type) values ('started', 'real') returning id").fetchone()["id"]
+    pg.execute(
+        "select public.enqueue_run_jobs(%s, %s::jsonb, %s)",
+        (run_id, _jobs_json(jobs), max_attempts),
+    )
+    return run_id
+
+
+def _jobs_json(count: int) -> str:
+    return json.dumps([
+        {"source_name": f"Source {i}", "source": make_source(f"Source {i}").to_dict()} for i in range(count)
+    ])
+
+
+def _claim(conn, worker: str, limit: int = 1, lease: int = 300, run_id=None):
+    return conn.execute(
+        "select * from public.claim_run_jobs(%s, %s, %s, %s)", (worker, limit, lease, run_id)
+    ).fetchall()
+
+
+def _finish(conn, job_id: int, worker: str, status: str = "done") -> bool:
+    return conn.execute(
+        "select public.finish_run_job(%s, %s, %s, '{}'::jsonb, null) as held", (job_id, worker, status)
+    ).fetchone()["held"]
+
+
+def _expire(pg, job_id: int) -> None:
+    pg.execute("update public.run_jobs set claimed_until = now() - interval '1 second' where id = %s", (job_id,))
+
+
+def test_each_job_is_claimed_by_one_worker(pg):
+    run_id = _open_run(pg, 3)
+    first = _claim(pg, "w1", limit=2, run_id=run_id)
+    second = _claim(pg, "w2", limit=5, run_id=run_id)
+    assert len(first) == 2 and len(second) == 1
+    assert {j["id"] for j in first}.isdisjoint(j["id"] for j in second)
+    assert all(j["attempts"] == 1 and j["run_type"] == "real" for j in first + second)
+    assert _claim(pg, "w3", run_id=run_id) == []
+
+
+def test_expired_lease_is_reclaimed_and_the_late_report_refused(pg):
+    run_id = _open_run(pg, 1)
+    (job,) = _claim(pg, "slow", run_id=run_id)
+    # A live lease is not handed out again
+    assert _claim(pg, "fast", run_id=run_id) == []
+
+    _expire(pg, job["id"])
+    (again,) = _claim(pg, "fast", run_id=run_id)
+    assert again["id"] == job["id"] and again["attempts"] == 2
+
+    assert _finish(pg, job["id"], "slow") is False
+    assert _finish(pg, job["id"], "fast") is True
+    row = pg.execute("select status, worker from public.run_jobs where id = %s", (job["id"],)).fetchone()
+    assert row == {"status": "done", "worker": "fast"}
+
+
+def test_job_fails_once_its_attempts_are_used_up(pg):
+    run_id = _open_run(pg, 1, max_attempts=2)
+    for worker in ("w1", "w2"):
+        (job,) = _claim(pg, worker, run_id=run_id)
+        _expire(pg, job["id"])
+    assert _claim(pg, "w3", run_id=run_id) == []
+    row = pg.execute("select status, attempts, last_error from public.run_jobs where id = %s", (job["id"],)).fetchone()
+    assert row["status"] == "failed" and row["attempts"] == 2
+    assert row["last_error"].startswith("lease expired")
+
+
+def test_claims_skip_rows_locked_by_another_worker(pg, pg_url):
+    import psycopg
+    from psycopg.rows import dict_row
+
+    run_id = _open_run(pg, 4)
+    with psycopg.connect(pg_url, row_factory=dict_row) as holder, \
+            psycopg.connect(pg_url, autocommit=True, row_factory=dict_row) as other:
+        # The holder's claim is not committed yet, so its rows stay locked
+        held = _claim(holder, "holder", limit=2, run_id=run_id)
+        other.execute("set statement_timeout = '2s'")
+        taken = _claim(other, "other", limit=4, run_id=run_id)
+        assert len(held) == 2 and len(taken) == 2
+        assert {j["id"] for j in held}.isdisjoint(j["id"] for j in taken)
+        holder.commit()
+
+
+def test_concurrent_workers_claim_every_job_exactly_once(pg, pg_url):
+    import psycopg
+    from psycopg.rows import dict_row
+
+    run_id = _open_run(pg, 60)
+    claimed, lock = [], threading.Lock()
+
+    def work(name):
+        with psycopg.connect(pg_url, autocommit=True, row_factory=dict_row) as conn:
+            while True:
+                jobs = _claim(conn, name, limit=1, run_id=run_id)
+                if not jobs:
+                    return
+                with lock:
+                    claimed.extend(j["id"] for j in jobs)
+                assert _finish(conn, jobs[0]["id"], name)
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(claimed) == len(set(claimed)) == 60
+    counts = pg.execute(
+        "select count(*) filter (where status = 'done') as done, max(attempts) as attempts "
+        "from public.run_jobs where run_id = %s", (run_id,)
+    ).fetchone()
+    assert counts == {"done": 60, "attempts": 1}
+
+
+def test_a_lost_job_stores_none_of_its_rows(pg, pg_url):
+    from mortgage_tracker.postgres_writer import PostgresWriter
+
+    run_id = _open_run(pg, 1)
+    slow, fast = PostgresWriter(pg_url), PostgresWriter(pg_url)
+    try:
+        (job,) = slow.call("claim_run_jobs", {"p_worker": "slow", "p_limit": 1, "p_run_id": run_id})
+        source_id = slow.upsert_source(make_source("Source 0"))
+        slow.insert_offers([make_offer(run_id, source_id)])
+        _expire(pg, job["id"])
+        (again,) = fast.call("claim_run_jobs", {"p_worker": "fast", "p_limit": 1, "p_run_id": run_id})
+        fast.insert_offers([make_offer(run_id, source_id)])
+
+        assert slow.finish_job(job["id"], "slow", "done", {"sources_success": 1}) is False
+        assert fast.finish_job(again["id"], "fast", "done", {"sources_success": 1}) is True
+    finally:
+        slow.close()
+        fast.close()
+    assert pg.execute("select count(*) as n from public.offers_normalized").fetchone()["n"] == 1
+
+
+def test_worker_refuses_the_rest_writer(monkeypatch, tmp_path):
+    catalog = tmp_path / "sources.yaml"
+    catalog.write_text("sources: []\n")
+    monkeypatch.setenv("SUPABASE_URL", "https://example.supabase.co")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "service-key")
+    monkeypatch.delenv("WRITER", raising=False)
+    with pytest.raises(ValueError, match="WRITER=postgres"):
+        run_worker(sources_path=str(catalog))
@@ -0,0 +1,102 @@
+"""The cached read service over HTTP: ETags, 304s and gzip."""
+import gzip
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from mortgage_tracker.serve import GZIP_MIN_BYTES, RatesCache, make_handler
+
+
+class FakeReader:
+    """The three read functions the service calls."""
+
+    def __init__(self, offers):
+        self.offers = offers
+
+    def call(self, fn, params=None):
+        if fn == "get_latest_run_summary":
+            return [{"run_id": 7, "data_source": "real", "distinct_lenders": 20, "last_updated": "2026-01-01"}]
+        if fn == "get_latest_rates_with_fallback":
+            return self.offers
+        if fn == "get_market_summary":
+            return [{"market": {}}]
+        raise AssertionError(f"unexpected call {fn}")
+
+
+@pytest.fixture
+def server():
+    offers = [
+        {"id": i, "run_id": 7, "lender_name": f"Bank {i}", "category": "30Y fixed", "rate": 6 + i / 100,
+         "apr": 6.1 + i / 100, "points": 0.0, "lender_fees": 1200, "state": "MA", "lock_days": 30,
+         "data_source": "real"}
+        for i in range(20)
+    ]
+    cache = RatesCache(FakeReader(offers))
+    cache.check(force=True)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(cache))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _get(port, path, **headers):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("GET", path, headers=headers)
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def test_identity_and_gzip_bodies_have_distinct_etags(server):
+    status, headers, body = _get(server, "/rates")
+    assert status == 200 and len(body) >= GZIP_MIN_BYTES
+    assert headers["Vary"] == "Accept-Encoding"
+    assert "Content-Encoding" not in headers
+
+    gz_status, gz_headers, gz_body = _get(server, "/rates", **{"Accept-Encoding": "gzip"})
+    assert gz_status == 200 and gz_headers["Content-Encoding"] == "gzip"
+    assert gz_headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(gz_body) == body
+    assert gz_headers["ETag"] == headers["ETag"][:-1] + '-gz"'
+    assert json.loads(body)["count"] == 20
+
+
+def test_matching_etag_gets_a_bodyless_304(server):
+    _, headers, _ = _get(server, "/rates")
+    status, not_modified, body = _get(server, "/rates", **{"If-None-Match": headers["ETag"]})
+    assert (status, body) == (304, b"")
+    assert not_modified["ETag"] == headers["ETag"]
+    assert not_modified["Vary"] == "Accept-Encoding"
+
+    _, gz_headers, _ = _get(server, "/rates", **{"Accept-Encoding": "gzip"})
+    status, _, _ = _get(server, "/rates", **{"Accept-Encoding": "gzip", "If-None-Match": f'W/{gz_headers["ETag"]}'})
+    assert status == 304
+
+
+def test_an_etag_only_validates_its_own_encoding(server):
+    _, headers, _ = _get(server, "/rates")
+    _, gz_headers, _ = _get(server, "/rates", **{"Accept-Encoding": "gzip"})
+
+    status, _, body = _get(server, "/rates", **{"Accept-Encoding": "gzip", "If-None-Match": headers["ETag"]})
+    assert status == 200 and gzip.decompress(body)
+    status, _, body = _get(server, "/rates", **{"If-None-Match": gz_headers["ETag"]})
+    assert status == 200 and json.loads(body)["count"] == 20
+
+
+def test_small_bodies_are_not_gzipped(server):
+    status, headers, body = _get(server, "/healthz", **{"Accept-Encoding": "gzip"})
+    assert status == 200 and "Content-Encoding" not in headers
+    assert not headers["ETag"].endswith('-gz"')
+    assert json.loads(body)["offers"] == 20
+
+
+def test_errors_are_never_304(server):
+    _, headers, _ = _get(server, "/nope")
+    status, _, _ = _get(server, "/nope", **{"If-None-Match": headers["ETag"]})
+    assert status == 404
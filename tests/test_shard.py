@@ -0,0 +1,53 @@
+"""Shard assignment: stable, complete and disjoint; and the i/N spec."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mortgage_tracker.shard import parse_shard, shard_index, shard_sources
+
+from conftest import make_source
+
+SOURCES = [make_source(f"Bank {i}") for i in range(8)]
+
+
+def test_shard_index_is_pinned():
+    # A different answer here reshuffles every sharded deployment's slices
+    assert [shard_index(s, 4) for s in SOURCES] == [3, 2, 1, 2, 2, 3, 1, 0]
+
+
+def test_shard_index_does_not_depend_on_the_hash_seed():
+    code = (
+        "from mortgage_tracker.config import Source\n"
+        "from mortgage_tracker.shard import shard_index\n"
+        "print([shard_index(Source(name=f'Bank {i}', org_type='bank', rate_url=f'https://example.com/bank-{i}'), 4)"
+        " for i in range(8)])\n"
+    )
+    for seed in ("1", "2"):
+        env = {**os.environ, "PYTHONHASHSEED": seed, "PYTHONPATH": os.pathsep.join(sys.path)}
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        assert out.stdout.strip() == str([shard_index(s, 4) for s in SOURCES])
+
+
+def test_sources_sharing_a_page_share_a_shard():
+    twins = [make_source("Bank A 30Y", rate_url="https://example.com/rates"),
+             make_source("Bank A 15Y", rate_url="https://example.com/rates")]
+    assert len({shard_index(s, 16) for s in twins}) == 1
+
+
+@pytest.mark.parametrize("count", [1, 3, 5])
+def test_shards_partition_the_sources(count):
+    slices = [shard_sources(SOURCES, i, count) for i in range(count)]
+    assert sorted(s.name for part in slices for s in part) == sorted(s.name for s in SOURCES)
+
+
+@pytest.mark.parametrize("spec,expected", [("0/1", (0, 1)), ("2/3", (2, 3)), (" 1/ 4", (1, 4))])
+def test_parse_shard(spec, expected):
+    assert parse_shard(spec) == expected
+
+
+@pytest.mark.parametrize("spec", ["3", "a/b", "1/", "3/3", "-1/3", "0/0"])
+def test_parse_shard_rejects(spec):
+    with pytest.raises(ValueError, match="Shard"):
+        parse_shard(spec)
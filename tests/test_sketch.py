@@ -0,0 +1,54 @@
+"""Market sketches merge to exactly the summary of one sketch over all offers."""
+import json
+
+import pytest
+
+from mortgage_tracker.sketch import MarketSketch, QuantileSketch, merge_sketches
+
+
+def _offers():
+    offers = []
+    for i in range(40):
+        category = "30Y fixed" if i % 4 else "15Y fixed"
+        offers.append({"category": category, "lender_name": f"Bank {i % 7}",
+                       "rate": 5.5 + (i * 37 % 40) / 32, "apr": 5.6 + (i * 37 % 40) / 32})
+    offers.append({"category": "30Y fixed", "lender_name": "Bank X", "rate": "6.125", "apr": None})
+    offers.append({"category": None, "lender_name": "Nowhere", "rate": 1.0})
+    return offers
+
+
+def test_quantiles_are_nearest_rank():
+    sketch = QuantileSketch()
+    for value in (6.0, 6.125, 6.25, 6.5, 7.0):
+        sketch.add(value)
+    sketch.add(None)
+    assert sketch.count == 5
+    assert [sketch.quantile(q) for q in (0.1, 0.5, 0.9, 1.0)] == [6.0, 6.25, 7.0, 7.0]
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_merged_parts_summarise_like_one_sketch():
+    offers = _offers()
+    whole = MarketSketch()
+    whole.add_many(offers)
+
+    parts = []
+    for i in range(3):
+        part = MarketSketch()
+        part.add_many(offers[i::3])
+        # Shards ship their sketches as JSON
+        parts.append(json.loads(json.dumps(part.to_dict())))
+    merged = merge_sketches(parts)
+
+    assert merged.summary() == whole.summary()
+    assert merged.lenders == whole.lenders == 8
+    assert merged.summary()["30Y fixed"]["offers"] == 31
+
+
+def test_merge_sketches_of_nothing_is_empty():
+    assert merge_sketches([]).summary() == {}
+
+
+def test_sketches_of_another_resolution_are_refused():
+    with pytest.raises(ValueError, match="resolution"):
+        merge_sketches([{"resolution": 0.01, "categories": {}}])
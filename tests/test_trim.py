@@ -0,0 +1,44 @@
+"""Snapshot trimming keeps rate tables and never trims pages that gave no offers."""
+from mortgage_tracker.trim import trim_snapshot
+
+PAGE = "<html><head><title>Rates</title></head><body><p>Intro</p><table><tr><td>6.25</td></tr></table></body></html>"
+
+
+class TableParser:
+    """Returns one offer per page that still contains the rate table."""
+
+    def parse(self, text=None, js=None):
+        return [{"rate": 6.25}] if "<table>" in (text or "") else []
+
+
+class EmptyParser:
+    def parse(self, text=None, js=None):
+        return []
+
+
+def _snapshot():
+    return {"raw_text": PAGE, "raw_json": None}
+
+
+def test_trims_to_the_tables_when_the_offers_match():
+    snapshot = trim_snapshot(_snapshot(), TableParser(), [{"rate": 6.25}])
+    assert snapshot["raw_text"] == "<table><tr><td>6.25</td></tr></table>"
+    assert snapshot["page_bytes"] == len(PAGE.encode("utf-8"))
+    assert snapshot["trim_regions"] == [[PAGE.index("<table>"), PAGE.index("</body>")]]
+
+
+def test_keeps_the_full_page_when_the_trim_parses_differently():
+    class FussyParser(TableParser):
+        def parse(self, text=None, js=None):
+            return [{"rate": 6.25}] if "Intro" in (text or "") else []
+
+    snapshot = trim_snapshot(_snapshot(), FussyParser(), [{"rate": 6.25}])
+    assert snapshot["raw_text"] == PAGE
+    assert "trim_regions" not in snapshot
+
+
+def test_never_trims_a_page_that_gave_no_offers():
+    # The empty re-parse would "agree" with any trim
+    snapshot = trim_snapshot(_snapshot(), EmptyParser(), [])
+    assert snapshot["raw_text"] == PAGE
+    assert "page_sha256" not in snapshot